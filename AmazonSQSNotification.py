@@ -1,89 +1,75 @@
 import json
-import boto3
+import os
+from concurrent.futures import ThreadPoolExecutor
+import AwsClients
+import Metrics
+from NotificationTemplates import get_template, template_context
 
-# Initialize clients
-sns = boto3.client('sns')
+# SNS topic ARN
+TOPIC_ARN = "arn:aws:sns:us-east-1:990308236413:AppointmentNotification" # same for both regions
 
+# Bounded fan-out for SNS publishes (boto3 clients are thread safe)
+PUBLISH_WORKERS = int(os.environ.get('NOTIFY_PUBLISH_WORKERS', '10'))
+
+def build_notification(message_data):
+    """Return (message, subject) for a queued notification, or None if there is nothing to send"""
+    message_type = message_data.get('MessageType')
+    recipient_type = message_data.get('RecipientType')
+
+    template = get_template(message_type, recipient_type, message_data.get('Locale'))
+    if template is None:
+        Metrics.count('notifications.no_template')
+        Metrics.debug("No template for message type %s / recipient %s", message_type, recipient_type)
+        return None
+
+    rendered = template.render(template_context(
+        message_data.get('PatientName', 'Patient'),
+        message_data.get('DoctorName', 'Doctor'),
+        message_data.get('AppointmentDate'),
+        message_data.get('StartTime', '00:00')
+    ))
+    return rendered['default'], rendered['subject']
+
+def process_record(record):
+    """Send the notification for one SQS record; raises if it should be retried"""
+    message_data = json.loads(record['body'])
+    notification = build_notification(message_data)
+    if notification is None:
+        return
+
+    message, subject = notification
+    recipient_type = message_data.get('RecipientType')
+
+    # Send notification via SNS with recipient filtering
+    AwsClients.client('sns').publish(
+        TopicArn=TOPIC_ARN,
+        Message=message,
+        Subject=subject,
+        MessageAttributes={
+            'recipient_type': {
+                'DataType': 'String',
+                'StringValue': recipient_type
+            }
+        }
+    )
+
+@Metrics.instrument('AmazonSQSNotification')
 def lambda_handler(event, context):
-    print(f"Received event: {json.dumps(event)}")
-    
-    for record in event['Records']:
-        try:
-            # Extract message from SQS
-            message_body = record['body']
-            print(f"Processing message body: {message_body}")
-            
-            message_data = json.loads(message_body)
-            
-            # Extract details with names
-            patient_name = message_data.get('PatientName', 'Patient')
-            doctor_name = message_data.get('DoctorName', 'Doctor')
-            appointment_date = message_data.get('AppointmentDate')
-            start_time = message_data.get('StartTime', '00:00')
-            message_type = message_data.get('MessageType')
-            recipient_type = message_data.get('RecipientType')
-            
-            # SNS topic ARN
-            topic_arn = "arn:aws:sns:us-east-1:990308236413:AppointmentNotification" # same for both regions
-            
-            if message_type == 'Notification':
-                if recipient_type == 'patient':
-                    # Patient notification
-                    message = f"Dear {patient_name},\n\nYour appointment with {doctor_name} has been confirmed for {appointment_date} at {start_time}.\n\nPlease arrive 15 minutes early and bring your insurance card."
-                    subject = f"Appointment Confirmation for {appointment_date}"
-                elif recipient_type == 'doctor':
-                    # Doctor notification
-                    message = f"Dear {doctor_name},\n\nA new appointment has been scheduled with {patient_name} on {appointment_date} at {start_time}.\n\nPlease review patient details in your system."
-                    subject = f"New Appointment: {patient_name} on {appointment_date}"
-                else:
-                    continue
-                
-                # Send notification via SNS with recipient filtering
-                sns.publish(
-                    TopicArn=topic_arn,
-                    Message=message,
-                    Subject=subject,
-                    MessageAttributes={
-                        'recipient_type': {
-                            'DataType': 'String',
-                            'StringValue': recipient_type
-                        }
-                    }
-                )
-                print(f"Sent {recipient_type} notification for appointment on {appointment_date}")
-                
-            elif message_type == 'Reminder':
-                # Similar logic for reminders
-                if recipient_type == 'patient':
-                    message = f"Dear {patient_name},\n\nThis is a reminder about your appointment with {doctor_name} tomorrow ({appointment_date}) at {start_time}."
-                    subject = f"Appointment Reminder for Tomorrow"
-                elif recipient_type == 'doctor':
-                    message = f"Dear {doctor_name},\n\nThis is a reminder about your appointment with {patient_name} tomorrow ({appointment_date}) at {start_time}."
-                    subject = f"Appointment Reminder: {patient_name} Tomorrow"
-                else:
-                    continue
-                
-                sns.publish(
-                    TopicArn=topic_arn,
-                    Message=message,
-                    Subject=subject,
-                    MessageAttributes={
-                        'recipient_type': {
-                            'DataType': 'String',
-                            'StringValue': recipient_type
-                        }
-                    }
-                )
-                print(f"Sent {recipient_type} reminder for appointment on {appointment_date}")
-            else:
-                print(f"Unknown message type: {message_type}")
+    # Requires ReportBatchItemFailures on the SQS event source mapping: only the
+    # records listed in batchItemFailures go back on the queue, so one bad message
+    # no longer causes the notifications already sent in this batch to be resent
+    records = event['Records']
+    Metrics.count('records', len(records))
 
-        except Exception as e:
-            print(f"Error processing record: {record.get('messageId')}")
-            print(f"Error: {str(e)}")
-            raise e
+    batch_item_failures = []
+    with ThreadPoolExecutor(max_workers=max(1, min(PUBLISH_WORKERS, len(records)))) as executor:
+        futures = [(record, executor.submit(process_record, record)) for record in records]
+        for record, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Error processing record {record.get('messageId')}: {str(e)}")
+                batch_item_failures.append({'itemIdentifier': record['messageId']})
 
-    return {
-        'statusCode': 200,
-        'body': json.dumps('Successfully processed messages.')
-    }
+    Metrics.count('records.failed', len(batch_item_failures))
+    return {'batchItemFailures': batch_item_failures}
@@ -0,0 +1,22 @@
+import json
+
+# Shared by the API handlers behind API Gateway proxy integrations
+# (BookAppointmentLambda, FindFreeSlots, BulkAvailability, ArchiveQuery, PatientHistory)
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET',
+    'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token'
+}
+
+
+def parse_request(event, query_string=True):
+    """Query string (GET, unless query_string is False), JSON body (POST) or a direct invocation event"""
+    if query_string and event.get('queryStringParameters'):
+        return event['queryStringParameters']
+    if event.get('body'):
+        return json.loads(event['body'])
+    return event
+
+
+def response(status_code, body):
+    return {'statusCode': status_code, 'headers': CORS_HEADERS, 'body': json.dumps(body, default=str)}
@@ -1,115 +1,229 @@
-import boto3
 import json
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+import AwsClients
+import Metrics
+from AppointmentStore import APPOINTMENTS_TABLE, appointments_with_participants, batch_get_items, query_doctor_day
+from NotificationTemplates import digest_context, get_template, template_context
+from ReminderQueue import (APPOINTMENT_ENTRY, DIGEST_ENTRY, QUEUE_MODE, REMINDER_DUE_TABLE, defer, due_reminders,
+                           mark_sent)
 
-def lambda_handler(event, context):
-    # Initialize clients
-    sns = boto3.client('sns')
-    dynamodb = boto3.resource('dynamodb')
-    
-    # Calculate tomorrow's date
-    tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
-    
-    # Query appointments for tomorrow
-    appointments_table = dynamodb.Table('Appointments')
-    response = appointments_table.scan(
-        FilterExpression='AppointmentDate = :date',
-        ExpressionAttributeValues={
-            ':date': tomorrow
+TOPIC_ARN = 'arn:aws:sns:us-east-1:990308236413:AppointmentNotification'
+
+# Bounded fan-out for SNS publishes (boto3 clients are thread safe)
+PUBLISH_WORKERS = int(os.environ.get('REMINDER_PUBLISH_WORKERS', '16'))
+
+# Doctors get one reminder per appointment ('individual') or one agenda for the
+# whole day ('digest'); a doctor record's ReminderMode attribute overrides this
+DIGEST = 'digest'
+INDIVIDUAL = 'individual'
+DOCTOR_REMINDER_MODE = os.environ.get('DOCTOR_REMINDER_MODE', INDIVIDUAL)
+
+def publish_reminder(sns, message, subject, email, recipient_type):
+    sns.publish(
+        TopicArn=TOPIC_ARN,
+        Message=message,
+        Subject=subject,
+        MessageStructure='json',
+        MessageAttributes={
+            'email': {
+                'DataType': 'String',
+                'StringValue': email
+            },
+            'recipient_type': {
+                'DataType': 'String',
+                'StringValue': recipient_type
+            },
+            'notification_type': {
+                'DataType': 'String',
+                'StringValue': 'reminder'
+            }
         }
     )
-    
-    appointments = response.get('Items', [])
-    print(f"Found {len(appointments)} appointments for tomorrow")
-    
-    patients_table = dynamodb.Table('Patients')
-    doctors_table = dynamodb.Table('Doctors')
-    
-    # Send reminder for each appointment
+
+def reminder_mode(doctor_data):
+    return DIGEST if (doctor_data.get('ReminderMode') or DOCTOR_REMINDER_MODE).lower() == DIGEST else INDIVIDUAL
+
+def build_reminders(appointment, patient_data, doctor_data, appointment_date, include_doctor=True,
+                    message_type='ScheduledReminder'):
+    """Patient and (unless the doctor gets a digest) doctor publish arguments for one appointment"""
+    context = template_context(
+        f"{patient_data['FirstName']} {patient_data['LastName']}",
+        f"Dr. {doctor_data['LastName']}",
+        appointment_date,
+        appointment.get('StartTime', '00:00')
+    )
+
+    # Patient reminder is more detailed (preparation instructions), doctor reminder is briefer
+    patient_subject, patient_message = get_template(message_type, 'patient', patient_data.get('Locale')).render_structure(context)
+    reminders = [(patient_message, patient_subject, patient_data['Email'], 'patient')]
+    if include_doctor:
+        doctor_subject, doctor_message = get_template(message_type, 'doctor', doctor_data.get('Locale')).render_structure(context)
+        reminders.append((doctor_message, doctor_subject, doctor_data['Email'], 'doctor'))
+    return reminders
+
+def build_digest(doctor_data, day, tomorrow):
+    """One agenda publish for a doctor's (appointment, patient) pairs, in start time order"""
+    day = sorted(day, key=lambda entry: entry[0].get('StartTime', '00:00'))
+    agenda = '\n'.join(
+        f"    {appointment.get('StartTime', '00:00')}-{appointment.get('EndTime', '')}  "
+        f"{patient_data['FirstName']} {patient_data['LastName']}"
+        for appointment, patient_data in day
+    )
+    context = digest_context(f"Dr. {doctor_data['LastName']}", tomorrow, day[0][0].get('StartTime', '00:00'), len(day), agenda)
+    subject, message = get_template('ScheduledReminderDigest', 'doctor', doctor_data.get('Locale')).render_structure(context)
+    return (message, subject, doctor_data['Email'], 'doctor')
+
+def tomorrow_reminders(dynamodb, tomorrow):
+    """Scan mode: publishes for every appointment tomorrow. Returns (reminders, skipped, digests)"""
+    # Tomorrow's appointments (every page), then each distinct patient and doctor
+    # once, 100 keys per request
+    appointments, patients, doctors = appointments_with_participants(AwsClients.table(APPOINTMENTS_TABLE), dynamodb, tomorrow)
+    Metrics.count('appointments', len(appointments))
+
+    reminders = []
+    digests = {}
+    skipped = 0
     for appointment in appointments:
-        patient_id = appointment['PatientID']
-        doctor_id = appointment['DoctorID']
-        appointment_time = appointment.get('StartTime', '00:00')
-        
-        # Get patient and doctor details
-        patient_data = patients_table.get_item(Key={'PatientID': patient_id})['Item']
-        doctor_data = doctors_table.get_item(Key={'DoctorID': doctor_id})['Item']
-        
-        patient_email = patient_data['Email']
-        doctor_email = doctor_data['Email']
-        patient_name = f"{patient_data['FirstName']} {patient_data['LastName']}"
-        doctor_name = f"Dr. {doctor_data['LastName']}"
-        
-        # Different messages for patient and doctor
-        # Patient reminder - more detailed with preparation instructions
-        patient_message = {
-            "default": f"Reminder: Your appointment with {doctor_name} is tomorrow at {appointment_time}.",
-            "email": f"""
-            Appointment Reminder
-            Dear {patient_name},
-            This is a friendly reminder about your appointment with {doctor_name} tomorrow ({tomorrow}) at {appointment_time}.
-            Please remember to:
-                Bring your insurance card
-                Arrive 15 minutes early
-                Bring a list of current medications
-            If you need to reschedule, please call us at least 4 hours in advance.
-            """
-        }
-        
-        sns.publish(
-            TopicArn='arn:aws:sns:us-east-1:990308236413:AppointmentNotification',
-            Message=json.dumps(patient_message),
-            Subject=f"Reminder: Your appointment tomorrow at {appointment_time}",
-            MessageStructure='json',
-            MessageAttributes={
-                'email': {
-                    'DataType': 'String',
-                    'StringValue': patient_email
-                },
-                'recipient_type': {
-                    'DataType': 'String',
-                    'StringValue': 'patient'  # or 'patient'
-                },
-                'notification_type': {
-                    'DataType': 'String',
-                    'StringValue': 'reminder'
-                }
-            }
-        )
-        
-        # Doctor reminder - briefer with patient details
-        doctor_message = {
-            "default": f"Reminder: Appointment with {patient_name} tomorrow at {appointment_time}.",
-            "email": f"""
-            Appointment Reminder
-            Dear {doctor_name},
-            You have an appointment scheduled with {patient_name} tomorrow ({tomorrow}) at {appointment_time}.
-            Patient records are available in your portal.
-            """
-        }
-        
-        sns.publish(
-            TopicArn='arn:aws:sns:us-east-1:990308236413:AppointmentNotification',
-            Message=json.dumps(doctor_message),
-            Subject=f"Reminder: Appointment with {patient_name} tomorrow",
-            MessageStructure='json',
-            MessageAttributes={
-                'email': {
-                    'DataType': 'String',
-                    'StringValue': doctor_email
-                },
-                'recipient_type': {
-                    'DataType': 'String',
-                    'StringValue': 'doctor'  # or 'patient'
-                },
-                'notification_type': {
-                    'DataType': 'String',
-                    'StringValue': 'reminder'
-                }
-            }
-        )
-    
+        patient_data = patients.get(appointment['PatientID'])
+        doctor_data = doctors.get(appointment['DoctorID'])
+        if patient_data is None or doctor_data is None:
+            Metrics.debug("Skipping appointment %s: patient or doctor record missing", appointment.get('AppointmentID'))
+            skipped += 1
+            continue
+        digest = reminder_mode(doctor_data) == DIGEST
+        try:
+            reminders.extend(build_reminders(appointment, patient_data, doctor_data, tomorrow, include_doctor=not digest))
+        except KeyError as e:
+            print(f"Skipping appointment {appointment.get('AppointmentID')}: record missing {e}")
+            skipped += 1
+            continue
+        if digest:
+            digests.setdefault(appointment['DoctorID'], []).append((appointment, patient_data))
+
+    # One agenda per digest doctor instead of one publish per appointment
+    for doctor_id, day in list(digests.items()):
+        try:
+            reminders.append(build_digest(doctors[doctor_id], day, tomorrow))
+        except KeyError as e:
+            print(f"Skipping digest for doctor {doctor_id}: record missing {e}")
+            skipped += len(day)
+            del digests[doctor_id]
+    return reminders, skipped, digests
+
+def queued_reminders(dynamodb, entries, now):
+    """
+    Queue mode: publishes for due index entries. Returns (reminders, owners,
+    skipped, digests), where owners[i] is the ReminderID reminder i was built for.
+    """
+    appointments_table = AwsClients.table(APPOINTMENTS_TABLE)
+    tomorrow = (now + timedelta(days=1)).strftime('%Y-%m-%d')
+    doctors = batch_get_items(dynamodb, 'Doctors', 'DoctorID', [entry['DoctorID'] for entry in entries])
+
+    # A digest lists the doctor's whole day, not just the entries that fell due
+    digest_entries = [entry for entry in entries if entry['Kind'] == DIGEST_ENTRY
+                      and entry['DoctorID'] in doctors and reminder_mode(doctors[entry['DoctorID']]) == DIGEST]
+    with ThreadPoolExecutor(max_workers=PUBLISH_WORKERS) as executor:
+        days = list(executor.map(
+            lambda entry: query_doctor_day(appointments_table, entry['DoctorID'], entry['AppointmentDate']), digest_entries))
+    appointment_entries = [entry for entry in entries if entry['Kind'] == APPOINTMENT_ENTRY]
+    patient_ids = [entry['PatientID'] for entry in appointment_entries] + [appt['PatientID'] for day in days for appt in day]
+    patients = batch_get_items(dynamodb, 'Patients', 'PatientID', patient_ids)
+
+    reminders, owners = [], []
+    skipped = 0
+    for entry in appointment_entries:
+        patient_data = patients.get(entry['PatientID'])
+        doctor_data = doctors.get(entry['DoctorID'])
+        if patient_data is None or doctor_data is None:
+            Metrics.debug("Skipping reminder %s: patient or doctor record missing", entry['ReminderID'])
+            skipped += 1
+            continue
+        message_type = 'ScheduledReminder' if entry['AppointmentDate'] == tomorrow else 'UpcomingReminder'
+        # A record without Email/FirstName/LastName skips its own entry, not the run
+        try:
+            built = build_reminders(entry, patient_data, doctor_data, entry['AppointmentDate'],
+                                    include_doctor=reminder_mode(doctor_data) != DIGEST, message_type=message_type)
+        except KeyError as e:
+            print(f"Skipping reminder {entry['ReminderID']}: record missing {e}")
+            skipped += 1
+            continue
+        # A retried entry only resends to the recipients its last attempt missed
+        built = [reminder for reminder in built if reminder[3] not in entry.get('SentTo', [])]
+        reminders.extend(built)
+        owners.extend([entry['ReminderID']] * len(built))
+
+    digests = {}
+    for entry, day in zip(digest_entries, days):
+        day = [(appt, patients[appt['PatientID']]) for appt in day if appt['PatientID'] in patients]
+        if not day:
+            continue
+        try:
+            reminders.append(build_digest(doctors[entry['DoctorID']], day, entry['AppointmentDate']))
+        except KeyError as e:
+            print(f"Skipping reminder {entry['ReminderID']}: record missing {e}")
+            skipped += 1
+            continue
+        digests[entry['DoctorID']] = day
+        owners.append(entry['ReminderID'])
+    return reminders, owners, skipped, digests
+
+def publish_all(sns, reminders):
+    """Publish concurrently; returns a success flag per reminder"""
+    results = []
+    with ThreadPoolExecutor(max_workers=PUBLISH_WORKERS) as executor:
+        futures = [executor.submit(publish_reminder, sns, *reminder) for reminder in reminders]
+        for future in futures:
+            try:
+                future.result()
+                results.append(True)
+            except Exception as e:
+                print(f"Error publishing reminder: {e}")
+                results.append(False)
+    return results
+
+@Metrics.instrument('AppointmentReminder')
+def lambda_handler(event, context):
+    # Shared clients (created on first use, reused by warm containers)
+    sns = AwsClients.client('sns')
+    dynamodb = AwsClients.resource('dynamodb')
+    # {"Now": "YYYY-MM-DDTHH:MM"} runs the job as of another time
+    now = datetime.fromisoformat(event['Now']) if (event or {}).get('Now') else datetime.now()
+
+    if QUEUE_MODE:
+        # Hourly (EventBridge): only the reminders due since the last run
+        due_table = AwsClients.table(REMINDER_DUE_TABLE)
+        entries = due_reminders(due_table, now)
+        Metrics.count('reminders.due', len(entries))
+        reminders, owners, skipped, digests = queued_reminders(dynamodb, entries, now)
+    else:
+        tomorrow = (now + timedelta(days=1)).strftime('%Y-%m-%d')
+        reminders, skipped, digests = tomorrow_reminders(dynamodb, tomorrow)
+    avoided = sum(len(day) - 1 for day in digests.values())
+
+    results = publish_all(sns, reminders)
+    sent = sum(results)
+    failed = len(results) - sent
+
+    if QUEUE_MODE:
+        # Entries with a failed publish stay in the index (moved up to this hour's
+        # bucket) and are retried by the next run
+        retry = {owner for owner, ok in zip(owners, results) if not ok}
+        delivered = {}
+        for owner, reminder, ok in zip(owners, reminders, results):
+            if ok:
+                delivered.setdefault(owner, set()).add(reminder[3])
+        mark_sent(due_table, [entry for entry in entries if entry['ReminderID'] not in retry])
+        defer(due_table, [entry for entry in entries if entry['ReminderID'] in retry], delivered, now)
+
+    Metrics.count('reminders.sent', sent)
+    Metrics.count('reminders.failed', failed)
+    Metrics.count('reminders.skipped', skipped)
+    Metrics.count('reminders.digests', len(digests))
+    Metrics.count('reminders.publishes_avoided', avoided)
     return {
         'statusCode': 200,
-        'body': json.dumps(f'Sent {len(appointments)*2} reminder notifications')
+        'body': json.dumps(f'Sent {sent} reminder notifications ({failed} failed, {skipped} appointments skipped, '
+                           f'{len(digests)} doctor digests saved {avoided} publishes)')
     }
@@ -0,0 +1,184 @@
+import os
+import time
+
+# Table and index names (override per stage through environment variables)
+APPOINTMENTS_TABLE = os.environ.get('APPOINTMENTS_TABLE', 'Appointments')
+
+# BatchGetItem accepts at most 100 keys per request
+BATCH_GET_LIMIT = 100
+
+# Global secondary index on Appointments:
+#   partition key DoctorID (S), sort key AppointmentDate (S), projection ALL
+# Lets us read one doctor's day without scanning the whole table.
+DOCTOR_DATE_INDEX = os.environ.get('DOCTOR_DATE_INDEX', 'DoctorDateIndex')
+
+# Global secondary index on Appointments:
+#   partition key PatientID (S), sort key AppointmentDate (S), projection ALL
+# A patient's appointments by date: history pages and the double-booking check.
+PATIENT_DATE_INDEX = os.environ.get('PATIENT_DATE_INDEX', 'PatientDateIndex')
+
+
+def appointment_key(item):
+    """Primary key of an appointment row (AppointmentID + DoctorID sort key)"""
+    return {
+        'AppointmentID': item['AppointmentID'],
+        'DoctorID': item['DoctorID']
+    }
+
+
+def query_pages(table, **kwargs):
+    """Yield every page of a query, following LastEvaluatedKey"""
+    while True:
+        response = table.query(**kwargs)
+        yield response.get('Items', [])
+
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            return
+        kwargs['ExclusiveStartKey'] = last_key
+
+
+def scan_pages(table, **kwargs):
+    """Yield every page of a scan, following LastEvaluatedKey"""
+    while True:
+        response = table.scan(**kwargs)
+        yield response.get('Items', [])
+
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            return
+        kwargs['ExclusiveStartKey'] = last_key
+
+
+def scan_cursor_pages(table, start_key=None, **kwargs):
+    """Yield (items, next_start_key) per scan page so callers can checkpoint their position"""
+    if start_key:
+        kwargs['ExclusiveStartKey'] = start_key
+    while True:
+        response = table.scan(**kwargs)
+        last_key = response.get('LastEvaluatedKey')
+        yield response.get('Items', []), last_key
+
+        if not last_key:
+            return
+        kwargs['ExclusiveStartKey'] = last_key
+
+
+def query_doctor_day(table, doctor_id, appointment_date):
+    """All appointments for one doctor on one date, via the DoctorDateIndex"""
+    from boto3.dynamodb.conditions import Key
+    appointments = []
+    for page in query_pages(
+        table,
+        IndexName=DOCTOR_DATE_INDEX,
+        KeyConditionExpression=Key('DoctorID').eq(doctor_id) & Key('AppointmentDate').eq(appointment_date)
+    ):
+        appointments.extend(page)
+    return appointments
+
+
+def query_patient_day(table, patient_id, appointment_date):
+    """All of one patient's appointments on one date, via the PatientDateIndex"""
+    from boto3.dynamodb.conditions import Key
+    appointments = []
+    for page in query_pages(
+        table,
+        IndexName=PATIENT_DATE_INDEX,
+        KeyConditionExpression=Key('PatientID').eq(patient_id) & Key('AppointmentDate').eq(appointment_date)
+    ):
+        appointments.extend(page)
+    return appointments
+
+
+def query_patient_page(table, patient_id, from_date=None, to_date=None, limit=None, start_key=None, newest_first=False):
+    """
+    One page of a patient's appointments in date order (either direction), via
+    the PatientDateIndex. Returns (items, last_evaluated_key or None).
+    """
+    from boto3.dynamodb.conditions import Key
+    condition = Key('PatientID').eq(patient_id)
+    if from_date and to_date:
+        condition &= Key('AppointmentDate').between(from_date, to_date)
+    elif from_date:
+        condition &= Key('AppointmentDate').gte(from_date)
+    elif to_date:
+        condition &= Key('AppointmentDate').lte(to_date)
+
+    kwargs = {'IndexName': PATIENT_DATE_INDEX, 'KeyConditionExpression': condition, 'ScanIndexForward': not newest_first}
+    if limit:
+        kwargs['Limit'] = limit
+    if start_key:
+        kwargs['ExclusiveStartKey'] = start_key
+    response = table.query(**kwargs)
+    return response.get('Items', []), response.get('LastEvaluatedKey')
+
+
+def scan_appointments_before(table, cutoff_date):
+    """Yield appointments dated before cutoff_date, one page at a time"""
+    from boto3.dynamodb.conditions import Attr
+    for page in scan_pages(table, FilterExpression=Attr('AppointmentDate').lt(cutoff_date)):
+        for item in page:
+            yield item
+
+
+def scan_appointments_on(table, appointment_date, consistent_read=False):
+    """Yield appointments on one date, one page at a time"""
+    from boto3.dynamodb.conditions import Attr
+    for page in scan_pages(table, FilterExpression=Attr('AppointmentDate').eq(appointment_date), ConsistentRead=consistent_read):
+        for item in page:
+            yield item
+
+
+def batch_get_keys(dynamodb, table_name, keys, consistent_read=False, max_attempts=5):
+    """
+    Fetch items by full primary key with BatchGetItem, in chunks of 100,
+    retrying UnprocessedKeys with exponential backoff. Returns the items found;
+    keys that do not exist are simply absent.
+    """
+    found = []
+
+    for offset in range(0, len(keys), BATCH_GET_LIMIT):
+        request = {table_name: {'Keys': keys[offset:offset + BATCH_GET_LIMIT], 'ConsistentRead': consistent_read}}
+
+        for attempt in range(max_attempts):
+            response = dynamodb.batch_get_item(RequestItems=request)
+            found.extend(response.get('Responses', {}).get(table_name, []))
+
+            request = response.get('UnprocessedKeys') or {}
+            if not request:
+                break
+            time.sleep(min(1.0, 0.05 * (2 ** attempt)))
+        else:
+            missing = len(request.get(table_name, {}).get('Keys', []))
+            raise RuntimeError(f"BatchGetItem on {table_name} left {missing} keys unprocessed after {max_attempts} attempts")
+
+    return found
+
+
+def batch_get_items(dynamodb, table_name, key_name, ids, max_attempts=5):
+    """Fetch items by a single-attribute key (batch_get_keys); returns {id: item}"""
+    keys = [{key_name: item_id} for item_id in dict.fromkeys(ids)]
+    return {item[key_name]: item for item in batch_get_keys(dynamodb, table_name, keys, max_attempts=max_attempts)}
+
+
+def appointments_with_participants(table, dynamodb, appointment_date, consistent_read=False):
+    """Appointments on a date plus each distinct patient and doctor record ({id: item})"""
+    appointments = list(scan_appointments_on(table, appointment_date, consistent_read))
+    patients = batch_get_items(dynamodb, 'Patients', 'PatientID', [appt['PatientID'] for appt in appointments])
+    doctors = batch_get_items(dynamodb, 'Doctors', 'DoctorID', [appt['DoctorID'] for appt in appointments])
+    return appointments, patients, doctors
+
+
+def put_appointment(table, item):
+    """Write an appointment row"""
+    return table.put_item(Item=item)
+
+
+def delete_appointments(table, items):
+    """Delete appointment rows in batches of 25 (BatchWriteItem under the hood)"""
+    count = 0
+    with table.batch_writer() as batch:
+        for item in items:
+            batch.delete_item(Key=appointment_key(item))
+            count += 1
+    return count
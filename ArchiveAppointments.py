@@ -1,38 +1,247 @@
-import boto3
+import gzip
 import json
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+import AwsClients
+import Metrics
+from AppointmentStore import APPOINTMENTS_TABLE, appointment_key, batch_get_keys, delete_appointments, scan_cursor_pages
+from ArchiveIndex import file_entry, flush_entry, load_manifest, partition_key, save_manifest
+from ArchiveLedger import (ARCHIVE_LEDGER_TABLE, LEDGER_MODE, clear_date, entry_pages, forget_entries,
+                           pending_dates)
+from AvailabilityCache import forget_days
 
-dynamodb = boto3.resource('dynamodb')
-s3 = boto3.client('s3')
+ARCHIVE_BUCKET = 's00224403-appointment-archive'
+CHECKPOINT_KEY = 'archives/_checkpoint.json'
 
-def lambda_handler(event, context):
-    # Archive appointments older than 6 months (using 1 day for demo)
-    cutoff_date = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-    appointments_table = dynamodb.Table('Appointments')
-    
-    # Scan for old appointments
-    response = appointments_table.scan(
-        FilterExpression='AppointmentDate < :cutoff',
-        ExpressionAttributeValues={':cutoff': cutoff_date}
+# Uncompressed bytes buffered across all partitions before their files are written;
+# rows are only deleted from the table once the files holding them are in S3
+FLUSH_SIZE = int(os.environ.get('ARCHIVE_FLUSH_SIZE', str(16 * 1024 * 1024)))
+# Stop and checkpoint when the invocation has less than this left
+TIME_BUFFER_MS = int(os.environ.get('ARCHIVE_TIME_BUFFER_MS', '30000'))
+# Partition files uploaded in parallel per flush
+UPLOAD_WORKERS = int(os.environ.get('ARCHIVE_UPLOAD_WORKERS', '8'))
+COMPRESS_LEVEL = int(os.environ.get('ARCHIVE_COMPRESS_LEVEL', '6'))
+
+def load_checkpoint():
+    s3 = AwsClients.client('s3')
+    try:
+        response = s3.get_object(Bucket=ARCHIVE_BUCKET, Key=CHECKPOINT_KEY)
+        return json.loads(response['Body'].read())
+    except s3.exceptions.NoSuchKey:
+        return None
+
+def save_checkpoint(checkpoint):
+    s3 = AwsClients.client('s3')
+    s3.put_object(Bucket=ARCHIVE_BUCKET, Key=CHECKPOINT_KEY, Body=json.dumps(checkpoint))
+
+def clear_checkpoint():
+    s3 = AwsClients.client('s3')
+    s3.delete_object(Bucket=ARCHIVE_BUCKET, Key=CHECKPOINT_KEY)
+
+def out_of_time(context):
+    return context is not None and context.get_remaining_time_in_millis() < TIME_BUFFER_MS
+
+def new_checkpoint(cutoff, run, scan_start_key=None, archived=0):
+    return {'cutoff': cutoff, 'run': run, 'sequence': 1, 'scan_start_key': scan_start_key, 'archived': archived}
+
+def finish_single_object_run(checkpoint):
+    """
+    Complete the multipart object of a run started before archives were
+    partitioned (its rows are already deleted from the table) and return a
+    checkpoint that carries on from the same scan position.
+    """
+    s3 = AwsClients.client('s3')
+    if checkpoint['upload_id']:
+        try:
+            s3.complete_multipart_upload(
+                Bucket=ARCHIVE_BUCKET,
+                Key=f"archives/appointments-{checkpoint['run']}-{checkpoint['sequence']:04d}.ndjson.gz",
+                UploadId=checkpoint['upload_id'],
+                MultipartUpload={'Parts': checkpoint['parts']}
+            )
+        except s3.exceptions.NoSuchUpload:
+            pass
+    return new_checkpoint(checkpoint['cutoff'], checkpoint['run'], checkpoint['scan_start_key'], checkpoint['archived'])
+
+class PartitionWriter:
+    """Buffers scanned rows per doctor and month until they are written out"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.partitions = {}
+        self.size = 0
+        self.keys = []
+        self.days = set()
+
+    def add(self, item):
+        line = json.dumps(item, default=str).encode('utf-8') + b'\n'
+        self.partitions.setdefault((item['DoctorID'], item['AppointmentDate'][:7]), []).append((item, line))
+        self.size += len(line)
+        self.keys.append(appointment_key(item))
+        self.days.add((item['DoctorID'], item['AppointmentDate']))
+
+def write_partition(run, sequence, doctor_id, month, rows):
+    """Upload one partition file (rows in date and time order); returns its manifest entry"""
+    rows.sort(key=lambda row: (row[0]['AppointmentDate'], row[0].get('StartTime', '')))
+    body = gzip.compress(b''.join(line for _, line in rows), COMPRESS_LEVEL, mtime=0)
+    key = partition_key(doctor_id, month, run, sequence)
+    AwsClients.client('s3').put_object(
+        Bucket=ARCHIVE_BUCKET,
+        Key=key,
+        Body=body,
+        ContentType='application/x-ndjson',
+        ContentEncoding='gzip'
+    )
+    return file_entry(key, doctor_id, month, sequence, [item for item, _ in rows], len(body))
+
+def flush(checkpoint, manifest, writer, next_start_key):
+    """Write the buffered partitions, record them in the manifest and checkpoint, then delete their rows"""
+    partitions = [(doctor_id, month, rows) for (doctor_id, month), rows in writer.partitions.items()]
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+        entries = list(executor.map(
+            lambda partition: write_partition(checkpoint['run'], checkpoint['sequence'], *partition), partitions))
+
+    # A flush retried after a failure rewrites the same keys: one entry per file and flush
+    sequence = checkpoint['sequence']
+    written = {entry['key'] for entry in entries}
+    manifest['files'] = [entry for entry in manifest['files'] if entry['key'] not in written] + entries
+    manifest['flushes'] = [flush for flush in manifest['flushes'] if flush['sequence'] != sequence] + [
+        flush_entry(sequence, [item for rows in writer.partitions.values() for item, _ in rows])]
+    save_manifest(AwsClients.client('s3'), ARCHIVE_BUCKET, manifest)
+    Metrics.count('archive.files', len(entries))
+    Metrics.count('archive.rows', len(writer.keys))
+
+    checkpoint['sequence'] += 1
+    checkpoint['archived'] += len(writer.keys)
+    checkpoint['scan_start_key'] = next_start_key
+    save_checkpoint(checkpoint)
+
+    # Only now are the files durable and recorded. If the deletes fail the rows
+    # stay in the table and a later run archives them again: duplicated, never lost
+    delete_appointments(AwsClients.table(APPOINTMENTS_TABLE), writer.keys)
+    # The archived days' cached schedules and slot bitmaps no longer match the table
+    forget_days(AwsClients.redis, writer.days)
+    writer.reset()
+
+def archive_scan(checkpoint, manifest, writer, context):
+    """Scan Appointments for rows before the cutoff; False if the invocation ran out of time"""
+    from boto3.dynamodb.conditions import Attr
+    appointments_table = AwsClients.table(APPOINTMENTS_TABLE)
+
+    # Scan page the next unarchived row is on
+    page_start_key = checkpoint['scan_start_key']
+
+    pages = scan_cursor_pages(
+        appointments_table,
+        start_key=checkpoint['scan_start_key'],
+        FilterExpression=Attr('AppointmentDate').lt(checkpoint['cutoff']),
+        ConsistentRead=True
     )
-    old_appointments = response.get('Items', [])
-    
-    if old_appointments:
-        # Write to S3 (as a single file for demo)
-        archive_key = f"archives/appointments-{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}.json"
-        s3.put_object(
-            Bucket='s00224403-appointment-archive',
-            Key=archive_key,
-            Body=json.dumps(old_appointments)
+    for items, next_key in pages:
+        for item in items:
+            writer.add(item)
+            if writer.size >= FLUSH_SIZE:
+                # The rest of this page still has to be read on resume
+                flush(checkpoint, manifest, writer, page_start_key)
+
+        page_start_key = next_key
+        if next_key and out_of_time(context):
+            if writer.keys:
+                flush(checkpoint, manifest, writer, next_key)
+            else:
+                checkpoint['scan_start_key'] = next_key
+                save_checkpoint(checkpoint)
+            return False
+
+    if writer.keys:
+        flush(checkpoint, manifest, writer, None)
+    return True
+
+def archive_ledger(checkpoint, manifest, writer, context):
+    """
+    Archive the rows the ledger lists for dates before the cutoff; False if the
+    invocation ran out of time. Needs no scan position to resume: entries of
+    archived rows are dropped after each flush, and a date's marker once all of
+    its entries are gone.
+    """
+    ledger_table = AwsClients.table(ARCHIVE_LEDGER_TABLE)
+    dynamodb = AwsClients.resource('dynamodb')
+    finished = []
+
+    def flush_and_forget():
+        archived = [item for rows in writer.partitions.values() for item, _ in rows]
+        if archived:
+            flush(checkpoint, manifest, writer, None)
+            forget_entries(ledger_table, archived)
+        for marker in finished:
+            clear_date(ledger_table, marker)
+        finished.clear()
+
+    for marker in pending_dates(ledger_table, checkpoint['cutoff']):
+        if out_of_time(context):
+            flush_and_forget()
+            save_checkpoint(checkpoint)
+            return False
+        for entries in entry_pages(ledger_table, marker['EntryID']):
+            keys = [{'AppointmentID': entry['AppointmentID'], 'DoctorID': entry['DoctorID']} for entry in entries]
+            rows = {(row['AppointmentID'], row['DoctorID']): row
+                    for row in batch_get_keys(dynamodb, APPOINTMENTS_TABLE, keys, consistent_read=True)}
+            # Deleted or moved to another date since: the stream files the new date
+            gone = []
+            for entry in entries:
+                row = rows.get((entry['AppointmentID'], entry['DoctorID']))
+                if row is None or row['AppointmentDate'] != entry['LedgerDate']:
+                    gone.append(dict(entry, AppointmentDate=entry['LedgerDate']))
+                    continue
+                writer.add(row)
+                if writer.size >= FLUSH_SIZE:
+                    flush_and_forget()
+            forget_entries(ledger_table, gone)
+        finished.append(marker)
+
+    flush_and_forget()
+    return True
+
+def archived_response(checkpoint):
+    return {"statusCode": 200, "body": f"Archived {checkpoint['archived']} appointments to S3 Glacier and deleted from DynamoDB"}
+
+@Metrics.instrument('ArchiveAppointments')
+def lambda_handler(event, context):
+    checkpoint = load_checkpoint()
+    if checkpoint is None:
+        # Archive appointments older than 6 months (using 1 day for demo)
+        checkpoint = new_checkpoint(
+            (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d'),
+            datetime.now().strftime('%Y-%m-%d-%H-%M-%S')
         )
-        
-        # Delete from DynamoDB using composite key
-        for item in old_appointments:
-            appointments_table.delete_item(Key={
-                'AppointmentID': item['AppointmentID'],
-                'DoctorID': item['DoctorID']  # Include the sort key
-            })
-            
-        return {"statusCode": 200, "body": f"Archived {len(old_appointments)} appointments to S3 Glacier and deleted from DynamoDB"}
     else:
+        print(f"Resuming archive run {checkpoint['run']} at flush {checkpoint['sequence']}")
+        if 'upload_id' in checkpoint:
+            scan_complete = checkpoint['scan_complete']
+            checkpoint = finish_single_object_run(checkpoint)
+            if scan_complete:
+                clear_checkpoint()
+                return archived_response(checkpoint)
+
+    s3 = AwsClients.client('s3')
+    manifest = load_manifest(s3, ARCHIVE_BUCKET, checkpoint['run']) or {
+        'run': checkpoint['run'], 'cutoff': checkpoint['cutoff'], 'complete': False, 'flushes': [], 'files': []}
+
+    archive = archive_ledger if LEDGER_MODE else archive_scan
+    if not archive(checkpoint, manifest, PartitionWriter(), context):
+        return {
+            "statusCode": 202,
+            "body": f"Archived {checkpoint['archived']} appointments so far; checkpoint saved, run again to resume"
+        }
+
+    if manifest['files']:
+        # Completed manifests never change again, so queries may cache them
+        manifest['complete'] = True
+        save_manifest(s3, ARCHIVE_BUCKET, manifest)
+    clear_checkpoint()
+    if checkpoint['archived'] == 0:
         return {"statusCode": 200, "body": "No appointments to archive"}
+    return archived_response(checkpoint)
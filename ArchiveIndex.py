@@ -0,0 +1,164 @@
+import base64
+import hashlib
+import json
+import math
+import os
+
+# Layout of the appointment archive in S3:
+#   archives/partitions/month=YYYY-MM/doctor=<DoctorID>/<run>-<sequence>.ndjson.gz
+#       gzip NDJSON, one file per doctor and month per flush of an archive run,
+#       rows sorted by date and start time
+#   archives/manifests/<run>.json
+#       'files': one entry per file: doctor, min/max AppointmentDate, row count and
+#       bloom filters of the PatientIDs and AppointmentIDs it contains
+#       'flushes': the same filters over all files of one flush, checked first so an
+#       ID lookup only tests the file filters of flushes that may hold it
+#   archives/appointments-<run>-<sequence>.ndjson.gz
+#   archives/appointments-<timestamp>.json (a JSON array, from the original job)
+#       older single-object runs; not in any manifest, so queries read them in full
+# Months rather than days keep the file count manageable for a doctor with a few
+# appointments a day; the per-file min/max dates still prune by day.
+PARTITIONS_PREFIX = 'archives/partitions/'
+MANIFESTS_PREFIX = 'archives/manifests/'
+LEGACY_PREFIX = 'archives/appointments-'
+
+# Target false positive rate of the ID bloom filters
+BLOOM_FP_RATE = float(os.environ.get('ARCHIVE_BLOOM_FP_RATE', '0.001'))
+
+
+class BloomFilter:
+    """Bit array with `hashes` positions per value (double hashing of one blake2b digest)"""
+
+    def __init__(self, bits, hashes, data=None):
+        self.bits = bits
+        self.hashes = hashes
+        self.data = bytearray(data) if data is not None else bytearray((bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity, fp_rate=BLOOM_FP_RATE):
+        capacity = max(1, capacity)
+        bits = max(64, math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        return cls(bits, max(1, round(bits / capacity * math.log(2))))
+
+    def _positions(self, value):
+        digest = int.from_bytes(hashlib.blake2b(str(value).encode('utf-8'), digest_size=16).digest(), 'little')
+        first, second, bits = digest >> 64, (digest & 0xFFFFFFFFFFFFFFFF) | 1, self.bits
+        return [(first + n * second) % bits for n in range(self.hashes)]
+
+    def add(self, value):
+        data = self.data
+        for position in self._positions(value):
+            data[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        data = self.data
+        return all(data[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    def to_dict(self):
+        return {'bits': self.bits, 'hashes': self.hashes, 'data': base64.b64encode(bytes(self.data)).decode('ascii')}
+
+    @classmethod
+    def from_dict(cls, stored):
+        return cls(stored['bits'], stored['hashes'], base64.b64decode(stored['data']))
+
+
+def partition_key(doctor_id, month, run, sequence):
+    return f"{PARTITIONS_PREFIX}month={month}/doctor={doctor_id}/{run}-{sequence:04d}.ndjson.gz"
+
+
+def manifest_key(run):
+    return f"{MANIFESTS_PREFIX}{run}.json"
+
+
+def bloom_of(values):
+    values = set(values)
+    bloom = BloomFilter.for_capacity(len(values))
+    for value in values:
+        bloom.add(value)
+    return bloom.to_dict()
+
+
+def summary_entry(records, **fields):
+    """Date range, row count and ID bloom filters of `records`, plus `fields`"""
+    dates = [record['AppointmentDate'] for record in records]
+    return dict(
+        fields,
+        min_date=min(dates),
+        max_date=max(dates),
+        records=len(records),
+        patients=bloom_of(record.get('PatientID') for record in records),
+        appointments=bloom_of(record.get('AppointmentID') for record in records)
+    )
+
+
+def file_entry(key, doctor_id, month, sequence, records, size):
+    """Manifest entry for one partition file holding `records`"""
+    return summary_entry(records, key=key, doctor_id=doctor_id, month=month, sequence=sequence, bytes=size)
+
+
+def flush_entry(sequence, records):
+    """Manifest entry covering every file written by one flush"""
+    return summary_entry(records, sequence=sequence)
+
+
+def _bloom(entry, field):
+    # Decoded once per entry; query containers keep completed manifests in memory
+    bloom = entry[field]
+    if isinstance(bloom, dict):
+        bloom = entry[field] = BloomFilter.from_dict(bloom)
+    return bloom
+
+
+def entry_matches(entry, doctor_id=None, patient_id=None, appointment_id=None, from_date=None, to_date=None):
+    """False only if the file (or flush) cannot contain a matching record; bloom filters allow false positives"""
+    if doctor_id is not None and entry.get('doctor_id', doctor_id) != doctor_id:
+        return False
+    if from_date is not None and entry['max_date'] < from_date:
+        return False
+    if to_date is not None and entry['min_date'] > to_date:
+        return False
+    if patient_id is not None and patient_id not in _bloom(entry, 'patients'):
+        return False
+    if appointment_id is not None and appointment_id not in _bloom(entry, 'appointments'):
+        return False
+    return True
+
+
+def candidate_files(manifest, **filters):
+    """File entries of a manifest that may hold records matching the filters"""
+    sequences = {flush['sequence'] for flush in manifest.get('flushes', []) if entry_matches(flush, **filters)}
+    return [entry for entry in manifest['files'] if entry['sequence'] in sequences and entry_matches(entry, **filters)]
+
+
+def record_matches(record, doctor_id=None, patient_id=None, appointment_id=None, from_date=None, to_date=None):
+    appointment_date = record.get('AppointmentDate', '')
+    return ((doctor_id is None or record.get('DoctorID') == doctor_id)
+            and (patient_id is None or record.get('PatientID') == patient_id)
+            and (appointment_id is None or record.get('AppointmentID') == appointment_id)
+            and (from_date is None or appointment_date >= from_date)
+            and (to_date is None or appointment_date <= to_date))
+
+
+def load_manifest(s3, bucket, run):
+    """Manifest of a run, or None if it has not written one yet"""
+    try:
+        return json.loads(s3.get_object(Bucket=bucket, Key=manifest_key(run))['Body'].read())
+    except s3.exceptions.NoSuchKey:
+        return None
+
+
+def save_manifest(s3, bucket, manifest):
+    s3.put_object(Bucket=bucket, Key=manifest_key(manifest['run']), Body=json.dumps(manifest),
+                  ContentType='application/json')
+
+
+def list_keys(s3, bucket, prefix):
+    """Every key under the prefix, following list continuation tokens"""
+    keys = []
+    kwargs = {'Bucket': bucket, 'Prefix': prefix}
+    while True:
+        response = s3.list_objects_v2(**kwargs)
+        keys.extend(item['Key'] for item in response.get('Contents', []))
+        if not response.get('IsTruncated'):
+            return keys
+        kwargs['ContinuationToken'] = response['NextContinuationToken']
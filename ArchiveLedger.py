@@ -0,0 +1,110 @@
+import os
+import uuid
+from AppointmentStore import query_pages, scan_pages
+
+# Archive ledger: the keys of every live appointment by date, kept up to date by
+# ArchiveStreamProcessor from the Appointments stream (view type NEW_AND_OLD_IMAGES),
+# so the archive job reads the rows it archives instead of scanning the table.
+#   LedgerDate (S) = AppointmentDate, EntryID (S) = "<AppointmentID>#<DoctorID>"
+#   LedgerDate = PENDING_DATES, EntryID = date: one marker per date with entries.
+#       Its Revision changes whenever an entry is written for the date, so the
+#       archive job only drops a marker when nothing was added behind it.
+ARCHIVE_LEDGER_TABLE = os.environ.get('ARCHIVE_LEDGER_TABLE', 'ArchiveLedger')
+PENDING_DATES = '#dates'
+
+# ARCHIVE_SOURCE=ledger: ArchiveAppointments reads the ledger instead of scanning
+# Appointments. Switch over once the stream processor is running and
+# backfill_ledger() has filed the rows written before it.
+LEDGER_MODE = os.environ.get('ARCHIVE_SOURCE', 'scan').lower() == 'ledger'
+
+
+def entry_key(appointment_date, item):
+    return {'LedgerDate': appointment_date, 'EntryID': f"{item['AppointmentID']}#{item['DoctorID']}"}
+
+
+def ledger_entry(item):
+    return dict(entry_key(item['AppointmentDate'], item), AppointmentID=item['AppointmentID'], DoctorID=item['DoctorID'])
+
+
+def date_marker(appointment_date):
+    return {'LedgerDate': PENDING_DATES, 'EntryID': appointment_date, 'Revision': uuid.uuid4().hex}
+
+
+def stream_image(record, name):
+    """NewImage or OldImage of a stream record as a plain item, or None"""
+    from boto3.dynamodb.types import TypeDeserializer
+    image = record.get('dynamodb', {}).get(name)
+    if not image:
+        return None
+    deserializer = TypeDeserializer()
+    return {field: deserializer.deserialize(value) for field, value in image.items()}
+
+
+def sequence_number(record):
+    return record.get('dynamodb', {}).get('SequenceNumber')
+
+
+def apply_record(ledger_table, record):
+    """
+    Apply one stream record to the ledger. Returns the dates an entry was
+    written for; their markers must be written afterwards (mark_dates).
+    """
+    new, old = stream_image(record, 'NewImage'), stream_image(record, 'OldImage')
+    if new is not None and new.get('AppointmentDate'):
+        ledger_table.put_item(Item=ledger_entry(new))
+    # Rescheduled to another date, or removed (including by the archive job itself)
+    if old is not None and old.get('AppointmentDate') and (new is None or new.get('AppointmentDate') != old['AppointmentDate']):
+        ledger_table.delete_item(Key=entry_key(old['AppointmentDate'], old))
+    return {new['AppointmentDate']} if new is not None and new.get('AppointmentDate') else set()
+
+
+def mark_dates(ledger_table, dates):
+    with ledger_table.batch_writer() as batch:
+        for appointment_date in dates:
+            batch.put_item(Item=date_marker(appointment_date))
+
+
+def pending_dates(ledger_table, cutoff):
+    """Markers of dates before the cutoff that have (or may have) entries, oldest first"""
+    from boto3.dynamodb.conditions import Key
+    markers = []
+    for page in query_pages(ledger_table, KeyConditionExpression=Key('LedgerDate').eq(PENDING_DATES) & Key('EntryID').lt(cutoff)):
+        markers.extend(page)
+    return markers
+
+
+def entry_pages(ledger_table, appointment_date):
+    from boto3.dynamodb.conditions import Key
+    return query_pages(ledger_table, KeyConditionExpression=Key('LedgerDate').eq(appointment_date), ConsistentRead=True)
+
+
+def forget_entries(ledger_table, items):
+    """Drop the entries of archived (or no longer existing) appointments"""
+    with ledger_table.batch_writer() as batch:
+        for item in items:
+            batch.delete_item(Key=entry_key(item['AppointmentDate'], item))
+
+
+def clear_date(ledger_table, marker):
+    """Drop a date's marker unless an entry was written for the date since it was read"""
+    from boto3.dynamodb.conditions import Attr
+    try:
+        ledger_table.delete_item(Key={'LedgerDate': PENDING_DATES, 'EntryID': marker['EntryID']},
+                                 ConditionExpression=Attr('Revision').eq(marker['Revision']))
+        return True
+    except ledger_table.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+
+
+def backfill_ledger(appointments_table, ledger_table):
+    """File entries for every existing appointment (one scan); returns the number filed"""
+    count = 0
+    dates = set()
+    with ledger_table.batch_writer() as batch:
+        for page in scan_pages(appointments_table):
+            for item in page:
+                batch.put_item(Item=ledger_entry(item))
+                dates.add(item['AppointmentDate'])
+                count += 1
+    mark_dates(ledger_table, sorted(dates))
+    return count
@@ -0,0 +1,110 @@
+import gzip
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import AwsClients
+import Metrics
+from ApiGateway import parse_request, response
+from ArchiveAppointments import ARCHIVE_BUCKET
+from ArchiveIndex import LEGACY_PREFIX, MANIFESTS_PREFIX, candidate_files, list_keys, record_matches
+
+DEFAULT_LIMIT = int(os.environ.get('ARCHIVE_QUERY_DEFAULT_LIMIT', '100'))
+MAX_LIMIT = int(os.environ.get('ARCHIVE_QUERY_MAX_LIMIT', '1000'))
+# Archive files downloaded in parallel
+FETCH_WORKERS = int(os.environ.get('ARCHIVE_QUERY_WORKERS', '8'))
+
+FILTERS = {'DoctorID': 'doctor_id', 'PatientID': 'patient_id', 'AppointmentID': 'appointment_id',
+           'FromDate': 'from_date', 'ToDate': 'to_date'}
+
+# Manifests of completed runs never change, so a warm container keeps them
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+def read_json(s3, key):
+    return json.loads(s3.get_object(Bucket=ARCHIVE_BUCKET, Key=key)['Body'].read())
+
+def load_manifests(s3):
+    keys = list_keys(s3, ARCHIVE_BUCKET, MANIFESTS_PREFIX)
+    missing = [key for key in keys if key not in _manifests]
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+        loaded = dict(zip(missing, executor.map(lambda key: read_json(s3, key), missing)))
+    with _manifests_lock:
+        _manifests.update((key, manifest) for key, manifest in loaded.items() if manifest.get('complete'))
+    return [_manifests.get(key) or loaded[key] for key in keys]
+
+def plan_query(s3, filters):
+    """
+    Archive files that may hold matching records, oldest first, and the number
+    of files in the archive. Files from before the partitioned layout have no
+    manifest entry and are always read.
+    """
+    manifests = load_manifests(s3)
+    candidates = sorted((entry for manifest in manifests for entry in candidate_files(manifest, **filters)),
+                        key=lambda entry: (entry['min_date'], entry['key']))
+    unindexed = list_keys(s3, ARCHIVE_BUCKET, LEGACY_PREFIX)
+    total_files = sum(len(manifest['files']) for manifest in manifests) + len(unindexed)
+    return unindexed + [entry['key'] for entry in candidates], total_files
+
+def matching_records(s3, key, filters):
+    """Read one archive file and keep the records that match"""
+    body = s3.get_object(Bucket=ARCHIVE_BUCKET, Key=key)['Body']
+    if key.endswith('.json'):
+        # The original archive job's format: one plain JSON array per run
+        return [record for record in json.load(body) if record_matches(record, **filters)]
+    # Stream gzip NDJSON
+    with gzip.GzipFile(fileobj=body) as lines:
+        return [record for record in map(json.loads, filter(bytes.strip, lines)) if record_matches(record, **filters)]
+
+def query_archive(s3, keys, filters):
+    """Matching records from `keys` in order, once per AppointmentID (a re-archived row appears twice)"""
+    seen = set()
+    executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS)
+    try:
+        for records in executor.map(lambda key: matching_records(s3, key, filters), keys):
+            for record in records:
+                if record['AppointmentID'] not in seen:
+                    seen.add(record['AppointmentID'])
+                    yield record
+    finally:
+        # The caller may stop at its limit: skip the downloads not started yet
+        executor.shutdown(wait=False, cancel_futures=True)
+
+@Metrics.instrument('ArchiveQuery')
+def lambda_handler(event, context):
+    try:
+        params = parse_request(event)
+        filters = {name: params[field] for field, name in FILTERS.items() if params.get(field)}
+        for name in ('from_date', 'to_date'):
+            if name in filters:
+                datetime.strptime(filters[name], '%Y-%m-%d')
+        limit = min(int(params.get('Limit', DEFAULT_LIMIT)), MAX_LIMIT)
+    except (ValueError, TypeError) as e:
+        return response(400, {"error": f"Invalid request: {e}"})
+
+    if not filters.keys() & {'doctor_id', 'patient_id', 'appointment_id'} or limit <= 0:
+        return response(400, {"error": "DoctorID, PatientID or AppointmentID is required and Limit must be positive"})
+
+    try:
+        s3 = AwsClients.client('s3')
+        keys, total_files = plan_query(s3, filters)
+        appointments = []
+        truncated = False
+        for record in query_archive(s3, keys, filters):
+            if len(appointments) == limit:
+                truncated = True
+                break
+            appointments.append(record)
+        Metrics.count('archive_query.files_total', total_files)
+        Metrics.count('archive_query.files_selected', len(keys))
+        Metrics.count('archive_query.records', len(appointments))
+        return response(200, {
+            'Appointments': appointments,
+            'FilesSelected': len(keys),
+            'FilesTotal': total_files,
+            'Truncated': truncated
+        })
+    except Exception as e:
+        print(f"Error querying archive: {e}")
+        return response(500, {"error": f"Error querying archive: {str(e)}"})
@@ -0,0 +1,45 @@
+import AwsClients
+import Metrics
+from ArchiveLedger import ARCHIVE_LEDGER_TABLE, apply_record, mark_dates, sequence_number
+
+def failure_response(records, failed):
+    """ReportBatchItemFailures: Lambda retries the batch from the first failed record"""
+    if failed is None:
+        return {'batchItemFailures': []}
+    return {'batchItemFailures': [{'itemIdentifier': sequence_number(records[failed])}]}
+
+@Metrics.instrument('ArchiveStreamProcessor')
+def lambda_handler(event, context):
+    """
+    Appointments stream -> archive ledger. Records are applied in order and the
+    batch stops at the first failure, so a record is never applied before an
+    earlier change to the same appointment.
+    """
+    records = event.get('Records', [])
+    ledger_table = AwsClients.table(ARCHIVE_LEDGER_TABLE)
+
+    # Date -> first record that wrote an entry for it
+    first_for_date = {}
+    failed = None
+    for index, record in enumerate(records):
+        try:
+            for appointment_date in apply_record(ledger_table, record):
+                first_for_date.setdefault(appointment_date, index)
+        except Exception as e:
+            print(f"Error applying stream record {sequence_number(record)}: {e}")
+            failed = index
+            break
+
+    # One marker per date, written after the date's entries so the archive job
+    # never drops a marker ahead of an entry it has not seen
+    try:
+        mark_dates(ledger_table, first_for_date)
+    except Exception as e:
+        print(f"Error marking ledger dates: {e}")
+        failed = min(first_for_date.values()) if failed is None else min([failed, *first_for_date.values()])
+
+    applied = len(records) if failed is None else failed
+    Metrics.count('archive_ledger.records', applied)
+    if failed is not None:
+        Metrics.count('archive_ledger.failures')
+    return failure_response(records, failed)
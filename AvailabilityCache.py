@@ -0,0 +1,305 @@
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+import Metrics
+from AppointmentStore import query_doctor_day
+from AwsClients import redis_error, resolve_redis
+from CacheCodec import CacheFormatError, default_codec
+from SlotBitmap import MARKER_BIT, bitfield_fields, busy_mask, decode_words, slot_indexes
+
+# TTLs in seconds
+SCHEDULE_TTL = 600
+DOCTOR_TTL = 1800  # doctor:{id} records, cached through TieredCache
+# Must outlive SCHEDULE_TTL so a recycled version number never matches a stale entry
+VERSION_TTL = 86400
+# Slot bitmaps only ever gain bits while a day is bookable, so they can live longer
+SLOTS_TTL = 86400
+
+# DoctorDateIndex is eventually consistent: a day rebuilt from it this soon after
+# its version changed may miss that booking, so it is served but not cached
+SCHEDULE_SETTLE_SECONDS = float(os.environ.get('SCHEDULE_SETTLE_SECONDS', '2'))
+
+# Concurrent DynamoDB queries when several doctor-days miss the cache
+QUERY_WORKERS = int(os.environ.get('SCHEDULE_QUERY_WORKERS', '8'))
+
+# Per-container counters; read_units_saved estimates the DynamoDB RCUs hits avoided
+cache_stats = {'hits': 0, 'misses': 0, 'errors': 0, 'unsettled': 0, 'encode_errors': 0, 'decode_errors': 0,
+               'read_units_saved': 0.0}
+
+# Schedule entries use the same serializer as TieredCache (CACHE_CODEC)
+schedule_codec = default_codec()
+
+
+def doctor_key(doctor_id):
+    return f"doctor:{doctor_id}"
+
+
+def schedule_key(doctor_id, appointment_date):
+    return f"appointments:{doctor_id}:{appointment_date}"
+
+
+def schedule_version_key(doctor_id, appointment_date):
+    return f"appointments:{doctor_id}:{appointment_date}:version"
+
+
+def slot_bitmap_key(doctor_id, appointment_date):
+    return f"appointments:{doctor_id}:{appointment_date}:slots"
+
+
+def encode_schedule(version, appointments):
+    """Redis value of a doctor-day entry, or None if it cannot be encoded"""
+    try:
+        return schedule_codec.dumps({'version': version, 'appointments': appointments})
+    except (TypeError, ValueError) as e:
+        # Not a Redis problem: the day is simply not cached
+        _count('encode_errors')
+        print(f"Schedule encode error: {e}")
+        return None
+
+
+def decode_schedule(raw_entry):
+    """Cached doctor-day entry, or None if it cannot be read (treated as a miss)"""
+    try:
+        return schedule_codec.loads(raw_entry)
+    except (CacheFormatError, ValueError) as e:
+        _count('decode_errors')
+        Metrics.debug("Schedule decode error: %s", e)
+        return None
+
+
+def queue_slot_bitmap(pipe, doctor_id, appointment_date, mask):
+    """
+    Queue the SETBITs for a built bitmap. Only ever sets bits: a booking that lands
+    while the day is being built has set its own bits already (or will)
+    """
+    key = slot_bitmap_key(doctor_id, appointment_date)
+    for index in range(mask.bit_length()):
+        if mask >> index & 1:
+            pipe.setbit(key, index, 1)
+    pipe.setbit(key, MARKER_BIT, 1)
+    pipe.expire(key, SLOTS_TTL)
+
+
+def estimate_read_units(size):
+    """
+    Eventually consistent read cost of size bytes: 0.5 RCU per started 4 KB.
+    Hits pass the cached entry's length, which is close enough for a counter
+    and avoids re-serialising the schedule on every hit.
+    """
+    return max(1, math.ceil(size / 4096)) * 0.5
+
+
+def _count(stat, value=1):
+    cache_stats[stat] += value
+    Metrics.count(f'schedule_cache.{stat}', value)
+
+
+def _record_hit(raw_entry):
+    _count('hits')
+    cache_stats['read_units_saved'] += estimate_read_units(len(raw_entry))
+
+
+def get_doctor_day(redis_client, table, doctor_id, appointment_date):
+    """
+    Doctor-day appointments, served from Redis when the cached entry matches
+    the current version, otherwise read from DynamoDB and cached.
+    """
+    return get_doctor_days(redis_client, table, [(doctor_id, appointment_date)])[(doctor_id, appointment_date)]
+
+
+def _settling(version_ttl_ms):
+    """
+    True if the version was bumped less than SCHEDULE_SETTLE_SECONDS ago. Every
+    bump resets the version key's TTL, so its age is VERSION_TTL minus the PTTL.
+    """
+    return version_ttl_ms is not None and 0 <= VERSION_TTL * 1000 - version_ttl_ms < SCHEDULE_SETTLE_SECONDS * 1000
+
+
+def get_doctor_days(redis_client, table, days):
+    """
+    get_doctor_day for many (doctor_id, date) pairs: one round trip for every
+    version and schedule key (and the version TTLs), the misses queried from
+    DynamoDB concurrently, and their entries written back in one pipeline.
+    Returns {(doctor_id, date): appointments}.
+    """
+    days = list(dict.fromkeys(days))
+    versions = dict.fromkeys(days, 0)
+    schedules = {}
+    unsettled = set()
+    provider, redis_client = redis_client, resolve_redis(redis_client)
+
+    if redis_client is not None:
+        try:
+            keys = []
+            for doctor_id, appointment_date in days:
+                keys.extend((schedule_version_key(doctor_id, appointment_date), schedule_key(doctor_id, appointment_date)))
+            # Version PTTLs ride along in the same round trip (see _settling)
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.mget(keys)
+            for day in days:
+                pipe.pttl(schedule_version_key(*day))
+            values, *version_ttls = pipe.execute()
+            for n, day in enumerate(days):
+                raw_version, raw_entry = values[2 * n], values[2 * n + 1]
+                versions[day] = int(raw_version or 0)
+                if versions[day] and _settling(version_ttls[n]):
+                    unsettled.add(day)
+                entry = decode_schedule(raw_entry) if raw_entry else None
+                if entry is not None:
+                    if entry.get('version') == versions[day]:
+                        _record_hit(raw_entry)
+                        schedules[day] = entry['appointments']
+        except Exception as e:
+            _count('errors')
+            redis_error(provider, e)
+            print(f"Cache retrieval error: {e}")
+            redis_client = None
+
+    missing = [day for day in days if day not in schedules]
+    if not missing:
+        return schedules
+    _count('misses', len(missing))
+
+    if len(missing) == 1:
+        schedules[missing[0]] = query_doctor_day(table, *missing[0])
+    else:
+        with ThreadPoolExecutor(max_workers=min(QUERY_WORKERS, len(missing))) as executor:
+            schedules.update(zip(missing, executor.map(lambda day: query_doctor_day(table, *day), missing)))
+
+    if redis_client is not None:
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for day in missing:
+                if day in unsettled:
+                    _count('unsettled')
+                    continue
+                encoded = encode_schedule(versions[day], schedules[day])
+                if encoded is not None:
+                    pipe.setex(schedule_key(*day), SCHEDULE_TTL, encoded)
+            pipe.execute()
+        except Exception as e:
+            _count('errors')
+            redis_error(provider, e)
+            print(f"Cache storage error: {e}")
+    return schedules
+
+
+def record_booking(redis_client, appointment):
+    """
+    Called after an appointment row is written. Bumps the doctor-day version so
+    every cached copy is invalidated, then, if the entry for the previous version
+    is cached, inserts the new appointment into it and stores it under the new
+    version so the next availability check is still a hit.
+    """
+    provider, redis_client = redis_client, resolve_redis(redis_client)
+    if redis_client is None:
+        return False
+
+    doctor_id = appointment['DoctorID']
+    appointment_date = appointment['AppointmentDate']
+    key = schedule_key(doctor_id, appointment_date)
+    version_key = schedule_version_key(doctor_id, appointment_date)
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.incr(version_key)
+        pipe.expire(version_key, VERSION_TTL)
+        pipe.get(key)
+        # Mark the slots in the doctor-day bitmap in the same round trip. On a missing
+        # key this leaves the marker bit unset, so the bitmap still counts as unbuilt
+        slots_key = slot_bitmap_key(doctor_id, appointment_date)
+        for index in slot_indexes(appointment['StartTime'], appointment['EndTime']):
+            pipe.setbit(slots_key, index, 1)
+        pipe.expire(slots_key, SLOTS_TTL)
+        new_version, _, raw_entry = pipe.execute()[:3]
+
+        entry = decode_schedule(raw_entry) if raw_entry else None
+        if entry is None:
+            return False
+        # Only extend the entry for the immediately preceding version; anything
+        # older may be missing a concurrent booking
+        if entry.get('version') != new_version - 1:
+            return False
+
+        appointments = entry['appointments']
+        if all(appt.get('AppointmentID') != appointment['AppointmentID'] for appt in appointments):
+            appointments.append(appointment)
+            appointments.sort(key=lambda appt: appt['StartTime'])
+        encoded = encode_schedule(new_version, appointments)
+        if encoded is None:
+            return False
+        redis_client.setex(key, SCHEDULE_TTL, encoded)
+        return True
+    except Exception as e:
+        _count('errors')
+        redis_error(provider, e)
+        print(f"Cache invalidation error: {e}")
+        return False
+
+
+
+def get_busy_masks(redis_client, table, doctor_id, dates):
+    """
+    Busy-slot bitmask (see SlotBitmap) for each of a doctor's dates: one pipelined
+    BITFIELD_RO per date, then any date without a built bitmap is queried from
+    DynamoDB (concurrently) and its bitmap written back.
+    """
+    provider, redis_client = redis_client, resolve_redis(redis_client)
+    masks = {}
+
+    if redis_client is not None:
+        try:
+            (encoding, offset), *items = bitfield_fields()
+            pipe = redis_client.pipeline(transaction=False)
+            for appointment_date in dates:
+                pipe.bitfield_ro(slot_bitmap_key(doctor_id, appointment_date), encoding, offset, items=items)
+            for appointment_date, values in zip(dates, pipe.execute()):
+                mask = decode_words(values)
+                if mask is not None:
+                    masks[appointment_date] = mask
+        except Exception as e:
+            Metrics.count('slot_bitmap.errors')
+            redis_error(provider, e)
+            print(f"Slot bitmap retrieval error: {e}")
+
+    missing = [appointment_date for appointment_date in dates if appointment_date not in masks]
+    Metrics.count('slot_bitmap.hits', len(dates) - len(missing))
+    Metrics.count('slot_bitmap.misses', len(missing))
+    if not missing:
+        return masks
+
+    with ThreadPoolExecutor(max_workers=max(1, min(QUERY_WORKERS, len(missing)))) as executor:
+        built = dict(zip(missing, executor.map(
+            lambda appointment_date: busy_mask(query_doctor_day(table, doctor_id, appointment_date)), missing)))
+    masks.update(built)
+
+    if redis_client is not None:
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for appointment_date, mask in built.items():
+                queue_slot_bitmap(pipe, doctor_id, appointment_date, mask)
+            pipe.execute()
+        except Exception as e:
+            Metrics.count('slot_bitmap.errors')
+            redis_error(provider, e)
+            print(f"Slot bitmap storage error: {e}")
+    return masks
+
+
+def forget_days(redis_client, days):
+    """Drop the cached schedule, version and slot bitmap of (doctor_id, date) pairs"""
+    provider, redis_client = redis_client, resolve_redis(redis_client)
+    if redis_client is None or not days:
+        return 0
+    keys = []
+    for doctor_id, appointment_date in days:
+        keys.extend((schedule_key(doctor_id, appointment_date),
+                     schedule_version_key(doctor_id, appointment_date),
+                     slot_bitmap_key(doctor_id, appointment_date)))
+    try:
+        return redis_client.delete(*keys)
+    except Exception as e:
+        _count('errors')
+        redis_error(provider, e)
+        print(f"Cache removal error: {e}")
+        return 0
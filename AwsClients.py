@@ -0,0 +1,165 @@
+import os
+import threading
+import time
+from Metrics import TimedClient, TimedRedis, TimedTable
+
+# Region for every client unless a per-service override is set (e.g. SNS_REGION=us-east-1)
+REGION = os.environ.get('APP_REGION') or os.environ.get('AWS_REGION') or 'us-east-1'
+
+# HTTP connection pool per client; reused across invocations of a warm container
+MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', '32'))
+
+_clients = {}
+_resources = {}
+_tables = {}
+_lock = threading.Lock()
+
+
+def service_region(service):
+    return os.environ.get(f"{service.upper()}_REGION", REGION)
+
+
+def _config(service):
+    from botocore.config import Config
+    return Config(
+        region_name=service_region(service),
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        tcp_keepalive=True,
+        connect_timeout=float(os.environ.get('AWS_CONNECT_TIMEOUT', '2')),
+        read_timeout=float(os.environ.get('AWS_READ_TIMEOUT', '10')),
+        retries={'mode': 'standard', 'max_attempts': 3}
+    )
+
+
+def client(service):
+    """boto3 client for the service, created on first use and shared afterwards"""
+    if service not in _clients:
+        with _lock:
+            if service not in _clients:
+                import boto3
+                _clients[service] = TimedClient(boto3.client(service, config=_config(service)), service)
+    return _clients[service]
+
+
+def resource(service):
+    """boto3 resource for the service, created on first use and shared afterwards"""
+    if service not in _resources:
+        with _lock:
+            if service not in _resources:
+                import boto3
+                _resources[service] = TimedClient(boto3.resource(service, config=_config(service)), service, untimed=('Table',))
+    return _resources[service]
+
+
+def table(name):
+    """DynamoDB Table resource, cached by name"""
+    if name not in _tables:
+        _tables[name] = TimedTable(resource('dynamodb').Table(name))
+    return _tables[name]
+
+
+def override(service, instance, kind='client'):
+    """Install a ready-made client/resource (local benchmarks and fakes), timed like the real ones"""
+    untimed = ('Table',) if kind == 'resource' else ()
+    with _lock:
+        (_resources if kind == 'resource' else _clients)[service] = TimedClient(instance, service, untimed)
+        if kind == 'resource' and service == 'dynamodb':
+            _tables.clear()
+
+
+def reset():
+    with _lock:
+        _clients.clear()
+        _resources.clear()
+        _tables.clear()
+    redis.reset()
+
+
+class RedisProvider:
+    """
+    Lazily connected Redis client backed by a ConnectionPool. Calling the
+    provider returns the client, or None while Redis is considered down. A
+    failure marks it down; it is re-checked with a ping at most once per
+    HEALTH_RECHECK seconds instead of staying disabled for the container's life.
+    """
+
+    HEALTH_RECHECK = float(os.environ.get('REDIS_HEALTH_RECHECK', '30'))
+
+    def __init__(self, decode_responses=True):
+        self.decode_responses = decode_responses
+        self.reset()
+
+    def reset(self):
+        self._client = None
+        self._healthy = True
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        import redis as redis_lib
+        endpoint = os.environ.get('REDIS_ENDPOINT')
+        if not endpoint:
+            return None
+        use_ssl = os.environ.get('REDIS_SSL', 'true').lower() == 'true'
+        timeout = float(os.environ.get('REDIS_SOCKET_TIMEOUT', '1'))
+        pool = redis_lib.ConnectionPool(
+            connection_class=redis_lib.SSLConnection if use_ssl else redis_lib.Connection,
+            host=endpoint,
+            port=int(os.environ.get('REDIS_PORT', '6379')),
+            decode_responses=self.decode_responses,
+            socket_timeout=timeout,
+            socket_connect_timeout=timeout,
+            socket_keepalive=True,
+            health_check_interval=30,
+            max_connections=int(os.environ.get('REDIS_MAX_CONNECTIONS', '32'))
+        )
+        return TimedRedis(redis_lib.Redis(connection_pool=pool))
+
+    def __call__(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._connect()
+            if self._client is None:
+                return None
+
+        if not self._healthy:
+            if time.monotonic() - self._checked_at < self.HEALTH_RECHECK:
+                return None
+            self._checked_at = time.monotonic()
+            try:
+                self._client.ping()
+                self._healthy = True
+                print("Redis connection restored")
+            except Exception as e:
+                print(f"Redis still unavailable: {e}")
+                return None
+        return self._client
+
+    def mark_failed(self, error=None):
+        """Called after a Redis command fails; skips Redis until the next health check"""
+        if self._healthy:
+            print(f"Marking Redis unavailable: {error}")
+        self._healthy = False
+        self._checked_at = time.monotonic()
+
+    def override(self, instance):
+        self._client = TimedRedis(instance)
+        self._healthy = True
+
+
+# Client shared by the caches. Replies are bytes (decode_responses=False) so binary
+# CacheCodec values survive; json.loads() and int() take bytes as they are
+redis = RedisProvider(decode_responses=False)
+
+
+def resolve_redis(redis_client):
+    """Accept either a Redis client or a RedisProvider; returns a client or None"""
+    return redis_client() if callable(redis_client) else redis_client
+
+
+def redis_error(redis_client, error):
+    """Report a failed Redis command to the provider (if one was passed)"""
+    mark_failed = getattr(redis_client, 'mark_failed', None)
+    if mark_failed is not None:
+        mark_failed(error)
@@ -1,11 +1,105 @@
-import boto3
 import json
-import uuid
+import os
+import AwsClients
+import Metrics
+from ApiGateway import CORS_HEADERS
+from Idempotency import COMPLETED, FINGERPRINT_TTL, IDEMPOTENCY_TTL, claim, complete, fingerprint, release, request_key, submission_id
 
-# Initialize DynamoDB and Step Functions clients
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1') # multi-region support
-stepfunctions = boto3.client('stepfunctions', region_name='us-east-1')
+# Workflow failure states -> HTTP status for the synchronous (fused) booking mode
+FUSED_ERROR_STATUS = {
+    'PatientNotFoundError': 404,
+    'DoctorNotFoundError': 404,
+    'DoctorNotAvailableError': 409,
+    'PatientNotAvailableError': 409,
+    'BookingFailedError': 500
+}
 
+def run_fused_booking(step_function_input):
+    """
+    Run stepfunction.json in this process (WorkflowRunner) instead of starting an
+    execution, so the caller gets the definitive booking outcome. Requires the
+    task handlers to be packaged with this function.
+    """
+    from WorkflowRunner import execute
+    execution = execute(step_function_input)
+    Metrics.set_property('WorkflowPath', execution['path'])
+    Metrics.count(f"workflow.{execution['status'].lower()}")
+
+    if execution['status'] == 'SUCCEEDED':
+        return {
+            'statusCode': 201,
+            'headers': CORS_HEADERS,
+            'body': json.dumps({
+                "message": "Appointment booked! Check email for confirmation",
+                "appointmentDetails": execution['output']['confirmationResult'].get('appointmentDetails')
+            })
+        }
+    return {
+        'statusCode': FUSED_ERROR_STATUS.get(execution['error'], 500),
+        'headers': CORS_HEADERS,
+        'body': json.dumps({"error": execution['cause'], "errorType": execution['error']})
+    }
+
+def duplicate_response(existing, payload):
+    """Answer for a submission that was already claimed by an earlier request"""
+    if existing.get('fingerprint') != fingerprint(payload):
+        Metrics.count('bookings.idempotency_key_reused')
+        return {
+            'statusCode': 422,
+            'headers': CORS_HEADERS,
+            'body': json.dumps({"error": "Idempotency key was already used for a different booking"})
+        }
+    if existing.get('state') != COMPLETED:
+        Metrics.count('bookings.duplicates_in_progress')
+        return {
+            'statusCode': 409,
+            'headers': CORS_HEADERS,
+            'body': json.dumps({"error": "This booking is already being processed"})
+        }
+    Metrics.count('bookings.duplicates')
+    response = existing['response']
+    response['headers'] = dict(response.get('headers') or {}, **{'Idempotent-Replayed': 'true'})
+    return response
+
+def submit_booking(step_function_input, booking_mode, execution_name=None):
+    if booking_mode == 'fused':
+        return run_fused_booking(step_function_input)
+    
+    # Start Step Function execution
+    step_function_arn = "arn:aws:states:us-east-1:990308236413:stateMachine:CloudAssignment2"
+    stepfunctions = AwsClients.client('stepfunctions')
+    
+    # A named execution started again with the same input returns the existing
+    # one, so a client-keyed retry starts nothing new even if Redis is down
+    execution_args = {'name': execution_name} if execution_name else {}
+    try:
+        stepfunctions.start_execution(
+            stateMachineArn=step_function_arn,
+            input=json.dumps(step_function_input),
+            **execution_args
+        )
+    except stepfunctions.exceptions.ExecutionAlreadyExists:
+        # Also raised for the same input once the first execution has closed (a
+        # retry after the idempotency record expired, or while Redis is down)
+        execution_arn = f"{step_function_arn.replace(':stateMachine:', ':execution:')}:{execution_name}"
+        existing = stepfunctions.describe_execution(executionArn=execution_arn)
+        if json.loads(existing['input']) != step_function_input:
+            Metrics.count('bookings.idempotency_key_reused')
+            return {
+                'statusCode': 422,
+                'headers': CORS_HEADERS,
+                'body': json.dumps({"error": "Idempotency key was already used for a different booking"})
+            }
+        Metrics.count('bookings.duplicates')
+    
+    # Return success response
+    return {
+        'statusCode': 200,
+        'headers': CORS_HEADERS,
+        'body': json.dumps({"message": "Appointment booked! Check email for confirmation"})
+    }
+
+@Metrics.instrument('BookAppointmentLambda')
 def lambda_handler(event, context):
     try:
         # Parse the incoming event (from API Gateway)
@@ -19,17 +113,26 @@ def lambda_handler(event, context):
         stage_vars = event.get('stageVariables', {})
         lambda_alias = stage_vars.get('lambdaAlias', 'dev')   # default to 'dev' if not set
         table_name = stage_vars.get('tableName', 'AppointmentsDev')
+        booking_mode = stage_vars.get('bookingMode', os.environ.get('BOOKING_MODE', 'async'))
 
-        print(f"Stage Lambda Alias: {lambda_alias}")
-        print(f"Stage Table Name: {table_name}")    
+        Metrics.set_property('BookingMode', booking_mode)
+        Metrics.debug("Stage Lambda Alias: %s, Table Name: %s", lambda_alias, table_name)
         # Extract appointment details
-        appointment_id = event.get('AppointmentID', f'A{str(uuid.uuid4())[:8]}')
         patient_id = payload['PatientID']
         doctor_id = payload['DoctorID']
         appointment_date = payload['AppointmentDate']
         start_time = payload['StartTime']
         end_time = payload['EndTime']
         
+        # Retries and double-clicks of the same submission share one ID (from the
+        # Idempotency-Key header/IdempotencyKey field, or the booking itself)
+        key = request_key(event, payload)
+        submission = submission_id(payload, key)
+        existing = claim(AwsClients.redis, submission, payload)
+        if existing is not None:
+            return duplicate_response(existing, payload)
+        appointment_id = event.get('AppointmentID', f'A{submission[:12]}')
+        
         # Create input for Step Function
         step_function_input = {
             "AppointmentID": appointment_id,
@@ -40,24 +143,20 @@ def lambda_handler(event, context):
             "EndTime": end_time
         }
         
-        # Start Step Function execution
-        step_function_arn = "arn:aws:states:us-east-1:990308236413:stateMachine:CloudAssignment2"
+        try:
+            # Step Functions keeps execution names for 90 days, so only client keys
+            # name the execution (an identical booking made later is a new one)
+            response = submit_booking(step_function_input, booking_mode, f'booking-{submission}' if key else None)
+        except Exception:
+            release(AwsClients.redis, submission)
+            raise
         
-        response = stepfunctions.start_execution(
-            stateMachineArn=step_function_arn,
-            input=json.dumps(step_function_input)
-        )
-        
-        # Return success response
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'OPTIONS,POST,GET',
-                'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token'
-            },
-            'body': json.dumps({"message": "Appointment booked! Check email for confirmation"})
-        }
+        # Server errors may succeed on retry; anything else is the final answer
+        if response['statusCode'] >= 500:
+            release(AwsClients.redis, submission)
+        else:
+            complete(AwsClients.redis, submission, payload, response, IDEMPOTENCY_TTL if key else FINGERPRINT_TTL)
+        return response
     except KeyError as e:
         return {
             "statusCode": 400,
@@ -0,0 +1,73 @@
+import os
+import AwsClients
+import Metrics
+from ApiGateway import parse_request, response
+from AppointmentStore import APPOINTMENTS_TABLE, batch_get_items
+from AvailabilityCache import doctor_key, get_doctor_days
+from CheckDoctorAvailability import doctor_cache
+from DoctorSchedule import DaySchedule, to_minutes
+
+MAX_DOCTORS = int(os.environ.get('BULK_AVAILABILITY_MAX_DOCTORS', '100'))
+MAX_DATES = int(os.environ.get('BULK_AVAILABILITY_MAX_DATES', '14'))
+
+def load_doctors(keys):
+    """BatchGetItem for the doctor:{id} keys that missed both cache tiers"""
+    doctor_ids = {key.split(':', 1)[1]: key for key in keys}
+    found = batch_get_items(AwsClients.resource('dynamodb'), 'Doctors', 'DoctorID', list(doctor_ids))
+    return {doctor_ids[doctor_id]: item for doctor_id, item in found.items()}
+
+def availability_matrix(doctor_ids, dates, start_time, end_time):
+    """
+    {doctor_id: {date: True if free}} for every known doctor, plus the unknown
+    doctor IDs: doctors are read in one bulk cache lookup (BatchGetItem for the
+    misses) and every doctor-day schedule in one MGET (concurrent queries for the misses).
+    """
+    doctors = doctor_cache.get_many([doctor_key(doctor_id) for doctor_id in doctor_ids], load_doctors)
+    known = [doctor_id for doctor_id in doctor_ids if doctors[doctor_key(doctor_id)] is not None]
+    unknown = [doctor_id for doctor_id in doctor_ids if doctors[doctor_key(doctor_id)] is None]
+
+    schedules = get_doctor_days(AwsClients.redis, AwsClients.table(APPOINTMENTS_TABLE),
+                                [(doctor_id, appointment_date) for doctor_id in known for appointment_date in dates])
+    start, end = to_minutes(start_time), to_minutes(end_time)
+    matrix = {}
+    for doctor_id in known:
+        matrix[doctor_id] = {
+            appointment_date: not DaySchedule.from_appointments(schedules[(doctor_id, appointment_date)]).conflicts(start, end)
+            for appointment_date in dates
+        }
+    return matrix, {doctor_id: doctors[doctor_key(doctor_id)] for doctor_id in known}, unknown
+
+@Metrics.instrument('BulkAvailability')
+def lambda_handler(event, context):
+    try:
+        params = parse_request(event, query_string=False)
+    except ValueError:
+        return response(400, {"error": "Invalid request format"})
+
+    doctor_ids = list(dict.fromkeys(params.get('DoctorIDs') or []))
+    dates = list(dict.fromkeys(params.get('Dates') or ([params['AppointmentDate']] if params.get('AppointmentDate') else [])))
+    start_time = params.get('StartTime')
+    end_time = params.get('EndTime')
+
+    if not doctor_ids or not dates or not start_time or not end_time:
+        return response(400, {"error": "DoctorIDs, Dates (or AppointmentDate), StartTime and EndTime are required"})
+    if len(doctor_ids) > MAX_DOCTORS or len(dates) > MAX_DATES:
+        return response(400, {"error": f"At most {MAX_DOCTORS} doctors and {MAX_DATES} dates per request"})
+
+    Metrics.debug("Bulk availability for %d doctors x %d dates, %s-%s", len(doctor_ids), len(dates), start_time, end_time)
+    try:
+        matrix, doctors, unknown = availability_matrix(doctor_ids, dates, start_time, end_time)
+        available = sum(free for row in matrix.values() for free in row.values())
+        Metrics.count('availability.cells', len(matrix) * len(dates))
+        Metrics.count('availability.available', available)
+        return response(200, {
+            'StartTime': start_time,
+            'EndTime': end_time,
+            'Dates': dates,
+            'Availability': matrix,
+            'Doctors': doctors,
+            'UnknownDoctors': unknown
+        })
+    except Exception as e:
+        print(f"Error checking bulk availability: {e}")
+        return response(500, {"error": f"Error checking availability: {str(e)}"})
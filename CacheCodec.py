@@ -0,0 +1,134 @@
+import json
+import marshal
+import os
+import zlib
+from decimal import Decimal
+
+# Serializers for records cached in Redis (TieredCache). JsonCodec is the original
+# format; BinaryCodec round-trips DynamoDB items exactly (Decimal, sets, bytes/Binary):
+#   header byte  format version << 4 | flags (1 = zlib compressed, 2 = tagged)
+#   body         marshal of the item; with the tagged flag, Decimals are ('D', str)
+#                and boto3 Binary values ('B', bytes) tuples
+# Both codecs read either format, so the rollout is: deploy (still writing JSON),
+# then set CACHE_CODEC=binary. marshal is fine here because values are only read
+# back from our own Redis; it is not meant for untrusted input.
+FORMAT_VERSION = 1
+COMPRESSED = 0x01
+TAGGED = 0x02
+
+# marshal format 4 has been stable since Python 3.4, so containers on a newer
+# runtime still read entries written by older ones
+MARSHAL_VERSION = 4
+
+# Bodies larger than this are zlib-compressed (kept only if that makes them smaller)
+COMPRESS_THRESHOLD = int(os.environ.get('CACHE_COMPRESS_THRESHOLD', '512'))
+COMPRESS_LEVEL = int(os.environ.get('CACHE_COMPRESS_LEVEL', '1'))
+
+# Format written by the caches: 'json' or 'binary'
+CACHE_CODEC = os.environ.get('CACHE_CODEC', 'json').lower()
+
+
+class CacheFormatError(ValueError):
+    """Cached value in a format this code cannot read"""
+
+
+def _binary_type():
+    # boto3 is only imported once a Binary value is actually seen
+    from boto3.dynamodb.types import Binary
+    return Binary
+
+
+def _tag(value):
+    if isinstance(value, dict):
+        return {key: _tag(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_tag(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        return {_tag(item) for item in value}
+    if isinstance(value, Decimal):
+        return ('D', str(value))
+    if isinstance(value, (str, bytes, int, float, bool)) or value is None:
+        return value
+    if isinstance(value, _binary_type()):
+        return ('B', bytes(value.value))
+    raise TypeError(f"Cannot cache value of type {type(value).__name__}")
+
+
+def _untag(value):
+    if isinstance(value, dict):
+        return {key: _untag(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_untag(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        return {_untag(item) for item in value}
+    if isinstance(value, tuple):
+        kind, payload = value
+        return Decimal(payload) if kind == 'D' else _binary_type()(payload)
+    return value
+
+
+def _is_legacy_json(raw):
+    # Binary headers are control bytes; JSON text never starts with one
+    if not raw:
+        raise CacheFormatError("Empty cache value")
+    return isinstance(raw, str) or raw[:1] >= b' '
+
+
+class JsonCodec:
+    """Plain JSON; raises TypeError for Decimal, sets and bytes"""
+
+    name = 'json'
+
+    def dumps(self, value):
+        return json.dumps(value)
+
+    def loads(self, raw):
+        if not _is_legacy_json(raw):
+            return BinaryCodec().loads(raw)
+        return json.loads(raw)
+
+
+class BinaryCodec:
+    """Versioned marshal encoding, zlib-compressed above compress_threshold bytes"""
+
+    name = 'binary'
+
+    def __init__(self, compress_threshold=COMPRESS_THRESHOLD, compress_level=COMPRESS_LEVEL):
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+
+    def dumps(self, value):
+        flags = 0
+        try:
+            body = marshal.dumps(value, MARSHAL_VERSION)
+        except ValueError:
+            # Decimal/Binary somewhere in the item: only then pay for the walk
+            body = marshal.dumps(_tag(value), MARSHAL_VERSION)
+            flags |= TAGGED
+        if len(body) > self.compress_threshold:
+            compressed = zlib.compress(body, self.compress_level)
+            if len(compressed) < len(body):
+                body = compressed
+                flags |= COMPRESSED
+        return bytes((FORMAT_VERSION << 4 | flags,)) + body
+
+    def loads(self, raw):
+        if _is_legacy_json(raw):
+            return json.loads(raw)
+        header = raw[0]
+        if header >> 4 != FORMAT_VERSION:
+            raise CacheFormatError(f"Unknown cache format version {header >> 4}")
+        try:
+            body = zlib.decompress(raw[1:]) if header & COMPRESSED else raw[1:]
+            value = marshal.loads(body)
+        except (zlib.error, EOFError, ValueError, TypeError) as e:
+            raise CacheFormatError(f"Corrupt cache value: {e}") from e
+        return _untag(value) if header & TAGGED else value
+
+
+CODECS = {'json': JsonCodec, 'binary': BinaryCodec}
+
+
+def default_codec():
+    """Codec selected by CACHE_CODEC"""
+    return CODECS.get(CACHE_CODEC, JsonCodec)()
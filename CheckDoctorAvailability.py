@@ -1,52 +1,39 @@
-import boto3
 import json
-import redis
 import os
+import AwsClients
+import Metrics
+from AppointmentStore import APPOINTMENTS_TABLE, query_patient_day
+from AvailabilityCache import DOCTOR_TTL, doctor_key, get_doctor_day
+from DoctorSchedule import DaySchedule, to_minutes
+from SlotReservation import RESERVATION_MODE
+from TieredCache import TieredCache
 
-# Initialize DynamoDB
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1') # multi-region support
+# In-process LRU in front of Redis for doctor:{id}; unknown doctors are cached briefly
+doctor_cache = TieredCache(AwsClients.redis, ttl=DOCTOR_TTL, local_ttl=300, negative_ttl=60, name='doctor_cache')
 
-# Redis initialization
-try:
-    redis_endpoint = os.environ['REDIS_ENDPOINT']
-    redis_client = redis.Redis(
-        host=redis_endpoint,
-        port=6379,
-        decode_responses=True,
-        ssl=True,
-        socket_timeout=5,
-        socket_connect_timeout=5
-    )
-    redis_available = True
-    print("Successfully connected to Redis")
-except Exception as e:
-    print(f"Redis connection error: {e}")
-    redis_available = False
+# PATIENT_OVERLAP_CHECK=true: also reject a time overlapping one of the patient's
+# own appointments that day (one PatientDateIndex query per check)
+PATIENT_OVERLAP_CHECK = os.environ.get('PATIENT_OVERLAP_CHECK', 'false').lower() == 'true'
+
+def load_doctor(doctor_id):
+    response = AwsClients.table('Doctors').get_item(Key={'DoctorID': doctor_id})
+    return response.get('Item')
 
 def check_conflicts(start_time, end_time, appointments):
-    """Helper function to check for conflicts with more detailed logging"""
-    for appt in appointments:
-        # Log appointment we're checking against
-        print(f"Checking against appointment: {appt['AppointmentID']}, Time: {appt['StartTime']}-{appt['EndTime']}")
-        
-        # Case 1: New appointment start time falls within existing appointment
-        if start_time >= appt['StartTime'] and start_time <= appt['EndTime']:
-            print(f"CONFLICT: New start time {start_time} falls within existing appointment {appt['StartTime']}-{appt['EndTime']}")
-            return True
-            
-        # Case 2: New appointment end time falls within existing appointment
-        if end_time >= appt['StartTime'] and end_time <= appt['EndTime']:
-            print(f"CONFLICT: New end time {end_time} falls within existing appointment {appt['StartTime']}-{appt['EndTime']}")
-            return True
-            
-        # Case 3: New appointment completely encompasses existing appointment
-        if start_time <= appt['StartTime'] and end_time >= appt['EndTime']:
-            print(f"CONFLICT: New appointment {start_time}-{end_time} encompasses existing appointment {appt['StartTime']}-{appt['EndTime']}")
-            return True
-    
-    print("No conflicts found")
-    return False
+    """Helper function to check the requested time against the doctor's booked intervals"""
+    schedule = DaySchedule.from_appointments(appointments)
+    has_conflict = schedule.conflicts(to_minutes(start_time), to_minutes(end_time))
+    Metrics.debug("%s for %s-%s against %d appointments", 'CONFLICT' if has_conflict else 'No conflicts',
+                  start_time, end_time, len(schedule))
+    return has_conflict
 
+def patient_conflicts(appointments_table, patient_id, appointment_date, start_time, end_time, appointment_id=None):
+    """True if the patient already has an overlapping appointment (other than appointment_id) that day"""
+    appointments = [appt for appt in query_patient_day(appointments_table, patient_id, appointment_date)
+                    if appt.get('AppointmentID') != appointment_id]
+    return check_conflicts(start_time, end_time, appointments)
+
+@Metrics.instrument('CheckDoctorAvailability')
 def lambda_handler(event, context):
     # Get doctor ID and appointment details from event
     doctor_id = event.get('DoctorID')
@@ -54,106 +41,60 @@ def lambda_handler(event, context):
     start_time = event.get('StartTime')
     end_time = event.get('EndTime')
     
-    print(f"Checking availability for Dr. {doctor_id} on {appointment_date} from {start_time} to {end_time}")
-    
-    # Create cache keys
-    doctor_cache_key = f"doctor:{doctor_id}"
-    appointments_cache_key = f"appointments:{doctor_id}:{appointment_date}"
-    availability_result_key = f"availability:{doctor_id}:{appointment_date}:{start_time}:{end_time}"
+    Metrics.debug("Checking availability for Dr. %s on %s from %s to %s", doctor_id, appointment_date, start_time, end_time)
     
-    # ALWAYS check DynamoDB first for fresh appointment data, cache results for later
-    # This ensures we don't miss newly created appointments
-    appointments_table = dynamodb.Table('Appointments')
+    # Cache-aside reads: ConfirmBooking bumps the doctor-day version on every write,
+    # so a cached schedule is only served while it is still current
+    appointments_table = AwsClients.table(APPOINTMENTS_TABLE)
+    cache = AwsClients.redis
     
     try:
-        # Get fresh appointment data from DynamoDB
-        print(f"Checking latest appointments directly from DynamoDB")
-        appointment_response = appointments_table.scan(
-            FilterExpression='DoctorID = :doctor_id AND AppointmentDate = :date',
-            ExpressionAttributeValues={
-                ':doctor_id': doctor_id,
-                ':date': appointment_date
-            }
-        )
-        
-        # Get the latest appointments data
-        appointments = appointment_response.get('Items', [])
-        print(f"Found {len(appointments)} appointments in DynamoDB")
-        
-        # Update cache with fresh appointment data
-        if redis_available:
-            try:
-                redis_client.setex(appointments_cache_key, 600, json.dumps(appointments))
-                print(f"Updated appointments cache with fresh data")
-            except Exception as e:
-                print(f"Cache storage error: {e}")
-        
-        # Now check for conflicts with the fresh data
-        has_conflicts = check_conflicts(start_time, end_time, appointments)
+        # In reservation mode ConfirmBooking claims the slots atomically (and
+        # returns 409 itself), so this read would only be advisory: skip it
+        if not RESERVATION_MODE:
+            appointments = get_doctor_day(cache, appointments_table, doctor_id, appointment_date)
+            Metrics.debug("Found %d appointments for the day", len(appointments))
+            
+            # Now check for conflicts
+            has_conflicts = check_conflicts(start_time, end_time, appointments)
+            
+            # If we found conflicts, doctor is not available
+            if has_conflicts:
+                Metrics.count('availability.conflicts')
+                return {
+                    'statusCode': 409,
+                    'body': json.dumps('Doctor is not available at the requested time'),
+                    'conflict': 'doctor'
+                }
         
-        # If we found conflicts, doctor is not available
-        if has_conflicts:
-            result = {
+        # Slot reservations only cover the doctor's side, so this runs in either mode
+        patient_id = event.get('PatientID')
+        if PATIENT_OVERLAP_CHECK and patient_id and patient_conflicts(
+                appointments_table, patient_id, appointment_date, start_time, end_time, event.get('AppointmentID')):
+            Metrics.count('availability.patient_conflicts')
+            # The workflow tells the two 409s apart by 'conflict' (CheckConflictType)
+            return {
                 'statusCode': 409,
-                'body': json.dumps('Doctor is not available at the requested time')
+                'body': json.dumps('Patient already has an appointment at the requested time'),
+                'conflict': 'patient'
             }
-            
-            # Cache negative result
-            if redis_available:
-                try:
-                    redis_client.setex(availability_result_key, 600, json.dumps(result))
-                except Exception as e:
-                    print(f"Cache storage error: {e}")
-            
-            print(f"Returning 409 - Doctor not available")
-            return result
         
         # No conflicts, now get doctor details
-        doctors_table = dynamodb.Table('Doctors')
-        doctor_response = doctors_table.get_item(
-            Key={
-                'DoctorID': doctor_id
-            }
-        )
+        doctor_data = doctor_cache.get(doctor_key(doctor_id), lambda: load_doctor(doctor_id))
         
-        if 'Item' not in doctor_response:
-            result = {
+        if doctor_data is None:
+            return {
                 'statusCode': 404,
                 'body': json.dumps(f'Doctor with ID {doctor_id} not found')
             }
-            
-            if redis_available:
-                try:
-                    redis_client.setex(availability_result_key, 300, json.dumps(result))
-                except Exception as e:
-                    print(f"Cache storage error: {e}")
-            return result
-        
-        # Cache doctor details
-        doctor_data = doctor_response['Item']
-        if redis_available:
-            try:
-                redis_client.setex(doctor_cache_key, 1800, json.dumps(doctor_data))
-            except Exception as e:
-                print(f"Cache storage error: {e}")
         
         # Doctor is available
-        result = {
+        Metrics.count('availability.available')
+        return {
             'statusCode': 200,
             'body': json.dumps('Doctor is available'),
             'doctorDetails': doctor_data
         }
-        
-        # Cache positive result (short TTL)
-        if redis_available:
-            try:
-                # Short TTL (1 minute) for positive results to reduce chance of race conditions
-                redis_client.setex(availability_result_key, 60, json.dumps(result))
-            except Exception as e:
-                print(f"Cache storage error: {e}")
-        
-        print(f"Returning 200 - Doctor is available")
-        return result
     except Exception as e:
         error_result = {
             'statusCode': 500,
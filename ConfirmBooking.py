@@ -1,10 +1,14 @@
-import boto3
 import json
 import uuid
 from datetime import datetime
+import AwsClients
+import Metrics
+from AppointmentStore import APPOINTMENTS_TABLE, put_appointment
+from AvailabilityCache import record_booking
+from ReminderQueue import REMINDER_DUE_TABLE, schedule_reminders
+from SlotReservation import RESERVATION_MODE, SlotConflict, reserve_appointment
 
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1') # us-east-1 and us-west-2 specific
-
+@Metrics.instrument('ConfirmBooking')
 def lambda_handler(event, context):
     # Get appointment details from event
     patient_id = event.get('PatientID')
@@ -17,22 +21,48 @@ def lambda_handler(event, context):
     appointment_id = event.get('AppointmentID', f'A{str(uuid.uuid4())[:8]}')
     
     # Access DynamoDB table
-    appointments_table = dynamodb.Table('Appointments')
+    appointments_table = AwsClients.table(APPOINTMENTS_TABLE)
     
     try:
         # Create appointment in DynamoDB
-        response = appointments_table.put_item(
-            Item={
-                'AppointmentID': appointment_id,
-                'PatientID': patient_id,
-                'DoctorID': doctor_id,
-                'AppointmentDate': appointment_date,
-                'StartTime': start_time,
-                'EndTime': end_time,
-                'AppointmentStatus': 'Confirmed',
-                'CreatedAt': datetime.now().isoformat()
-            }
-        )
+        appointment = {
+            'AppointmentID': appointment_id,
+            'PatientID': patient_id,
+            'DoctorID': doctor_id,
+            'AppointmentDate': appointment_date,
+            'StartTime': start_time,
+            'EndTime': end_time,
+            'AppointmentStatus': 'Confirmed',
+            'CreatedAt': datetime.now().isoformat()
+        }
+        if RESERVATION_MODE:
+            # Conflict check and write in one transaction: slot locks + the row
+            try:
+                created = reserve_appointment(AwsClients.client('dynamodb'), APPOINTMENTS_TABLE, appointment)
+            except SlotConflict as e:
+                Metrics.count('bookings.conflicts')
+                Metrics.debug("Reservation rejected: %s", e)
+                return {
+                    'statusCode': 409,
+                    'body': json.dumps('Doctor is not available at the requested time')
+                }
+            if not created:
+                Metrics.count('bookings.retried')
+        else:
+            put_appointment(appointments_table, appointment)
+        
+        # Invalidate (and incrementally extend) the cached doctor-day schedule
+        if not record_booking(AwsClients.redis, appointment):
+            Metrics.count('schedule_cache.invalidated')
+        Metrics.count('bookings.confirmed')
+
+        # File the reminders in the due index. The booking stands if this fails,
+        # but in queue mode the appointment then gets no reminder (see the metric)
+        try:
+            Metrics.count('reminders.scheduled', schedule_reminders(AwsClients.table(REMINDER_DUE_TABLE), appointment))
+        except Exception as e:
+            Metrics.count('reminders.schedule_errors')
+            print(f"Error scheduling reminders for appointment {appointment_id}: {e}")
         
         return {
             'statusCode': 201,
@@ -46,6 +76,7 @@ def lambda_handler(event, context):
             }
         }
     except Exception as e:
+        print(f"Error confirming appointment {appointment_id}: {e}")
         return {
             'statusCode': 500,
             'body': json.dumps(f'Error confirming appointment: {str(e)}')
@@ -0,0 +1,45 @@
+from bisect import bisect_left
+
+
+def to_minutes(time_str):
+    """'HH:MM' (or 'HH:MM:SS') -> minutes since midnight"""
+    parts = time_str.split(':')
+    return int(parts[0]) * 60 + int(parts[1])
+
+
+class DaySchedule:
+    """
+    One doctor's booked intervals for a day, as sorted (start, end) minute offsets.
+
+    Intervals are half-open [start, end), so back-to-back appointments
+    (10:00-10:30 then 10:30-11:00) do not conflict. max_ends[i] holds the
+    latest end among the first i+1 intervals, which keeps the overlap check
+    a single bisect even if stored intervals overlap each other.
+    """
+
+    def __init__(self, intervals=()):
+        self.starts = []
+        self.ends = []
+        self.max_ends = []
+        for start, end in sorted(intervals):
+            self.starts.append(start)
+            self.ends.append(end)
+            self.max_ends.append(max(end, self.max_ends[-1]) if self.max_ends else end)
+
+    @classmethod
+    def from_appointments(cls, appointments):
+        return cls((to_minutes(appt['StartTime']), to_minutes(appt['EndTime'])) for appt in appointments)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def conflicts(self, start, end):
+        """True if [start, end) overlaps any booked interval"""
+        # Intervals starting before `end` are starts[:index]; one of them overlaps
+        # iff the latest end among them is after `start`
+        index = bisect_left(self.starts, end)
+        return index > 0 and self.max_ends[index - 1] > start
+
+    def free_slots(self, candidates):
+        """Return the (start, end) candidates that do not overlap any booked interval"""
+        return [(start, end) for start, end in candidates if not self.conflicts(start, end)]
@@ -0,0 +1,62 @@
+import os
+from datetime import datetime, timedelta
+import AwsClients
+import Metrics
+from ApiGateway import parse_request, response
+from AppointmentStore import APPOINTMENTS_TABLE
+from AvailabilityCache import get_busy_masks
+from SlotBitmap import DAY_END, DAY_START, free_windows
+
+DEFAULT_SEARCH_DAYS = int(os.environ.get('FREE_SLOTS_DEFAULT_DAYS', '7'))
+MAX_SEARCH_DAYS = int(os.environ.get('FREE_SLOTS_MAX_DAYS', '31'))
+MAX_RESULTS = int(os.environ.get('FREE_SLOTS_MAX_RESULTS', '50'))
+# Dates read per Redis pipeline; the search stops at the first batch that fills Count
+BATCH_DAYS = int(os.environ.get('FREE_SLOTS_BATCH_DAYS', '7'))
+
+def find_free_slots(doctor_id, from_date, to_date, duration_minutes, count, now=None):
+    """Earliest `count` free windows of `duration_minutes` between the two dates (inclusive)"""
+    now = now or datetime.now()
+    today = now.strftime('%Y-%m-%d')
+    start = max(datetime.strptime(from_date, '%Y-%m-%d'), datetime.strptime(today, '%Y-%m-%d'))
+    end = datetime.strptime(to_date, '%Y-%m-%d')
+    dates = [(start + timedelta(days=offset)).strftime('%Y-%m-%d') for offset in range((end - start).days + 1)]
+
+    appointments_table = AwsClients.table(APPOINTMENTS_TABLE)
+    windows = []
+    for batch_start in range(0, len(dates), BATCH_DAYS):
+        batch = dates[batch_start:batch_start + BATCH_DAYS]
+        masks = get_busy_masks(AwsClients.redis, appointments_table, doctor_id, batch)
+        for appointment_date in batch:
+            not_before = now.strftime('%H:%M') if appointment_date == today else None
+            for start_time, end_time in free_windows(masks[appointment_date], duration_minutes,
+                                                     DAY_START, DAY_END, not_before):
+                windows.append({'AppointmentDate': appointment_date, 'StartTime': start_time, 'EndTime': end_time})
+                if len(windows) >= count:
+                    return windows
+    return windows
+
+@Metrics.instrument('FindFreeSlots')
+def lambda_handler(event, context):
+    try:
+        params = parse_request(event)
+        doctor_id = params.get('DoctorID')
+        from_date = params.get('FromDate') or datetime.now().strftime('%Y-%m-%d')
+        to_date = params.get('ToDate') or (datetime.strptime(from_date, '%Y-%m-%d')
+                                           + timedelta(days=DEFAULT_SEARCH_DAYS - 1)).strftime('%Y-%m-%d')
+        duration_minutes = int(params.get('DurationMinutes', 30))
+        count = min(int(params.get('Count', 5)), MAX_RESULTS)
+        span = (datetime.strptime(to_date, '%Y-%m-%d') - datetime.strptime(from_date, '%Y-%m-%d')).days + 1
+    except (ValueError, TypeError) as e:
+        return response(400, {"error": f"Invalid request: {e}"})
+
+    if not doctor_id or duration_minutes <= 0 or count <= 0 or not 0 < span <= MAX_SEARCH_DAYS:
+        return response(400, {"error": f"DoctorID is required, DurationMinutes and Count must be positive "
+                                       f"and the range at most {MAX_SEARCH_DAYS} days"})
+
+    try:
+        windows = find_free_slots(doctor_id, from_date, to_date, duration_minutes, count)
+        Metrics.count('free_slots.returned', len(windows))
+        return response(200, {'DoctorID': doctor_id, 'DurationMinutes': duration_minutes, 'FreeSlots': windows})
+    except Exception as e:
+        print(f"Error finding free slots for Dr. {doctor_id}: {e}")
+        return response(500, {"error": f"Error finding free slots: {str(e)}"})
@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import Metrics
+from AwsClients import redis_error, resolve_redis
+
+# How long a submission is remembered; retries and double-clicks arrive within seconds
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', '3600'))
+# Without a client key the booking itself is the ID, and the answer (async: only
+# "started") may not hold for long, so it is only replayed to a double-click
+FINGERPRINT_TTL = int(os.environ.get('IDEMPOTENCY_FINGERPRINT_TTL', '10'))
+# A claim whose owner died (timeout, crash) is released after this, so the client can retry
+IN_PROGRESS_TTL = int(os.environ.get('IDEMPOTENCY_IN_PROGRESS_TTL', '60'))
+
+HEADER = 'idempotency-key'
+PAYLOAD_FIELD = 'IdempotencyKey'
+
+# Booking fields that identify a submission when the client sends no key
+FINGERPRINT_FIELDS = ('PatientID', 'DoctorID', 'AppointmentDate', 'StartTime', 'EndTime')
+
+IN_PROGRESS = 'in_progress'
+COMPLETED = 'completed'
+
+
+def request_key(event, payload):
+    """Client-supplied key: Idempotency-Key header (any case) or IdempotencyKey in the body"""
+    for name, value in (event.get('headers') or {}).items():
+        if name.lower() == HEADER and value:
+            return value
+    return payload.get(PAYLOAD_FIELD)
+
+
+def fingerprint(payload):
+    return hashlib.sha256(json.dumps([payload.get(field) for field in FINGERPRINT_FIELDS]).encode('utf-8')).hexdigest()
+
+
+def submission_id(payload, key=None):
+    """
+    Stable ID for a submission, scoped to the patient: the client's key if it
+    sent one, otherwise the booking itself (so an identical double-click is
+    caught without client changes).
+    """
+    source = key if key is not None else fingerprint(payload)
+    return hashlib.sha256(f"{payload.get('PatientID')}:{source}".encode('utf-8')).hexdigest()
+
+
+def record_key(submission):
+    return f"idempotency:booking:{submission}"
+
+
+def claim(redis_client, submission, payload):
+    """
+    Claim a submission with SET NX. Returns None if this call owns it (go ahead),
+    otherwise the existing record: {'state': 'in_progress' | 'completed',
+    'fingerprint': ..., 'response': ...}. Also None if Redis is unavailable.
+    """
+    provider, redis_client = redis_client, resolve_redis(redis_client)
+    if redis_client is None:
+        Metrics.count('idempotency.unavailable')
+        return None
+
+    record = json.dumps({'state': IN_PROGRESS, 'fingerprint': fingerprint(payload)})
+    try:
+        # SET NX and GET in one round trip; the GET sees our own record if the SET won
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.set(record_key(submission), record, nx=True, ex=IN_PROGRESS_TTL)
+        pipe.get(record_key(submission))
+        claimed, existing = pipe.execute()
+        if claimed or not existing:
+            return None
+        return json.loads(existing)
+    except Exception as e:
+        Metrics.count('idempotency.errors')
+        redis_error(provider, e)
+        print(f"Idempotency claim error: {e}")
+        return None
+
+
+def complete(redis_client, submission, payload, response, ttl=IDEMPOTENCY_TTL):
+    """Remember the final response for ttl seconds so duplicates get the same answer"""
+    provider, redis_client = redis_client, resolve_redis(redis_client)
+    if redis_client is None:
+        return
+    record = json.dumps({'state': COMPLETED, 'fingerprint': fingerprint(payload), 'response': response})
+    try:
+        redis_client.set(record_key(submission), record, ex=ttl)
+    except Exception as e:
+        Metrics.count('idempotency.errors')
+        redis_error(provider, e)
+        print(f"Idempotency store error: {e}")
+
+
+def release(redis_client, submission):
+    """Drop a claim after a failure, so a retry runs again"""
+    provider, redis_client = redis_client, resolve_redis(redis_client)
+    if redis_client is None:
+        return
+    try:
+        redis_client.delete(record_key(submission))
+    except Exception as e:
+        Metrics.count('idempotency.errors')
+        redis_error(provider, e)
+        print(f"Idempotency release error: {e}")
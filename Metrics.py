@@ -0,0 +1,247 @@
+import functools
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'ca2Cloud')
+
+# Share of invocations whose debug() lines are printed (LOG_LEVEL=DEBUG prints all)
+DEBUG_SAMPLE_RATE = float(os.environ.get('METRICS_DEBUG_SAMPLE_RATE', '0.01'))
+DEBUG_ALL = os.environ.get('LOG_LEVEL', '').upper() == 'DEBUG'
+
+# EMF allows at most 100 metric definitions per directive
+EMF_METRIC_LIMIT = 100
+
+# Set METRICS_ENABLED=false to drop the per-invocation record (timers still run)
+ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+
+# The active invocation. A Lambda container serves one invocation at a time, but
+# handlers fan work out to threads, so this is process-wide rather than thread-local
+_current = None
+_lock = threading.Lock()
+
+
+class Invocation:
+    """Timers, counters and properties collected during one handler invocation"""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.started = time.perf_counter()
+        self.timers = {}
+        self.counters = {}
+        self.properties = {}
+        self.sampled = DEBUG_ALL or random.random() < DEBUG_SAMPLE_RATE
+
+    def record(self, name, elapsed_ms):
+        with _lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                self.timers[name] = [1, elapsed_ms, elapsed_ms]
+            else:
+                timer[0] += 1
+                timer[1] += elapsed_ms
+                if elapsed_ms > timer[2]:
+                    timer[2] = elapsed_ms
+
+    def count(self, name, value=1):
+        with _lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_record(self):
+        """
+        CloudWatch embedded metric format: one JSON line that CloudWatch Logs
+        turns into metrics with a Handler dimension. Each timer reports its
+        total and max milliseconds and its call count.
+        """
+        duration_ms = (time.perf_counter() - self.started) * 1000
+        metrics = [{'Name': 'Duration', 'Unit': 'Milliseconds'}]
+        values = {'Duration': round(duration_ms, 3)}
+        for name, (calls, total_ms, max_ms) in sorted(self.timers.items()):
+            metrics.append({'Name': name, 'Unit': 'Milliseconds'})
+            metrics.append({'Name': f'{name}.calls', 'Unit': 'Count'})
+            metrics.append({'Name': f'{name}.max', 'Unit': 'Milliseconds'})
+            values[name] = round(total_ms, 3)
+            values[f'{name}.calls'] = calls
+            values[f'{name}.max'] = round(max_ms, 3)
+        for name, value in sorted(self.counters.items()):
+            metrics.append({'Name': name, 'Unit': 'Count'})
+            values[name] = value
+
+        record = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [
+                    {'Namespace': NAMESPACE, 'Dimensions': [['Handler']], 'Metrics': metrics[i:i + EMF_METRIC_LIMIT]}
+                    for i in range(0, len(metrics), EMF_METRIC_LIMIT)
+                ]
+            },
+            'Handler': self.handler
+        }
+        record.update(self.properties)
+        record.update(values)
+        return record
+
+
+def current():
+    return _current
+
+
+def instrument(handler_name):
+    """
+    Decorator for a lambda_handler: collects metrics for the invocation and
+    prints them as one EMF line at the end. A handler called from inside another
+    instrumented handler (the fused booking workflow) is recorded as a timer
+    'handler.<name>' of the outer invocation instead.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            global _current
+            if _current is not None:
+                with timer(f'handler.{handler_name}'):
+                    return handler(event, context)
+
+            invocation = Invocation(handler_name)
+            request_id = getattr(context, 'aws_request_id', None)
+            if request_id:
+                invocation.properties['RequestId'] = request_id
+            _current = invocation
+            try:
+                return handler(event, context)
+            except Exception:
+                invocation.count('Errors')
+                raise
+            finally:
+                _current = None
+                if ENABLED:
+                    print(json.dumps(invocation.to_record(), separators=(',', ':')))
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def timer(name):
+    """Time the block as `name` in the current invocation (no-op outside one)"""
+    invocation = _current
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if invocation is not None:
+            invocation.record(name, (time.perf_counter() - started) * 1000)
+
+
+def count(name, value=1):
+    invocation = _current
+    if invocation is not None:
+        invocation.count(name, value)
+
+
+def set_property(name, value):
+    """Searchable (non-metric) field on the invocation's record"""
+    invocation = _current
+    if invocation is not None:
+        invocation.properties[name] = value
+
+
+def debug(message, *args):
+    """Log only for sampled invocations; formatting is skipped otherwise"""
+    invocation = _current
+    if DEBUG_ALL or (invocation is not None and invocation.sampled):
+        print(message % args if args else message)
+
+
+class TimedClient:
+    """
+    Proxy for a boto3 client/resource/Table or Redis client that times each
+    method call as '<service>.<method>'. Non-callable attributes (exceptions,
+    meta, name) and the names in `untimed` pass straight through.
+    """
+
+    def __init__(self, target, service, untimed=()):
+        self._target = target
+        self._service = service
+        self._untimed = frozenset(untimed)
+        self._methods = {}
+
+    def __getattr__(self, name):
+        method = self._methods.get(name)
+        if method is not None:
+            return method
+        attr = getattr(self._target, name)
+        if name.startswith('_') or name in self._untimed or isinstance(attr, type) or not callable(attr):
+            return attr
+
+        metric = f'{self._service}.{name}'
+
+        def timed(*args, **kwargs):
+            invocation = _current
+            if invocation is None:
+                return attr(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                invocation.record(metric, (time.perf_counter() - started) * 1000)
+
+        self._methods[name] = timed
+        return timed
+
+
+class TimedTable(TimedClient):
+    """TimedClient for a DynamoDB Table, timed as 'dynamodb.<table>.<method>'"""
+
+    def __init__(self, table):
+        super().__init__(table, f'dynamodb.{table.name}')
+
+    def batch_writer(self, *args, **kwargs):
+        return _TimedBatchWriter(self._target.batch_writer(*args, **kwargs), f'{self._service}.batch_write')
+
+
+class _TimedBatchWriter:
+    """Buffered puts/deletes flush inside put_item/delete_item/__exit__, so those are timed"""
+
+    def __init__(self, writer, metric):
+        self._writer = writer
+        self._metric = metric
+
+    def __enter__(self):
+        self._writer.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        with timer(self._metric):
+            return self._writer.__exit__(*exc)
+
+    def put_item(self, *args, **kwargs):
+        with timer(self._metric):
+            return self._writer.put_item(*args, **kwargs)
+
+    def delete_item(self, *args, **kwargs):
+        with timer(self._metric):
+            return self._writer.delete_item(*args, **kwargs)
+
+
+class TimedRedis(TimedClient):
+    """TimedClient for Redis; a pipeline is timed once, on execute()"""
+
+    def __init__(self, target):
+        super().__init__(target, 'redis')
+
+    def pipeline(self, *args, **kwargs):
+        return _TimedPipeline(self._target.pipeline(*args, **kwargs))
+
+
+class _TimedPipeline:
+    def __init__(self, pipeline):
+        self._pipeline = pipeline
+
+    def __getattr__(self, name):
+        return getattr(self._pipeline, name)
+
+    def execute(self, *args, **kwargs):
+        with timer('redis.pipeline'):
+            return self._pipeline.execute(*args, **kwargs)
@@ -0,0 +1,54 @@
+import json
+import time
+import Metrics
+
+# SendMessageBatch accepts at most 10 entries per request
+SQS_BATCH_LIMIT = 10
+
+
+def build_queue_messages(fields, recipients=('patient', 'doctor'), message_type='Notification'):
+    """
+    One SQS message body per recipient. The shared appointment fields are
+    serialized once; each body only appends its RecipientType/MessageType.
+    """
+    common = json.dumps(fields)[:-1]
+    separator = ', ' if fields else ''
+    suffix = f'"MessageType": {json.dumps(message_type)}}}'
+    return [f'{common}{separator}"RecipientType": {json.dumps(recipient)}, {suffix}' for recipient in recipients]
+
+
+def send_batch(sqs, queue_url, bodies, max_attempts=3):
+    """
+    Enqueue message bodies with SendMessageBatch, retrying only the entries that
+    failed (sender faults are not retried). Raises if any entry is still unsent.
+    """
+    for offset in range(0, len(bodies), SQS_BATCH_LIMIT):
+        pending = {str(offset + n): body for n, body in enumerate(bodies[offset:offset + SQS_BATCH_LIMIT])}
+
+        for attempt in range(max_attempts):
+            try:
+                response = sqs.send_message_batch(
+                    QueueUrl=queue_url,
+                    Entries=[{'Id': entry_id, 'MessageBody': body} for entry_id, body in pending.items()]
+                )
+            except Exception as e:
+                if attempt == max_attempts - 1:
+                    raise
+                Metrics.count('sqs.batch_retries')
+                print(f"SendMessageBatch error, retrying: {e}")
+            else:
+                for entry in response.get('Successful', []):
+                    pending.pop(entry['Id'], None)
+                failed = response.get('Failed', [])
+                fatal = [entry for entry in failed if entry.get('SenderFault')]
+                if fatal:
+                    raise RuntimeError(f"SQS rejected messages: {[entry.get('Message') for entry in fatal]}")
+                if not pending:
+                    break
+                Metrics.count('sqs.entry_retries', len(pending))
+                print(f"Retrying {len(pending)} failed SQS entries: {[entry.get('Code') for entry in failed]}")
+            time.sleep(min(1.0, 0.05 * (2 ** attempt)))
+        else:
+            raise RuntimeError(f"{len(pending)} SQS messages not sent after {max_attempts} attempts")
+
+    return len(bodies)
@@ -0,0 +1,197 @@
+import json
+import os
+from json.encoder import encode_basestring_ascii
+from string import Formatter
+
+DEFAULT_LOCALE = os.environ.get('NOTIFICATION_LOCALE', 'en')
+
+# Fields every template may use (appointment_count and agenda are set for digests only)
+FIELDS = ('patient_name', 'doctor_name', 'appointment_date', 'start_time', 'appointment_count', 'agenda')
+
+_formatter = Formatter()
+
+
+def _parse(template):
+    pieces = list(_formatter.parse(template))
+    for _, field, spec, conversion in pieces:
+        if field is not None and (field not in FIELDS or spec or conversion):
+            raise ValueError(f"Unsupported template field {{{field}}} in {template!r}")
+    return pieces
+
+
+def _json_escaped_format(template):
+    """Format string whose literal text is already JSON-escaped (values are escaped at render time)"""
+    escaped = []
+    for literal, field, _, _ in _parse(template):
+        escaped.append(json.dumps(literal)[1:-1].replace('{', '{{').replace('}', '}}'))
+        if field is not None:
+            escaped.append('{' + field + '}')
+    return ''.join(escaped)
+
+
+class TemplateSet:
+    """All channels of one (locale, message type, recipient), validated and compiled once"""
+
+    def __init__(self, subject, channels):
+        _parse(subject)
+        for template in channels.values():
+            _parse(template)
+        self.subject = subject
+        self.channels = dict(channels)
+        # Whole SNS MessageStructure='json' payload as a single format string
+        members = [json.dumps(name) + ': "' + _json_escaped_format(template) + '"'
+                   for name, template in self.channels.items()]
+        self.structure = '{{' + ', '.join(members) + '}}'
+        self.structure_fields = tuple(sorted({field for template in self.channels.values()
+                                              for _, field, _, _ in _parse(template) if field is not None}))
+
+    def render(self, context):
+        """{'subject': ..., channel: text, ...}"""
+        rendered = {'subject': self.subject.format_map(context)}
+        for name, template in self.channels.items():
+            rendered[name] = template.format_map(context)
+        return rendered
+
+    def render_structure(self, context):
+        """(subject, JSON message) for sns.publish(MessageStructure='json'), all channels in one pass"""
+        escaped = {field: encode_basestring_ascii(str(context[field]))[1:-1] for field in self.structure_fields}
+        return self.subject.format_map(context), self.structure.format_map(escaped)
+
+
+_registry = {}
+
+
+def register(message_type, recipient, subject, channels, locale=DEFAULT_LOCALE):
+    _registry[(locale, message_type, recipient)] = TemplateSet(subject, channels)
+
+
+def get_template(message_type, recipient, locale=None):
+    """TemplateSet for the locale, falling back to the default locale; None if unknown"""
+    return (_registry.get((locale or DEFAULT_LOCALE, message_type, recipient))
+            or _registry.get((DEFAULT_LOCALE, message_type, recipient)))
+
+
+def template_context(patient_name, doctor_name, appointment_date, start_time):
+    return {
+        'patient_name': patient_name,
+        'doctor_name': doctor_name,
+        'appointment_date': appointment_date,
+        'start_time': start_time
+    }
+
+
+def digest_context(doctor_name, appointment_date, start_time, appointment_count, agenda):
+    """Context for a doctor's daily agenda; start_time is the first appointment's"""
+    return {
+        'doctor_name': doctor_name,
+        'appointment_date': appointment_date,
+        'start_time': start_time,
+        'appointment_count': appointment_count,
+        'agenda': agenda
+    }
+
+
+# Booking confirmations (AmazonSQSNotification)
+register(
+    'Notification', 'patient',
+    subject="Appointment Confirmation for {appointment_date}",
+    channels={
+        'default': "Dear {patient_name},\n\nYour appointment with {doctor_name} has been confirmed for {appointment_date} at {start_time}.\n\nPlease arrive 15 minutes early and bring your insurance card."
+    }
+)
+register(
+    'Notification', 'doctor',
+    subject="New Appointment: {patient_name} on {appointment_date}",
+    channels={
+        'default': "Dear {doctor_name},\n\nA new appointment has been scheduled with {patient_name} on {appointment_date} at {start_time}.\n\nPlease review patient details in your system."
+    }
+)
+
+# Queued reminders (AmazonSQSNotification)
+register(
+    'Reminder', 'patient',
+    subject="Appointment Reminder for Tomorrow",
+    channels={
+        'default': "Dear {patient_name},\n\nThis is a reminder about your appointment with {doctor_name} tomorrow ({appointment_date}) at {start_time}."
+    }
+)
+register(
+    'Reminder', 'doctor',
+    subject="Appointment Reminder: {patient_name} Tomorrow",
+    channels={
+        'default': "Dear {doctor_name},\n\nThis is a reminder about your appointment with {patient_name} tomorrow ({appointment_date}) at {start_time}."
+    }
+)
+
+# Scheduled reminder run (AppointmentReminder, SNS MessageStructure='json')
+register(
+    'ScheduledReminder', 'patient',
+    subject="Reminder: Your appointment tomorrow at {start_time}",
+    channels={
+        'default': "Reminder: Your appointment with {doctor_name} is tomorrow at {start_time}.",
+        'email': (
+            "Appointment Reminder\n"
+            "Dear {patient_name},\n"
+            "This is a friendly reminder about your appointment with {doctor_name} tomorrow ({appointment_date}) at {start_time}.\n"
+            "Please remember to:\n"
+            "    Bring your insurance card\n"
+            "    Arrive 15 minutes early\n"
+            "    Bring a list of current medications\n"
+            "If you need to reschedule, please call us at least 4 hours in advance.\n"
+        )
+    }
+)
+register(
+    'ScheduledReminder', 'doctor',
+    subject="Reminder: Appointment with {patient_name} tomorrow",
+    channels={
+        'default': "Reminder: Appointment with {patient_name} tomorrow at {start_time}.",
+        'email': (
+            "Appointment Reminder\n"
+            "Dear {doctor_name},\n"
+            "You have an appointment scheduled with {patient_name} tomorrow ({appointment_date}) at {start_time}.\n"
+            "Patient records are available in your portal.\n"
+        )
+    }
+)
+# Due-queue reminders not sent the day before, e.g. two hours ahead (AppointmentReminder)
+register(
+    'UpcomingReminder', 'patient',
+    subject="Reminder: Your appointment on {appointment_date} at {start_time}",
+    channels={
+        'default': "Reminder: Your appointment with {doctor_name} is on {appointment_date} at {start_time}.",
+        'email': (
+            "Appointment Reminder\n"
+            "Dear {patient_name},\n"
+            "This is a reminder about your appointment with {doctor_name} on {appointment_date} at {start_time}.\n"
+            "Please arrive 15 minutes early and bring your insurance card.\n"
+        )
+    }
+)
+register(
+    'UpcomingReminder', 'doctor',
+    subject="Reminder: Appointment with {patient_name} at {start_time}",
+    channels={
+        'default': "Reminder: Appointment with {patient_name} on {appointment_date} at {start_time}.",
+        'email': (
+            "Appointment Reminder\n"
+            "Dear {doctor_name},\n"
+            "You have an appointment scheduled with {patient_name} on {appointment_date} at {start_time}.\n"
+            "Patient records are available in your portal.\n"
+        )
+    }
+)
+register(
+    'ScheduledReminderDigest', 'doctor',
+    subject="Your agenda for tomorrow: {appointment_count} appointments",
+    channels={
+        'default': "Reminder: {appointment_count} appointments tomorrow ({appointment_date}), first at {start_time}.",
+        'email': (
+            "Appointment Agenda\n"
+            "Dear {doctor_name},\n"
+            "You have {appointment_count} appointments scheduled tomorrow ({appointment_date}):\n"
+            "{agenda}\n"
+            "Patient records are available in your portal.\n"
+        )
+    }
+)
@@ -1,9 +1,9 @@
-import boto3
 import json
+import AwsClients
+import Metrics
+from NotificationQueue import build_queue_messages, send_batch
 
-# Initialize SQS client
-sqs = boto3.client('sqs')
-
+@Metrics.instrument('NotifyPatientAndDoctor')
 def lambda_handler(event, context):
     # Queue URL from your SQS queue
     queue_url = "https://sqs.us-east-1.amazonaws.com/990308236413/NotificationQueue" # queue remains same across both regions
@@ -18,39 +18,18 @@ def lambda_handler(event, context):
         doctor_last_name = event['availabilityResult']['doctorDetails']['LastName']
         doctor_full_name = f"{doctor_first_name} {doctor_last_name}"
         
-        # Create separate messages for patient and doctor notifications
-        patient_message = {
+        # Patient and doctor messages share every appointment field; build them
+        # together and enqueue both in one request (failed entries are retried)
+        message_bodies = build_queue_messages({
             "PatientID": event['PatientID'],
             "PatientName": patient_full_name,
             "DoctorID": event['DoctorID'],
             "DoctorName": doctor_full_name,
             "AppointmentDate": event['AppointmentDate'],
-            "StartTime": event['StartTime'],
-            "RecipientType": "patient",
-            "MessageType": "Notification"
-        }
-        
-        doctor_message = {
-            "PatientID": event['PatientID'],
-            "PatientName": patient_full_name,
-            "DoctorID": event['DoctorID'],
-            "DoctorName": doctor_full_name,
-            "AppointmentDate": event['AppointmentDate'],
-            "StartTime": event['StartTime'],
-            "RecipientType": "doctor",
-            "MessageType": "Notification"
-        }
-
-        # Send both messages to SQS
-        sqs.send_message(
-            QueueUrl=queue_url,
-            MessageBody=json.dumps(patient_message)
-        )
-        
-        sqs.send_message(
-            QueueUrl=queue_url,
-            MessageBody=json.dumps(doctor_message)
-        )
+            "StartTime": event['StartTime']
+        })
+        send_batch(AwsClients.client('sqs'), queue_url, message_bodies)
+        Metrics.count('notifications.queued', len(message_bodies))
         
         return {
             'statusCode': 200,
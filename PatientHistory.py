@@ -0,0 +1,66 @@
+import base64
+import binascii
+import json
+import os
+from datetime import datetime
+import AwsClients
+import Metrics
+from ApiGateway import parse_request, response
+from AppointmentStore import APPOINTMENTS_TABLE, query_patient_page
+
+DEFAULT_LIMIT = int(os.environ.get('PATIENT_HISTORY_DEFAULT_LIMIT', '20'))
+MAX_LIMIT = int(os.environ.get('PATIENT_HISTORY_MAX_LIMIT', '100'))
+
+# Attributes of a PatientDateIndex LastEvaluatedKey (index keys + table keys)
+CURSOR_FIELDS = {'PatientID', 'AppointmentDate', 'AppointmentID', 'DoctorID'}
+
+def encode_cursor(last_key):
+    """Opaque page token: the query's LastEvaluatedKey as URL-safe base64 JSON"""
+    if not last_key:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(last_key, sort_keys=True, separators=(',', ':')).encode('utf-8')).decode('ascii')
+
+def decode_cursor(token, patient_id):
+    """ExclusiveStartKey from a page token; ValueError if it is malformed or for another patient"""
+    try:
+        last_key = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except (binascii.Error, UnicodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"malformed cursor ({e})")
+    if not isinstance(last_key, dict) or set(last_key) != CURSOR_FIELDS or last_key['PatientID'] != patient_id:
+        raise ValueError("cursor does not belong to this query")
+    return last_key
+
+@Metrics.instrument('PatientHistory')
+def lambda_handler(event, context):
+    """
+    A patient's appointments, one page at a time: PatientID, optional FromDate /
+    ToDate (YYYY-MM-DD), Order ('desc', newest first, or 'asc'), Limit and the
+    Cursor returned as NextCursor by the previous page (null on the last one).
+    """
+    try:
+        params = parse_request(event)
+        patient_id = params.get('PatientID')
+        from_date, to_date = params.get('FromDate'), params.get('ToDate')
+        for value in (from_date, to_date):
+            if value:
+                datetime.strptime(value, '%Y-%m-%d')
+        order = (params.get('Order') or 'desc').lower()
+        if order not in ('asc', 'desc'):
+            raise ValueError("Order must be 'asc' or 'desc'")
+        limit = min(int(params.get('Limit', DEFAULT_LIMIT)), MAX_LIMIT)
+        start_key = decode_cursor(params['Cursor'], patient_id) if params.get('Cursor') else None
+    except (ValueError, TypeError) as e:
+        return response(400, {"error": f"Invalid request: {e}"})
+
+    if not patient_id or limit <= 0:
+        return response(400, {"error": "PatientID is required and Limit must be positive"})
+
+    try:
+        appointments, last_key = query_patient_page(
+            AwsClients.table(APPOINTMENTS_TABLE), patient_id, from_date=from_date, to_date=to_date,
+            limit=limit, start_key=start_key, newest_first=order == 'desc')
+        Metrics.count('patient_history.appointments', len(appointments))
+        return response(200, {'Appointments': appointments, 'NextCursor': encode_cursor(last_key)})
+    except Exception as e:
+        print(f"Error listing patient appointments: {e}")
+        return response(500, {"error": f"Error listing patient appointments: {str(e)}"})
@@ -0,0 +1,144 @@
+import os
+from datetime import datetime, timedelta
+from AppointmentStore import query_pages, scan_pages
+
+# Reminder due index: partition key DueHour (S) = "YYYY-MM-DDTHH", sort key
+# ReminderID (S), with DynamoDB TTL enabled on ExpiresAt. ConfirmBooking files the
+# entries, so a reminder run reads a bucket or two instead of scanning Appointments.
+REMINDER_DUE_TABLE = os.environ.get('REMINDER_DUE_TABLE', 'ReminderDue')
+
+# Hours before the start time a reminder is due; "24,2" sends one the day before
+# and another two hours before
+LEAD_HOURS = tuple(int(hours) for hours in os.environ.get('REMINDER_LEAD_HOURS', '24').split(','))
+
+# Doctors on digest mode get their agenda at this hour the day before
+DIGEST_HOUR = int(os.environ.get('REMINDER_DIGEST_HOUR', '18'))
+
+# Earlier buckets re-read on every run, so entries due since the last run (a late
+# or failed run, or the rest of the previous hour) are still sent
+CATCHUP_HOURS = int(os.environ.get('REMINDER_CATCHUP_HOURS', '1'))
+
+# Unsent entries are left for TTL this long after they were due
+KEEP_HOURS = int(os.environ.get('REMINDER_KEEP_HOURS', '48'))
+
+# REMINDER_QUEUE_MODE=true: AppointmentReminder reads the due index instead of
+# scanning for tomorrow's appointments. ConfirmBooking files entries either way;
+# turn it on only after backfill_reminders() has filed them for existing bookings
+QUEUE_MODE = os.environ.get('REMINDER_QUEUE_MODE', 'false').lower() == 'true'
+
+# Entry kinds: one per appointment and lead time, one per doctor-day for digests
+APPOINTMENT_ENTRY = 'appointment'
+DIGEST_ENTRY = 'digest'
+
+APPOINTMENT_FIELDS = ('AppointmentID', 'PatientID', 'DoctorID', 'AppointmentDate', 'StartTime', 'EndTime')
+
+
+def due_hour(moment):
+    return moment.strftime('%Y-%m-%dT%H')
+
+
+def appointment_start(appointment):
+    return datetime.strptime(f"{appointment['AppointmentDate']} {appointment.get('StartTime') or '00:00'}", '%Y-%m-%d %H:%M')
+
+
+def _entry(due, reminder_id, kind, fields):
+    return dict(
+        fields,
+        DueHour=due_hour(due),
+        ReminderID=reminder_id,
+        Kind=kind,
+        DueAt=due.strftime('%Y-%m-%dT%H:%M'),
+        ExpiresAt=int((due + timedelta(hours=KEEP_HOURS)).timestamp())
+    )
+
+
+def reminder_entries(appointment, now):
+    """
+    Due index entries for an appointment. Entries already due (a booking made
+    inside the lead time) are left out: the booking confirmation covers them.
+    """
+    start = appointment_start(appointment)
+    fields = {field: appointment.get(field) for field in APPOINTMENT_FIELDS}
+    entries = []
+    for lead_hours in LEAD_HOURS:
+        due = start - timedelta(hours=lead_hours)
+        if due > now:
+            entries.append(_entry(due, f"{appointment['AppointmentID']}#{lead_hours}h", APPOINTMENT_ENTRY,
+                                  dict(fields, LeadHours=lead_hours)))
+
+    # Every booking of the doctor-day files the same digest entry (same key)
+    digest_due = datetime.strptime(appointment['AppointmentDate'], '%Y-%m-%d') - timedelta(hours=24 - DIGEST_HOUR)
+    if digest_due > now:
+        entries.append(_entry(digest_due, f"digest#{appointment['DoctorID']}#{appointment['AppointmentDate']}", DIGEST_ENTRY,
+                              {'DoctorID': appointment['DoctorID'], 'AppointmentDate': appointment['AppointmentDate']}))
+    return entries
+
+
+def schedule_reminders(due_table, appointment, now=None):
+    """File the appointment's reminders; returns the number of entries written"""
+    entries = reminder_entries(appointment, now or datetime.now())
+    with due_table.batch_writer() as batch:
+        for entry in entries:
+            batch.put_item(Item=entry)
+    return len(entries)
+
+
+def cancel_reminders(due_table, appointment):
+    """Drop an appointment's pending reminders (its doctor's digest re-reads the day when sent)"""
+    start = appointment_start(appointment)
+    with due_table.batch_writer() as batch:
+        for lead_hours in LEAD_HOURS:
+            batch.delete_item(Key={
+                'DueHour': due_hour(start - timedelta(hours=lead_hours)),
+                'ReminderID': f"{appointment['AppointmentID']}#{lead_hours}h"
+            })
+
+
+def due_reminders(due_table, now=None):
+    """Entries due by `now`: the current hour's bucket and CATCHUP_HOURS before it"""
+    from boto3.dynamodb.conditions import Key
+    now = now or datetime.now()
+    cutoff = now.strftime('%Y-%m-%dT%H:%M')
+    entries = []
+    for hours_back in range(CATCHUP_HOURS, -1, -1):
+        bucket = due_hour(now - timedelta(hours=hours_back))
+        for page in query_pages(due_table, KeyConditionExpression=Key('DueHour').eq(bucket)):
+            entries.extend(entry for entry in page if entry['DueAt'] <= cutoff)
+    return entries
+
+
+def mark_sent(due_table, entries):
+    """Remove entries once handled, so the next run's catch-up does not send them again"""
+    with due_table.batch_writer() as batch:
+        for entry in entries:
+            batch.delete_item(Key={'DueHour': entry['DueHour'], 'ReminderID': entry['ReminderID']})
+
+
+def defer(due_table, entries, delivered, now=None):
+    """
+    Keep entries whose publish failed for the next run: each is re-filed in the
+    current hour's bucket (an entry due late in the previous hour would otherwise
+    fall out of the catch-up window) with SentTo listing the recipient types
+    already delivered, so only the failed ones are sent again. ExpiresAt is
+    kept, so an entry that keeps failing is still dropped after KEEP_HOURS.
+    """
+    bucket = due_hour(now or datetime.now())
+    with due_table.batch_writer() as batch:
+        for entry in entries:
+            sent_to = sorted(set(entry.get('SentTo', [])) | delivered.get(entry['ReminderID'], set()))
+            batch.put_item(Item=dict(entry, DueHour=bucket, SentTo=sent_to))
+    mark_sent(due_table, [entry for entry in entries if entry['DueHour'] != bucket])
+
+
+def backfill_reminders(appointments_table, due_table, now=None):
+    """File entries for every existing appointment that still has reminders ahead (one scan)"""
+    from boto3.dynamodb.conditions import Attr
+    now = now or datetime.now()
+    count = 0
+    with due_table.batch_writer() as batch:
+        for page in scan_pages(appointments_table, FilterExpression=Attr('AppointmentDate').gte(now.strftime('%Y-%m-%d'))):
+            for appointment in page:
+                for entry in reminder_entries(appointment, now):
+                    batch.put_item(Item=entry)
+                    count += 1
+    return count
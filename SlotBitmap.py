@@ -0,0 +1,90 @@
+import os
+from DoctorSchedule import to_minutes
+from SlotReservation import SLOT_MINUTES
+
+# One bit per slot of the day (96 x 15 minutes); bit i set = slot i is booked
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+
+# Set once a bitmap has been built from the table. SETBIT on a missing key leaves it
+# at 0, so a bitmap only touched by bookings is never mistaken for a complete one
+MARKER_BIT = SLOTS_PER_DAY
+
+# Read back with BITFIELD_RO as unsigned 32 bit words (plus the marker bit); integers
+# come back, so this works with decode_responses=True clients
+WORD_BITS = 32
+WORDS = (SLOTS_PER_DAY + WORD_BITS - 1) // WORD_BITS
+
+# Bookable hours searched by default
+DAY_START = os.environ.get('SLOTS_DAY_START', '08:00')
+DAY_END = os.environ.get('SLOTS_DAY_END', '18:00')
+
+
+def slot_indexes(start_time, end_time):
+    """Slots overlapping [start_time, end_time), rounded outwards like the reservation locks"""
+    start = to_minutes(start_time) // SLOT_MINUTES
+    end = max(start + 1, -(-to_minutes(end_time) // SLOT_MINUTES))
+    return range(start, min(end, SLOTS_PER_DAY))
+
+
+def busy_mask(appointments):
+    """Bitmask of the slots a doctor-day's appointments occupy"""
+    mask = 0
+    for appointment in appointments:
+        for index in slot_indexes(appointment['StartTime'], appointment['EndTime']):
+            mask |= 1 << index
+    return mask
+
+
+def bitfield_fields():
+    """(encoding, offset) of every word and the marker bit, for BITFIELD_RO GET"""
+    return [(f'u{WORD_BITS}', word * WORD_BITS) for word in range(WORDS)] + [('u1', MARKER_BIT)]
+
+
+def decode_words(values):
+    """
+    BITFIELD reply -> busy mask, or None if the bitmap was never built. Redis
+    numbers bits from the most significant bit of each byte, so every word is
+    bit-reversed into the mask's least-significant-first order.
+    """
+    if not values or not values[-1]:
+        return None
+    mask = 0
+    for word, value in enumerate(values[:-1]):
+        reversed_bits = int(f'{int(value):0{WORD_BITS}b}'[::-1], 2)
+        mask |= reversed_bits << (word * WORD_BITS)
+    return mask & ((1 << SLOTS_PER_DAY) - 1)
+
+
+def minutes_to_time(minutes):
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+def free_windows(mask, duration_minutes, day_start=DAY_START, day_end=DAY_END, not_before=None):
+    """
+    Yield (start_time, end_time) for non-overlapping free windows of the given
+    length within the bookable hours, earliest first. not_before ('HH:MM')
+    skips windows that start earlier (used for today).
+    """
+    needed = max(1, -(-duration_minutes // SLOT_MINUTES))
+    first = -(-to_minutes(day_start) // SLOT_MINUTES)
+    if not_before is not None:
+        first = max(first, -(-to_minutes(not_before) // SLOT_MINUTES))
+    last = to_minutes(day_end) // SLOT_MINUTES - needed
+
+    # Bit i of `starts` is set when slots i .. i+needed-1 are all free
+    free = ~mask & ((1 << SLOTS_PER_DAY) - 1)
+    starts = free
+    for shift in range(1, needed):
+        starts &= free >> shift
+
+    index = first
+    while index <= last:
+        starts_from = starts >> index
+        if not starts_from:
+            return
+        index += (starts_from & -starts_from).bit_length() - 1
+        if index > last:
+            return
+        start = index * SLOT_MINUTES
+        yield minutes_to_time(start), minutes_to_time(start + duration_minutes)
+        index += needed
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from DoctorSchedule import to_minutes
+
+# Per-slot lock items: partition key DoctorID (S), sort key SlotID (S) = "YYYY-MM-DD#HH:MM",
+# with DynamoDB TTL enabled on ExpiresAt so locks disappear after the appointment day
+SLOT_LOCKS_TABLE = os.environ.get('SLOT_LOCKS_TABLE', 'DoctorSlotLocks')
+
+# Lock granularity. Appointment times are rounded outwards to slot boundaries, so
+# two appointments that share a slot conflict even if their exact times do not overlap
+SLOT_MINUTES = int(os.environ.get('RESERVATION_SLOT_MINUTES', '15'))
+
+# Keep locks this long after the appointment date before TTL removes them
+LOCK_RETENTION_DAYS = int(os.environ.get('RESERVATION_LOCK_RETENTION_DAYS', '1'))
+
+# RESERVATION_MODE=true: ConfirmBooking claims the slots and writes the appointment
+# in one transaction, and CheckDoctorAvailability skips its (advisory) schedule read.
+# Turn it on only after backfill_locks() has created locks for existing bookings
+RESERVATION_MODE = os.environ.get('RESERVATION_MODE', 'false').lower() == 'true'
+
+# TransactWriteItems accepts at most 100 actions (a whole day of 15 minute slots is 96)
+TRANSACTION_LIMIT = 100
+
+
+class SlotConflict(Exception):
+    """The requested time overlaps slots already held by another appointment"""
+
+    def __init__(self, doctor_id, slot_ids):
+        super().__init__(f"Doctor {doctor_id} already booked in {', '.join(slot_ids) or 'requested slots'}")
+        self.doctor_id = doctor_id
+        self.slot_ids = slot_ids
+
+
+def slot_ids(appointment_date, start_time, end_time):
+    """Slots covering [start_time, end_time), e.g. 2025-06-02#09:00, 2025-06-02#09:15"""
+    start = to_minutes(start_time) // SLOT_MINUTES * SLOT_MINUTES
+    end = max(to_minutes(end_time), start + 1)
+    return [f"{appointment_date}#{minute // 60:02d}:{minute % 60:02d}" for minute in range(start, end, SLOT_MINUTES)]
+
+
+def lock_items(appointment):
+    """Lock items for every slot the appointment occupies"""
+    expires_at = datetime.strptime(appointment['AppointmentDate'], '%Y-%m-%d') + timedelta(days=1 + LOCK_RETENTION_DAYS)
+    return [{
+        'DoctorID': appointment['DoctorID'],
+        'SlotID': slot_id,
+        'AppointmentID': appointment['AppointmentID'],
+        'ExpiresAt': int(expires_at.timestamp())
+    } for slot_id in slot_ids(appointment['AppointmentDate'], appointment['StartTime'], appointment['EndTime'])]
+
+
+def _request_token(appointment):
+    """
+    Same booking -> same token for 10 minutes. CreatedAt is left out: it differs
+    between attempts, so a retry gets IdempotentParameterMismatchException and
+    reserve_appointment checks the row instead.
+    """
+    booking = {field: value for field, value in appointment.items() if field != 'CreatedAt'}
+    return hashlib.sha256(json.dumps(booking, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:36]
+
+
+def _same_booking(existing, appointment):
+    return all(existing.get(field) == appointment.get(field)
+               for field in ('DoctorID', 'AppointmentDate', 'StartTime', 'EndTime'))
+
+
+def _existing_row(dynamodb_client, appointments_table, appointment):
+    from boto3.dynamodb.types import TypeDeserializer
+    deserializer = TypeDeserializer()
+    response = dynamodb_client.get_item(
+        TableName=appointments_table,
+        Key={'AppointmentID': {'S': appointment['AppointmentID']}, 'DoctorID': {'S': appointment['DoctorID']}},
+        ConsistentRead=True
+    )
+    item = response.get('Item')
+    return None if item is None else {name: deserializer.deserialize(value) for name, value in item.items()}
+
+
+def reserve_appointment(dynamodb_client, appointments_table, appointment):
+    """
+    Claim the appointment's slots and write the appointment row in a single
+    TransactWriteItems call: either every slot lock and the row are written or
+    nothing is. Returns False if this booking was already made by an earlier
+    attempt (a retry), raises SlotConflict if any slot is held by another
+    appointment.
+    """
+    from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+    serializer = TypeSerializer()
+
+    locks = lock_items(appointment)
+    if len(locks) + 1 > TRANSACTION_LIMIT:
+        raise ValueError(f"Appointment spans {len(locks)} slots; at most {TRANSACTION_LIMIT - 1} fit in one transaction")
+
+    actions = [{
+        'Put': {
+            'TableName': SLOT_LOCKS_TABLE,
+            'Item': {name: serializer.serialize(value) for name, value in lock.items()},
+            'ConditionExpression': 'attribute_not_exists(SlotID)'
+        }
+    } for lock in locks]
+    actions.append({
+        'Put': {
+            'TableName': appointments_table,
+            'Item': {name: serializer.serialize(value) for name, value in appointment.items()},
+            'ConditionExpression': 'attribute_not_exists(AppointmentID)',
+            'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'
+        }
+    })
+
+    try:
+        try:
+            dynamodb_client.transact_write_items(TransactItems=actions, ClientRequestToken=_request_token(appointment))
+        except dynamodb_client.exceptions.IdempotentParameterMismatchException:
+            # An earlier attempt used the token; only the row tells whether it
+            # was written or cancelled (then this attempt runs without the token)
+            existing = _existing_row(dynamodb_client, appointments_table, appointment)
+            if existing is not None and _same_booking(existing, appointment):
+                return False
+            dynamodb_client.transact_write_items(TransactItems=actions)
+        return True
+    except dynamodb_client.exceptions.TransactionCanceledException as e:
+        reasons = e.response.get('CancellationReasons', [])
+        row = reasons[len(locks)] if len(reasons) > len(locks) else {}
+        if row.get('Code') == 'ConditionalCheckFailed' and row.get('Item'):
+            deserializer = TypeDeserializer()
+            existing = {name: deserializer.deserialize(value) for name, value in row['Item'].items()}
+            if _same_booking(existing, appointment):
+                return False
+        taken = [lock['SlotID'] for lock, reason in zip(locks, reasons) if reason.get('Code') == 'ConditionalCheckFailed']
+        if taken:
+            raise SlotConflict(appointment['DoctorID'], taken) from e
+        raise
+
+
+def backfill_locks(locks_table, appointments):
+    """Create locks for appointments booked before reservation mode was enabled"""
+    count = 0
+    with locks_table.batch_writer() as batch:
+        for appointment in appointments:
+            for lock in lock_items(appointment):
+                batch.put_item(Item=lock)
+                count += 1
+    return count
@@ -0,0 +1,333 @@
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+import Metrics
+from AwsClients import redis_error, resolve_redis
+from CacheCodec import CacheFormatError, default_codec
+
+# Stored in Redis (and locally) for keys whose record does not exist
+NEGATIVE_MARKER = '__missing__'
+_NEGATIVE_MARKERS = (NEGATIVE_MARKER, NEGATIVE_MARKER.encode('utf-8'))
+_MISSING = object()
+
+# Stampede protection. Records live in Redis for ttl + STALE_TTL seconds; in the
+# last STALE_TTL seconds they are stale: one caller takes the refill lock
+# (SET NX PX on 'lock:<key>') and reloads, everyone else keeps serving the stale
+# value. On a full miss the callers that lose the lock poll Redis for up to
+# LOCK_WAIT_MS for the winner's value before loading it themselves.
+STALE_TTL = int(os.environ.get('CACHE_STALE_TTL', '60'))
+LOCK_TTL_MS = int(os.environ.get('CACHE_LOCK_TTL_MS', '2000'))
+LOCK_WAIT_MS = int(os.environ.get('CACHE_LOCK_WAIT_MS', '500'))
+LOCK_POLL_MS = int(os.environ.get('CACHE_LOCK_POLL_MS', '10'))
+
+# Probabilistic early refresh (XFetch): a fresh record is reloaded ahead of
+# expiry when  fresh_seconds_left <= -load_seconds * beta * ln(rand()),  so hot
+# keys are usually refreshed by one caller before they go stale. 0 disables it.
+EARLY_REFRESH_BETA = float(os.environ.get('CACHE_EARLY_REFRESH_BETA', '1.0'))
+
+
+def lock_key(key):
+    return f"lock:{key}"
+
+
+class TieredCache:
+    """
+    Two-tier read-through cache: a bounded in-process LRU (per warm container)
+    in front of Redis, with short-TTL negative caching for records that do not exist.
+
+    get(key, loader) returns the cached value, or calls loader() on a full miss;
+    loader returns the record or None if it does not exist. redis_client may be
+    a client or an AwsClients.RedisProvider (resolved on every call). Hits and
+    misses are also counted on the invocation's metrics as '<name>.<tier>'.
+    codec (CacheCodec) serializes records; CACHE_CODEC picks the default.
+
+    get() refills each key once across containers (single_flight) and serves
+    the stale value meanwhile; get_many() serves stale values as hits and
+    leaves refilling them to get().
+    """
+
+    def __init__(self, redis_client, ttl, local_ttl=60, local_size=1024, negative_ttl=60, name='cache', codec=None,
+                 stale_ttl=STALE_TTL, single_flight=True, early_refresh_beta=EARLY_REFRESH_BETA):
+        self.name = name
+        self.codec = codec or default_codec()
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.local_size = local_size
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self.single_flight = single_flight
+        self.early_refresh_beta = early_refresh_beta
+        self.stats = {'local_hits': 0, 'redis_hits': 0, 'negative_hits': 0, 'stale_hits': 0, 'misses': 0,
+                      'early_refreshes': 0, 'lock_waits': 0, 'lock_timeouts': 0, 'errors': 0}
+        # Moving average of loader() time, the "delta" of the early refresh rule
+        self._load_seconds = 0.0
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _local_get(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._local[key]
+                return _MISSING
+            self._local.move_to_end(key)
+            return value
+
+    def _local_set(self, key, value, ttl):
+        with self._lock:
+            self._local[key] = (time.monotonic() + min(ttl, self.local_ttl), value)
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+    def _error(self, operation, error):
+        self.stats['errors'] += 1
+        Metrics.count(f'{self.name}.errors')
+        redis_error(self.redis_client, error)
+        print(f"Cache {operation} error: {error}")
+
+    def encode(self, value):
+        """Redis value for a record (None = known missing), or None if it cannot be encoded"""
+        if value is None:
+            return NEGATIVE_MARKER
+        try:
+            return self.codec.dumps(value)
+        except (TypeError, ValueError) as e:
+            # Not a Redis problem: keep the record in the local tier only
+            Metrics.count(f'{self.name}.encode_errors')
+            print(f"Cache encode error: {e}")
+            return None
+
+    def decode(self, cached):
+        """Record (or None for known missing), or _MISSING if the value is unreadable"""
+        if cached in _NEGATIVE_MARKERS:
+            return None
+        try:
+            return self.codec.loads(cached)
+        except (CacheFormatError, ValueError) as e:
+            Metrics.count(f'{self.name}.decode_errors')
+            Metrics.debug("Cache decode error: %s", e)
+            return _MISSING
+
+    def _hit(self, tier, value):
+        self.stats[tier] += 1
+        Metrics.count(f'{self.name}.{tier}')
+        if value is None:
+            self.stats['negative_hits'] += 1
+            Metrics.count(f'{self.name}.negative_hits')
+        return value
+
+    def _note(self, stat):
+        self.stats[stat] += 1
+        Metrics.count(f'{self.name}.{stat}')
+
+    def storage_ttl(self, value):
+        """Redis TTL of a record: fresh for ttl, then stale for stale_ttl"""
+        return self.negative_ttl if value is None else self.ttl + self.stale_ttl
+
+    def _fresh_for(self, value, remaining_ms):
+        """Seconds a Redis value stays fresh, from its PTTL (negative = stale)"""
+        if value is None or remaining_ms is None or remaining_ms < 0:
+            return self.ttl
+        return remaining_ms / 1000.0 - self.stale_ttl
+
+    def _refresh_early(self, fresh_for):
+        if self.early_refresh_beta <= 0 or not self._load_seconds:
+            return False
+        return fresh_for <= -self._load_seconds * self.early_refresh_beta * math.log(1.0 - random.random())
+
+    def _acquire(self, redis_client, key):
+        """Lock token if this caller should refill the key, otherwise None"""
+        token = uuid.uuid4().hex
+        if redis_client is None or not self.single_flight:
+            return token
+        try:
+            return token if redis_client.set(lock_key(key), token, nx=True, px=LOCK_TTL_MS) else None
+        except Exception as e:
+            # Without the lock every caller loads, as before single-flight
+            self._error('lock', e)
+            return token
+
+    def _release(self, redis_client, key):
+        # Only after a failed load: a successful one leaves a fresh value, and the
+        # lock expires on its own. Deleting a lock that expired and was retaken
+        # only costs one extra load.
+        if redis_client is None or not self.single_flight:
+            return
+        try:
+            redis_client.delete(lock_key(key))
+        except Exception as e:
+            self._error('unlock', e)
+
+    def _wait_for(self, redis_client, key):
+        """Poll Redis for the lock owner's value, up to LOCK_WAIT_MS; _MISSING if it does not arrive"""
+        self._note('lock_waits')
+        deadline = time.monotonic() + LOCK_WAIT_MS / 1000.0
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_MS / 1000.0)
+            try:
+                cached = redis_client.get(key)
+            except Exception as e:
+                self._error('retrieval', e)
+                break
+            if cached is not None:
+                value = self.decode(cached)
+                if value is not _MISSING:
+                    return value
+        self._note('lock_timeouts')
+        return _MISSING
+
+    def _load(self, key, loader):
+        self.stats['misses'] += 1
+        Metrics.count(f'{self.name}.misses')
+        started = time.perf_counter()
+        value = loader()
+        elapsed = time.perf_counter() - started
+        self._load_seconds = elapsed if not self._load_seconds else 0.8 * self._load_seconds + 0.2 * elapsed
+        self.put(key, value)
+        return value
+
+    def _refill(self, redis_client, key, loader):
+        try:
+            return self._load(key, loader)
+        except Exception:
+            self._release(redis_client, key)
+            raise
+
+    def get(self, key, loader):
+        value = self._local_get(key)
+        if value is not _MISSING:
+            return self._hit('local_hits', value)
+
+        redis_client = resolve_redis(self.redis_client)
+        cached = remaining_ms = None
+        if redis_client is not None:
+            try:
+                # GET and PTTL in one round trip
+                pipe = redis_client.pipeline(transaction=False)
+                pipe.get(key)
+                pipe.pttl(key)
+                cached, remaining_ms = pipe.execute()
+            except Exception as e:
+                self._error('retrieval', e)
+                redis_client = None
+        if cached is not None:
+            value = self.decode(cached)
+            if value is not _MISSING:
+                fresh_for = self._fresh_for(value, remaining_ms)
+                if fresh_for > 0 and not self._refresh_early(fresh_for):
+                    self._local_set(key, value, min(fresh_for, self.negative_ttl if value is None else self.ttl))
+                    return self._hit('redis_hits', value)
+                # Stale, or picked for early refresh: one caller reloads, the rest
+                # serve what Redis has (not kept locally, so they see the refill)
+                if self._acquire(redis_client, key) is None:
+                    if fresh_for <= 0:
+                        self._note('stale_hits')
+                    return self._hit('redis_hits', value)
+                if fresh_for > 0:
+                    self._note('early_refreshes')
+                try:
+                    return self._load(key, loader)
+                except Exception as e:
+                    self._release(redis_client, key)
+                    print(f"Cache refill error, serving cached value: {e}")
+                    return self._hit('redis_hits', value)
+
+        if redis_client is not None and self._acquire(redis_client, key) is None:
+            value = self._wait_for(redis_client, key)
+            if value is not _MISSING:
+                self._local_set(key, value, self.negative_ttl if value is None else self.ttl)
+                return self._hit('redis_hits', value)
+        return self._refill(redis_client, key, loader)
+
+    def get_many(self, keys, loader):
+        """
+        Bulk get(): local hits first, then one MGET for the rest, then a single
+        loader(missing_keys) call returning {key: record} (absent keys are cached
+        as missing). Redis writes go out in one pipeline. Returns {key: record or None}.
+        """
+        values = {}
+        remaining = []
+        for key in dict.fromkeys(keys):
+            value = self._local_get(key)
+            if value is _MISSING:
+                remaining.append(key)
+            else:
+                values[key] = self._hit('local_hits', value)
+
+        redis_client = resolve_redis(self.redis_client)
+        if remaining and redis_client is not None:
+            try:
+                missing = []
+                for key, cached in zip(remaining, redis_client.mget(remaining)):
+                    value = _MISSING if cached is None else self.decode(cached)
+                    if value is _MISSING:
+                        missing.append(key)
+                        continue
+                    self._local_set(key, value, self.negative_ttl if value is None else self.ttl)
+                    values[key] = self._hit('redis_hits', value)
+                remaining = missing
+            except Exception as e:
+                self._error('retrieval', e)
+                redis_client = None
+
+        if not remaining:
+            return values
+        self.stats['misses'] += len(remaining)
+        Metrics.count(f'{self.name}.misses', len(remaining))
+        loaded = loader(remaining)
+        pipe = None
+        if redis_client is not None:
+            pipe = redis_client.pipeline(transaction=False)
+        for key in remaining:
+            value = values[key] = loaded.get(key)
+            self._local_set(key, value, self.negative_ttl if value is None else self.ttl)
+            encoded = self.encode(value)
+            if pipe is not None and encoded is not None:
+                pipe.setex(key, self.storage_ttl(value), encoded)
+        if pipe is not None:
+            try:
+                pipe.execute()
+            except Exception as e:
+                self._error('storage', e)
+        return values
+
+    def put(self, key, value):
+        """Store a record (or None for a known-missing record) in both tiers"""
+        self._local_set(key, value, self.negative_ttl if value is None else self.ttl)
+        encoded = self.encode(value)
+        redis_client = resolve_redis(self.redis_client)
+        if redis_client is not None and encoded is not None:
+            try:
+                redis_client.setex(key, self.storage_ttl(value), encoded)
+            except Exception as e:
+                self._error('storage', e)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._local.pop(key, None)
+        redis_client = resolve_redis(self.redis_client)
+        if redis_client is not None:
+            try:
+                redis_client.delete(key)
+            except Exception as e:
+                self._error('invalidation', e)
+
+    def hit_ratios(self):
+        """Share of lookups answered by each tier"""
+        lookups = self.stats['local_hits'] + self.stats['redis_hits'] + self.stats['misses']
+        if not lookups:
+            return {'local': 0.0, 'redis': 0.0, 'miss': 0.0}
+        return {
+            'local': round(self.stats['local_hits'] / lookups, 4),
+            'redis': round(self.stats['redis_hits'] / lookups, 4),
+            'miss': round(self.stats['misses'] / lookups, 4)
+        }
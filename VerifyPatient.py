@@ -1,67 +1,41 @@
 import json
-import boto3
-import redis
 import os
+import AwsClients
+import Metrics
+from TieredCache import TieredCache
 
-# Initialize DynamoDB
-dynamodb = boto3.resource('dynamodb') # region specific
+# In-process LRU in front of Redis; missing patients are cached briefly as well.
+# Clients are created on first use (AwsClients), so importing this module does no network I/O
+patient_cache = TieredCache(
+    AwsClients.redis,
+    ttl=86400,
+    local_ttl=int(os.environ.get('PATIENT_LOCAL_TTL', '300')),
+    local_size=int(os.environ.get('PATIENT_LOCAL_SIZE', '2048')),
+    negative_ttl=int(os.environ.get('PATIENT_NEGATIVE_TTL', '60')),
+    name='patient_cache'
+)
 
-# More robust Redis initialization
-try:
-    redis_endpoint = os.environ['REDIS_ENDPOINT']
-    redis_client = redis.Redis(
-        host=redis_endpoint,
-        port=6379,
-        decode_responses=True,
-        ssl=True,  # Enable SSL/TLS
-        socket_timeout=5,  # Add timeouts to prevent hanging
-        socket_connect_timeout=5
-    )
-    # Test connection immediately
-    redis_client.ping()
-    redis_available = True
-    print("Successfully connected to Redis")
-except Exception as e:
-    print(f"Redis connection error: {e}")
-    redis_available = False
+def patient_key(patient_id):
+    return f"patient:{patient_id}"
 
+def load_patient(patient_id):
+    patients_table = AwsClients.table('Patients')
+    Metrics.debug("Cache MISS - querying DynamoDB for patient %s", patient_id)
+    response = patients_table.get_item(Key={'PatientID': patient_id})
+    return response.get('Item')
+
+@Metrics.instrument('VerifyPatient')
 def lambda_handler(event, context):
     patient_id = event.get('PatientID')
-    cache_key = f"patient:{patient_id}"
+    cache_key = patient_key(patient_id)
     
-    # Try cache first, if available
-    if redis_available:
-        try:
-            cached_patient = redis_client.get(cache_key)
-            if cached_patient:
-                print("Cache HIT for patient data")
-                return {
-                    'statusCode': 200,
-                    'body': json.dumps('Patient verified successfully'),
-                    'patientDetails': json.loads(cached_patient)
-                }
-        except Exception as e:
-            print(f"Cache retrieval error: {e}")
-    
-    # If cache miss or unavailable, query DynamoDB
-    print("Cache MISS for patient data")
-    patients_table = dynamodb.Table('Patients')
-    print(f"About to query DynamoDB for patient {patient_id}")
-    response = patients_table.get_item(Key={'PatientID': patient_id})
-    print(f"DynamoDB response received: {response}")
+    patient = patient_cache.get(cache_key, lambda: load_patient(patient_id))
     
-    if 'Item' in response:
-        # Try to store in cache for future requests if Redis is available
-        if redis_available:
-            try:
-                redis_client.setex(cache_key, 86400, json.dumps(response['Item']))
-            except Exception as e:
-                print(f"Cache storage error: {e}")
-                
+    if patient is not None:
         return {
             'statusCode': 200,
             'body': json.dumps('Patient verified successfully'),
-            'patientDetails': response['Item']
+            'patientDetails': patient
         }
     else:
         return {
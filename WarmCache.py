@@ -0,0 +1,128 @@
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+import AwsClients
+import Metrics
+from AppointmentStore import APPOINTMENTS_TABLE, appointments_with_participants, scan_pages
+from AvailabilityCache import (doctor_key, encode_schedule, queue_slot_bitmap, schedule_key,
+                               schedule_version_key)
+from CheckDoctorAvailability import doctor_cache
+from SlotBitmap import busy_mask
+from VerifyPatient import patient_cache, patient_key
+
+# Warmed schedule entries are versioned (a booking makes them unreadable), so they can
+# outlive the regular SCHEDULE_TTL and still be there when the morning traffic starts
+WARM_SCHEDULE_TTL = int(os.environ.get('WARM_SCHEDULE_TTL', '14400'))
+# Each TTL is spread +/- this share so warmed keys do not all expire in the same second
+TTL_JITTER = float(os.environ.get('WARM_TTL_JITTER', '0.2'))
+# Keys written per pipeline, so a busy day does not build one giant request
+PIPELINE_SIZE = int(os.environ.get('WARM_PIPELINE_SIZE', '500'))
+
+def jittered(ttl):
+    return max(1, int(ttl * random.uniform(1 - TTL_JITTER, 1 + TTL_JITTER)))
+
+class PipelineWriter:
+    """Queues key writes and executes them PIPELINE_SIZE keys at a time"""
+
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+        self.pipe = redis_client.pipeline(transaction=False)
+        self.queued = 0
+        self.round_trips = 0
+
+    def setex(self, key, ttl, value):
+        if value is None:
+            return  # could not be encoded (counted by the cache)
+        self.pipe.setex(key, jittered(ttl), value)
+        self._queued()
+
+    def slot_bitmap(self, doctor_id, appointment_date, mask):
+        queue_slot_bitmap(self.pipe, doctor_id, appointment_date, mask)
+        self._queued()
+
+    def _queued(self):
+        self.queued += 1
+        if self.queued >= PIPELINE_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.queued:
+            self.pipe.execute()
+            self.round_trips += 1
+            self.pipe = self.redis_client.pipeline(transaction=False)
+            self.queued = 0
+
+def warm_day(redis_client, appointment_date):
+    """
+    Load the date's doctor-day schedules, slot bitmaps and participant records
+    into Redis. Returns the number of keys written per kind.
+    """
+    # Versions are read before the scan, as get_doctor_days does: a booking that
+    # lands after this read bumps its doctor-day version, so a warmed schedule
+    # that misses it is never served. Doctors come from the Doctors table because
+    # the day's doctors are only known after the scan.
+    doctor_ids = [item['DoctorID'] for page in scan_pages(AwsClients.table('Doctors'), ProjectionExpression='DoctorID')
+                  for item in page]
+    raw_versions = redis_client.mget([schedule_version_key(doctor_id, appointment_date) for doctor_id in doctor_ids]) if doctor_ids else []
+    versions = {doctor_id: int(raw_version or 0) for doctor_id, raw_version in zip(doctor_ids, raw_versions)}
+
+    # Consistent scan: a booking written before the version read must be in it
+    appointments, patients, doctors = appointments_with_participants(
+        AwsClients.table(APPOINTMENTS_TABLE), AwsClients.resource('dynamodb'), appointment_date, consistent_read=True)
+
+    days = {}
+    for appointment in appointments:
+        days.setdefault(appointment['DoctorID'], []).append(appointment)
+    for day in days.values():
+        day.sort(key=lambda appt: appt['StartTime'])
+
+    writer = PipelineWriter(redis_client)
+    warmed = 0
+    for doctor_id, day in days.items():
+        if doctor_id not in versions:
+            continue  # not in the Doctors table: no version read, so nothing to store it under
+        writer.setex(schedule_key(doctor_id, appointment_date), WARM_SCHEDULE_TTL,
+                     encode_schedule(versions[doctor_id], day))
+        writer.slot_bitmap(doctor_id, appointment_date, busy_mask(day))
+        warmed += 1
+    for doctor_id, doctor in doctors.items():
+        writer.setex(doctor_key(doctor_id), doctor_cache.storage_ttl(doctor), doctor_cache.encode(doctor))
+    for patient_id, patient in patients.items():
+        writer.setex(patient_key(patient_id), patient_cache.storage_ttl(patient), patient_cache.encode(patient))
+    writer.flush()
+
+    return {
+        'appointments': len(appointments),
+        'schedules': warmed,
+        'slot_bitmaps': warmed,
+        'doctors': len(doctors),
+        'patients': len(patients),
+        'round_trips': writer.round_trips
+    }
+
+@Metrics.instrument('WarmCache')
+def lambda_handler(event, context):
+    # Scheduled (EventBridge) the evening before; {"Date": "YYYY-MM-DD"} warms another day
+    appointment_date = (event or {}).get('Date') or (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+    redis_client = AwsClients.redis()
+    if redis_client is None:
+        return {'statusCode': 503, 'body': json.dumps('Redis unavailable; nothing warmed')}
+
+    started = time.perf_counter()
+    try:
+        warmed = warm_day(redis_client, appointment_date)
+    except Exception as e:
+        print(f"Error warming cache for {appointment_date}: {e}")
+        return {'statusCode': 500, 'body': json.dumps(f'Error warming cache: {str(e)}')}
+
+    duration_ms = round((time.perf_counter() - started) * 1000, 1)
+    keys = warmed['schedules'] + warmed['slot_bitmaps'] + warmed['doctors'] + warmed['patients']
+    for kind in ('schedules', 'slot_bitmaps', 'doctors', 'patients'):
+        Metrics.count(f'warm.{kind}', warmed[kind])
+    Metrics.count('warm.keys', keys)
+    return {
+        'statusCode': 200,
+        'body': json.dumps(dict(warmed, date=appointment_date, keys=keys, duration_ms=duration_ms))
+    }
@@ -0,0 +1,175 @@
+import copy
+import importlib
+import json
+import os
+import time
+
+DEFINITION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stepfunction.json')
+
+# Guards against a definition that loops forever
+MAX_TRANSITIONS = 100
+
+_definition = None
+
+
+class WorkflowError(Exception):
+    """A failure raised inside the interpreter, carrying an ASL error name"""
+
+    def __init__(self, error, cause=''):
+        super().__init__(f"{error}: {cause}")
+        self.error = error
+        self.cause = cause
+
+
+def load_definition(path=DEFINITION_PATH):
+    """The booking state machine, parsed once per container"""
+    global _definition
+    if path != DEFINITION_PATH:
+        with open(path) as f:
+            return json.load(f)
+    if _definition is None:
+        with open(path) as f:
+            _definition = json.load(f)
+    return _definition
+
+
+def resolve_handler(resource):
+    """arn:aws:lambda:...:function:ConfirmBooking -> ConfirmBooking.lambda_handler"""
+    function_name = resource.split(':function:')[-1].split(':')[0]
+    return importlib.import_module(function_name).lambda_handler
+
+
+def _get_path(data, path):
+    if path == '$':
+        return data
+    value = data
+    for part in path[2:].split('.'):
+        if not isinstance(value, dict) or part not in value:
+            raise WorkflowError('States.Runtime', f"Invalid path {path}")
+        value = value[part]
+    return value
+
+
+def _apply_result_path(data, path, result):
+    """ResultPath semantics: '$' replaces the input, null discards the result"""
+    if path is None:
+        return data
+    if path == '$':
+        return result
+    output = copy.copy(data) if isinstance(data, dict) else {}
+    target = output
+    parts = path[2:].split('.')
+    for part in parts[:-1]:
+        target[part] = copy.copy(target.get(part)) if isinstance(target.get(part), dict) else {}
+        target = target[part]
+    target[parts[-1]] = result
+    return output
+
+
+def _matches(error_equals, error):
+    if 'States.ALL' in error_equals or error in error_equals:
+        return True
+    # Every task error except a timeout counts as States.TaskFailed
+    return 'States.TaskFailed' in error_equals and error != 'States.Timeout'
+
+
+_COMPARATORS = {
+    'NumericEquals': lambda a, b: isinstance(a, (int, float)) and a == b,
+    'NumericLessThan': lambda a, b: isinstance(a, (int, float)) and a < b,
+    'NumericGreaterThan': lambda a, b: isinstance(a, (int, float)) and a > b,
+    'StringEquals': lambda a, b: isinstance(a, str) and a == b,
+    'BooleanEquals': lambda a, b: isinstance(a, bool) and a == b,
+}
+
+
+def _choice_matches(rule, data):
+    # A missing Variable path is a States.Runtime error, as in Step Functions
+    value = _get_path(data, rule['Variable'])
+    for name, compare in _COMPARATORS.items():
+        if name in rule:
+            return compare(value, rule[name])
+    raise WorkflowError('States.Runtime', f"Unsupported Choice rule {rule}")
+
+
+def _run_task(state, data, handler, sleep):
+    """Invoke the handler with the state's Retry policy; returns the result or raises WorkflowError"""
+    attempts = {}
+    while True:
+        try:
+            return handler(copy.deepcopy(data), None)
+        except Exception as e:
+            error = e.error if isinstance(e, WorkflowError) else type(e).__name__
+            cause = e.cause if isinstance(e, WorkflowError) else str(e)
+
+            for index, retrier in enumerate(state.get('Retry', [])):
+                if _matches(retrier['ErrorEquals'], error):
+                    made = attempts.get(index, 0)
+                    if made >= retrier.get('MaxAttempts', 3):
+                        raise WorkflowError(error, cause)
+                    attempts[index] = made + 1
+                    sleep(retrier.get('IntervalSeconds', 1) * retrier.get('BackoffRate', 2.0) ** made)
+                    break
+            else:
+                raise WorkflowError(error, cause)
+
+
+def execute(input_data, definition=None, handlers=None, sleep=time.sleep):
+    """
+    Run the state machine in-process. Supports the subset stepfunction.json uses:
+    Task (Lambda resources), Choice, Fail, Succeed, ResultPath, Retry and Catch.
+
+    handlers optionally maps function names to callables (defaults to importing
+    the module named after the Lambda function). Returns
+    {'status': 'SUCCEEDED'|'FAILED', 'output', 'error', 'cause', 'path'}.
+    """
+    definition = definition or load_definition()
+    handlers = handlers or {}
+    states = definition['States']
+    state_name = definition['StartAt']
+    data = copy.deepcopy(input_data)
+    path = []
+
+    for _ in range(MAX_TRANSITIONS):
+        state = states[state_name]
+        path.append(state_name)
+        state_type = state['Type']
+
+        if state_type == 'Task':
+            function_name = state['Resource'].split(':function:')[-1].split(':')[0]
+            handler = handlers.get(function_name) or resolve_handler(state['Resource'])
+            try:
+                result = _run_task(state, data, handler, sleep)
+            except WorkflowError as e:
+                catcher = next((c for c in state.get('Catch', []) if _matches(c['ErrorEquals'], e.error)), None)
+                if catcher is None:
+                    return {'status': 'FAILED', 'output': None, 'error': e.error, 'cause': e.cause, 'path': path}
+                data = _apply_result_path(data, catcher.get('ResultPath', '$'), {'Error': e.error, 'Cause': e.cause})
+                state_name = catcher['Next']
+                continue
+            data = _apply_result_path(data, state.get('ResultPath', '$'), result)
+
+        elif state_type == 'Choice':
+            try:
+                rule = next((r for r in state.get('Choices', []) if _choice_matches(r, data)), None)
+            except WorkflowError as e:
+                # Choice states have no Catch: the execution fails
+                return {'status': 'FAILED', 'output': None, 'error': e.error, 'cause': e.cause, 'path': path}
+            if rule is None and 'Default' not in state:
+                return {'status': 'FAILED', 'output': None, 'error': 'States.NoChoiceMatched', 'cause': state_name, 'path': path}
+            state_name = rule['Next'] if rule else state['Default']
+            continue
+
+        elif state_type == 'Fail':
+            return {'status': 'FAILED', 'output': None, 'error': state.get('Error'), 'cause': state.get('Cause'), 'path': path}
+
+        elif state_type == 'Succeed':
+            return {'status': 'SUCCEEDED', 'output': data, 'error': None, 'cause': None, 'path': path}
+
+        else:
+            raise WorkflowError('States.Runtime', f"Unsupported state type {state_type} in {state_name}")
+
+        if state.get('End'):
+            return {'status': 'SUCCEEDED', 'output': data, 'error': None, 'cause': None, 'path': path}
+        state_name = state['Next']
+
+    return {'status': 'FAILED', 'output': None, 'error': 'States.Runtime', 'cause': 'Too many state transitions', 'path': path}
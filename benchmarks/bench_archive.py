@@ -0,0 +1,65 @@
+"""
+Streaming archive: rows archived per second, partition files written and resume
+behaviour when every invocation runs out of time part-way through.
+
+    python -m benchmarks.bench_archive
+"""
+import contextlib
+import gzip
+import io
+import json
+import sys
+import time
+
+import AwsClients
+import ArchiveAppointments
+import ArchiveIndex
+from benchmarks.fakes import FakeContext, FakeDynamoDB, FakeS3, appointments_table
+
+
+def build(count):
+    table = appointments_table(page_size=500)
+    for n in range(count):
+        table.put_item(Item={
+            'AppointmentID': f'A{n:07d}', 'PatientID': f'P{n % 5000:05d}', 'DoctorID': f'D{n % 100:03d}',
+            'AppointmentDate': f'2020-01-{1 + n % 28:02d}', 'StartTime': '09:00', 'EndTime': '09:30',
+            'AppointmentStatus': 'Confirmed', 'CreatedAt': '2019-12-01T10:00:00'
+        })
+    return table
+
+
+def run(count, pages_per_invocation):
+    table = build(count)
+    s3 = FakeS3()
+    AwsClients.override('dynamodb', FakeDynamoDB(table), kind='resource')
+    AwsClients.override('s3', s3)
+    # Small flushes so the benchmark exercises many of them
+    ArchiveAppointments.FLUSH_SIZE = 1024 * 1024
+
+    invocations = 0
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        while True:
+            invocations += 1
+            context = None if pages_per_invocation is None else FakeContext(
+                remaining_ms=ArchiveAppointments.TIME_BUFFER_MS + pages_per_invocation * 1000, cost_ms=1000)
+            result = ArchiveAppointments.lambda_handler({}, context)
+            if result['statusCode'] != 202:
+                break
+    elapsed = time.perf_counter() - started
+
+    archives = [data for (bucket, key), data in s3.objects.items() if key.startswith(ArchiveIndex.PARTITIONS_PREFIX)]
+    records = [json.loads(line) for data in archives for line in gzip.decompress(data).splitlines()]
+    unique = len({record['AppointmentID'] for record in records})
+    print(f"{count:>7} rows, {pages_per_invocation or 'unlimited':>9} pages/invocation: {invocations:>3} invocations, "
+          f"{len(archives):>5} files, {count / elapsed:9.0f} rows/s, "
+          f"archived {unique} unique ({len(records) - unique} re-archived), {len(table)} left in table")
+
+
+def main(count):
+    run(count, None)
+    run(count, 5)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
@@ -0,0 +1,143 @@
+"""
+Incremental archiving: ArchiveAppointments scanning the whole Appointments table
+against ARCHIVE_SOURCE=ledger, which reads the archive ledger kept by
+ArchiveStreamProcessor. The table's stream (inserts, reschedules, cancellations)
+is recorded to a file and fed through benchmarks.replay_stream, with one batch
+in ten failing part-way to exercise the partial-failure retries. Reports items
+read per archive run as the number of future bookings grows, and checks both
+modes archive the same appointments and leave the same rows behind.
+
+    python -m benchmarks.bench_archive_ledger [future_days ...]
+"""
+import contextlib
+import gzip
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import AwsClients
+import ArchiveAppointments
+import ArchiveIndex
+import ArchiveLedger
+import ArchiveStreamProcessor
+from benchmarks.datagen import generate
+from benchmarks.fakes import FakeContext, FakeDynamoDB, FakeS3, InMemoryTable, appointments_table
+from benchmarks.replay_stream import load_records, replay, save_records
+
+PAST_DAYS = 3
+LATENCY = 0.001
+
+
+class ReadCounter:
+    """Items evaluated by a table's scans and queries, plus keys fetched by BatchGetItem"""
+
+    def __init__(self, dynamodb, *tables):
+        self.items = 0
+        for table in tables:
+            for operation in ('scan', 'query'):
+                setattr(table, operation, self._counted(getattr(table, operation)))
+        batch_get_item = dynamodb.batch_get_item
+
+        def counted_batch_get(RequestItems, **kwargs):
+            self.items += sum(len(request['Keys']) for request in RequestItems.values())
+            return batch_get_item(RequestItems=RequestItems, **kwargs)
+        dynamodb.batch_get_item = counted_batch_get
+
+    def _counted(self, operation):
+        def call(**kwargs):
+            response = operation(**kwargs)
+            self.items += response['ScannedCount']
+            return response
+        return call
+
+
+def flaky(handler, rng):
+    """Handler that fails one batch in ten after applying part of it"""
+    def call(event, context):
+        records = event['Records']
+        if rng.random() < 0.1 and len(records) > 1:
+            applied = rng.randrange(1, len(records))
+            handler({'Records': records[:applied]}, context)
+            return {'batchItemFailures': [{'itemIdentifier': records[applied]['dynamodb']['SequenceNumber']}]}
+        return handler(event, context)
+    return call
+
+
+def build(future_days, record):
+    """Appointments table after bookings, reschedules and cancellations"""
+    dataset = generate(doctors=40, patients=2000, days=PAST_DAYS + future_days, per_doctor_day=8, past_days=PAST_DAYS)
+    table = appointments_table(page_size=500)
+    stream = table.record_stream() if record else None
+    rng = random.Random(9)
+    for item in dataset.appointments:
+        table.put_item(Item=item)
+    for item in rng.sample(dataset.appointments, len(dataset.appointments) // 20):
+        # Rescheduled to another day (possibly into or out of the archivable range)
+        table.put_item(Item=dict(item, AppointmentDate=rng.choice(dataset.dates())))
+    for item in rng.sample(dataset.appointments, len(dataset.appointments) // 50):
+        table.delete_item(Key={'AppointmentID': item['AppointmentID'], 'DoctorID': item['DoctorID']})
+    table.calls.clear()
+    table.latency = LATENCY
+    return table, stream
+
+
+def archive(table, ledger):
+    s3 = FakeS3()
+    dynamodb = FakeDynamoDB(table, *([ledger] if ledger is not None else []), batch_latency=LATENCY)
+    AwsClients.override('dynamodb', dynamodb, kind='resource')
+    AwsClients.override('s3', s3)
+    ArchiveAppointments.LEDGER_MODE = ledger is not None
+    reads = ReadCounter(dynamodb, *[t for t in (table, ledger) if t is not None])
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        ArchiveAppointments.lambda_handler({}, FakeContext())
+    elapsed = time.perf_counter() - started
+    archived = {json.loads(line)['AppointmentID'] for (bucket, key), data in s3.objects.items()
+                if key.startswith(ArchiveIndex.PARTITIONS_PREFIX) for line in gzip.decompress(data).splitlines()}
+    return archived, reads.items, elapsed
+
+
+def run(future_days, path):
+    scan_table, _ = build(future_days, record=False)
+    ledger_source, stream = build(future_days, record=True)
+
+    # The stream as recorded, replayed into an empty ledger by the replay tool
+    save_records(path, stream)
+    ledger = InMemoryTable(ArchiveLedger.ARCHIVE_LEDGER_TABLE, 'LedgerDate', 'EntryID')
+    AwsClients.override('dynamodb', FakeDynamoDB(ledger), kind='resource')
+    with contextlib.redirect_stdout(io.StringIO()):
+        stats = replay(load_records(path), handler=flaky(ArchiveStreamProcessor.lambda_handler, random.Random(2)))
+    ledger.calls.clear()
+    ledger.latency = LATENCY
+
+    scan_archived, scan_reads, scan_seconds = archive(scan_table, None)
+    removals = ledger_source.record_stream()
+    ledger_archived, ledger_reads, ledger_seconds = archive(ledger_source, ledger)
+
+    # The archive job's own deletes come back through the stream
+    AwsClients.override('dynamodb', FakeDynamoDB(ledger), kind='resource')
+    with contextlib.redirect_stdout(io.StringIO()):
+        replay(removals)
+    entries = sum(1 for key in ledger._items if key[0] != ArchiveLedger.PENDING_DATES)
+
+    print(f"{future_days:>4} days of future bookings, {len(scan_table) + len(scan_archived):>6} rows; "
+          f"stream of {stats['records']} records replayed in {stats['batches']} batches ({stats['retries']} retried)")
+    print(f"     scan run:    {scan_reads:>7} items read, {scan_seconds * 1000:8.1f}ms, archived {len(scan_archived)}")
+    print(f"     ledger run:  {ledger_reads:>7} items read, {ledger_seconds * 1000:8.1f}ms, archived {len(ledger_archived)}")
+    print(f"     same appointments archived: {scan_archived == ledger_archived}, "
+          f"same rows left: {sorted(scan_table._items) == sorted(ledger_source._items)}, "
+          f"ledger entries {entries} for {len(ledger_source)} rows")
+
+
+def main(horizons):
+    with tempfile.TemporaryDirectory() as root:
+        for future_days in horizons:
+            run(future_days, os.path.join(root, 'stream.jsonl'))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [14, 90])
@@ -0,0 +1,142 @@
+"""
+Archive lookups by patient, doctor and appointment. A year of appointments is
+archived month by month (as the moving cutoff does) twice: in the old layout (one
+gzip NDJSON object per run, so a lookup reads every object) and by
+ArchiveAppointments into date/doctor partitions that ArchiveQuery prunes with the
+run manifests. The partitioned bucket lives in a local directory and also holds
+one old-format file, which must still be searched. Reports objects read and
+latency per lookup, bloom filter false positives and whether both layouts agree.
+
+    python -m benchmarks.bench_archive_query [appointments]
+"""
+import contextlib
+import gzip
+import io
+import json
+import random
+import sys
+import tempfile
+from datetime import date, timedelta
+
+import AwsClients
+import ArchiveAppointments
+import ArchiveIndex
+import ArchiveQuery
+from benchmarks.fakes import DirectoryObjects, FakeContext, FakeDynamoDB, FakeS3, appointments_table
+from benchmarks.stats import summary, time_calls
+
+LATENCY = 0.005
+DOCTORS = 100
+PATIENTS = 5000
+START = date(2023, 1, 1)
+DAYS = 365
+MONTHS = 12
+BUCKET = ArchiveAppointments.ARCHIVE_BUCKET
+
+
+def appointment(rng, n):
+    day = START + timedelta(days=rng.randrange(DAYS))
+    hour = rng.randrange(8, 18)
+    return {
+        'AppointmentID': f'A{n:07d}', 'PatientID': f'P{rng.randrange(PATIENTS):05d}',
+        'DoctorID': f'D{rng.randrange(DOCTORS):03d}', 'AppointmentDate': day.isoformat(),
+        'StartTime': f'{hour:02d}:00', 'EndTime': f'{hour:02d}:30', 'AppointmentStatus': 'Confirmed',
+        'CreatedAt': f'{day.isoformat()}T07:00:00'
+    }
+
+
+def ndjson_gz(records):
+    return gzip.compress(b''.join(json.dumps(record).encode('utf-8') + b'\n' for record in records))
+
+
+def build(old_s3, new_s3, count):
+    rng = random.Random(11)
+    records = sorted((appointment(rng, n) for n in range(count)), key=lambda record: record['AppointmentDate'])
+    legacy = [dict(record, AppointmentID=f'L{n:07d}') for n, record in enumerate(records[:50])]
+    old_s3.put_object(Bucket=BUCKET, Key='archives/appointments-2022-12-31-00-00-00-0001.ndjson.gz', Body=ndjson_gz(legacy))
+    new_s3.put_object(Bucket=BUCKET, Key='archives/appointments-2022-12-31-00-00-00-0001.ndjson.gz', Body=ndjson_gz(legacy))
+
+    ArchiveAppointments.FLUSH_SIZE = 4 * 1024 * 1024
+    AwsClients.override('s3', new_s3)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for month in range(1, MONTHS + 1):
+            run = f'2023-{month:02d}-28-00-00-00'
+            batch = [record for record in records if int(record['AppointmentDate'][5:7]) == month]
+            old_s3.put_object(Bucket=BUCKET, Key=f'archives/appointments-{run}-0001.ndjson.gz', Body=ndjson_gz(batch))
+            table = appointments_table(page_size=500)
+            for record in batch:
+                table.put_item(Item=record)
+            AwsClients.override('dynamodb', FakeDynamoDB(table), kind='resource')
+            # Seeded checkpoint: names the run (they would otherwise share a second)
+            ArchiveAppointments.save_checkpoint(ArchiveAppointments.new_checkpoint('9999-12-31', run))
+            ArchiveAppointments.lambda_handler({}, FakeContext())
+    return records + legacy
+
+
+def read_everything(s3, filters):
+    """Lookup in the old layout: every archive object downloaded and filtered"""
+    keys = ArchiveIndex.list_keys(s3, BUCKET, 'archives/appointments-')
+    return list(ArchiveQuery.query_archive(s3, keys, filters))
+
+
+def lookups(rng, records, count):
+    events = []
+    for _ in range(count):
+        record = rng.choice(records)
+        kind = rng.random()
+        if kind < 0.4:
+            events.append({'PatientID': record['PatientID']})
+        elif kind < 0.7:
+            events.append({'DoctorID': record['DoctorID'], 'FromDate': record['AppointmentDate'][:8] + '01',
+                           'ToDate': record['AppointmentDate']})
+        elif kind < 0.9:
+            events.append({'AppointmentID': record['AppointmentID']})
+        else:
+            events.append({'DoctorID': record['DoctorID'], 'PatientID': record['PatientID']})
+    return events + [{'AppointmentID': records[-1]['AppointmentID']}]
+
+
+def filters_of(event):
+    return {ArchiveQuery.FILTERS[field]: value for field, value in event.items()}
+
+
+def measure(label, s3, run_lookup, events):
+    s3.calls.clear()
+    s3.latency = LATENCY
+    found = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        samples = time_calls(lambda event: found.append(run_lookup(event)), [(event,) for event in events])
+    s3.latency = 0.0
+    print(f"{label:<16} {summary(samples)}  {s3.calls.get('get_object', 0) / len(events):6.1f} objects read per lookup")
+    return found
+
+
+def main(count):
+    with tempfile.TemporaryDirectory() as root:
+        old_s3, new_s3 = FakeS3(), FakeS3(objects=DirectoryObjects(root))
+        records = build(old_s3, new_s3, count)
+        partitions = ArchiveIndex.list_keys(new_s3, BUCKET, ArchiveIndex.PARTITIONS_PREFIX)
+        print(f"{len(records)} archived appointments: old layout {len(old_s3.objects)} objects "
+              f"({sum(map(len, old_s3.objects.values())) / 1e6:.2f} MB), partitioned {len(partitions)} files "
+              f"+ {MONTHS} manifests + 1 old-format file; {LATENCY * 1000:.0f}ms per S3 request")
+
+        events = lookups(random.Random(5), records, 40)
+        ArchiveQuery.MAX_LIMIT = ArchiveQuery.DEFAULT_LIMIT = 10 ** 6
+        everything = measure('read everything', old_s3, lambda event: read_everything(old_s3, filters_of(event)), events)
+        ArchiveQuery._manifests.clear()
+        pruned = measure('ArchiveQuery', new_s3,
+                         lambda event: json.loads(ArchiveQuery.lambda_handler(event, None)['body'])['Appointments'], events)
+
+        mismatches = sum(1 for expected, result in zip(everything, pruned)
+                         if {r['AppointmentID'] for r in expected} != {r['AppointmentID'] for r in result})
+        selected = [len(ArchiveQuery.plan_query(new_s3, filters_of(event))[0]) - 1 for event in events]
+        containing = [len({(r['DoctorID'], r['AppointmentDate'][:7]) for r in expected if not r['AppointmentID'].startswith('L')})
+                      for expected in everything]
+        print(f"  results differ for {mismatches} of {len(events)} lookups; old-format record "
+              f"{'found' if pruned[-1] else 'MISSING'}")
+        print(f"  partition files selected {sum(selected)} for {sum(containing)} holding matches "
+              f"({sum(selected) - sum(containing)} bloom false positives)")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 60000)
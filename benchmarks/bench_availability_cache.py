@@ -0,0 +1,62 @@
+"""
+Availability checks with the read-through cache: DynamoDB reads and estimated
+RCUs saved for a mix of availability checks and bookings.
+
+    python -m benchmarks.bench_availability_cache
+"""
+import contextlib
+import io
+import random
+import sys
+
+import AwsClients
+import AvailabilityCache
+import CheckDoctorAvailability
+import ConfirmBooking
+from benchmarks.fakes import FakeDynamoDB, FakeRedis, InMemoryTable, appointments_table
+
+DOCTORS = 20
+DAYS = 5
+
+
+def main(checks):
+    rng = random.Random(11)
+    doctors = InMemoryTable('Doctors', 'DoctorID')
+    for n in range(DOCTORS):
+        doctors.put_item(Item={'DoctorID': f'D{n:03d}', 'FirstName': 'Ada', 'LastName': f'Doctor{n}'})
+    appointments = appointments_table()
+    dynamodb = FakeDynamoDB(appointments, doctors)
+    redis_client = FakeRedis()
+
+    AwsClients.override('dynamodb', dynamodb, kind='resource')
+    AwsClients.redis.override(redis_client)
+
+    booked = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for n in range(checks):
+            hour = rng.randrange(8, 18)
+            event = {
+                'PatientID': f'P{rng.randrange(1000):04d}',
+                'DoctorID': f'D{rng.randrange(DOCTORS):03d}',
+                'AppointmentDate': f'2025-06-0{1 + rng.randrange(DAYS)}',
+                'StartTime': f'{hour:02d}:{rng.choice(["00", "30"])}',
+            }
+            event['EndTime'] = f'{hour:02d}:{"29" if event["StartTime"].endswith("00") else "59"}'
+            result = CheckDoctorAvailability.lambda_handler(event, None)
+            # Book roughly one in five free slots
+            if result['statusCode'] == 200 and rng.random() < 0.2:
+                ConfirmBooking.lambda_handler(dict(event, AppointmentID=f'A{n:06d}'), None)
+                booked += 1
+
+    stats = AvailabilityCache.cache_stats
+    total = stats['hits'] + stats['misses']
+    print(f"{checks} availability checks, {booked} bookings")
+    print(f"  cache hits {stats['hits']}  misses {stats['misses']}  hit ratio {stats['hits'] / max(1, total):.1%}")
+    print(f"  DynamoDB reads: {appointments.calls.get('query', 0)} queries, {doctors.calls.get('get_item', 0)} get_item"
+          f"  (uncached: {checks} queries, ~{checks} get_item)")
+    print(f"  doctor cache hit ratios {CheckDoctorAvailability.doctor_cache.hit_ratios()}")
+    print(f"  estimated RCUs saved {stats['read_units_saved']:.1f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,84 @@
+"""
+"Which of these N doctors is free on this date at this time?": N runs of
+CheckDoctorAvailability against one BulkAvailability call, cold (empty caches)
+and warm, as N grows. Also checks both agree on every doctor.
+
+    python -m benchmarks.bench_bulk_availability [repeats]
+"""
+import contextlib
+import io
+import json
+import sys
+import time
+
+import AwsClients
+import BulkAvailability
+import CheckDoctorAvailability
+from benchmarks.datagen import generate, install
+from benchmarks.fakes import FakeRedis
+
+LATENCY = 0.002
+SIZES = (1, 5, 10, 20, 40, 80)
+
+
+def reset_caches():
+    redis_client = FakeRedis(latency=LATENCY)
+    AwsClients.redis.override(redis_client)
+    CheckDoctorAvailability.doctor_cache._local.clear()
+    return redis_client
+
+
+def one_by_one(doctor_ids, date, start_time, end_time):
+    return {doctor_id: CheckDoctorAvailability.lambda_handler(
+        {'DoctorID': doctor_id, 'AppointmentDate': date, 'StartTime': start_time, 'EndTime': end_time}, None
+    )['statusCode'] == 200 for doctor_id in doctor_ids}
+
+
+def bulk(doctor_ids, date, start_time, end_time):
+    result = BulkAvailability.lambda_handler({'DoctorIDs': doctor_ids, 'Dates': [date],
+                                              'StartTime': start_time, 'EndTime': end_time}, None)
+    return {doctor_id: row[date] for doctor_id, row in json.loads(result['body'])['Availability'].items()}
+
+
+def timed(fn, repeats, *args):
+    """(cold ms, warm ms per call, result)"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        result = fn(*args)
+        cold = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        for _ in range(repeats):
+            fn(*args)
+        warm = (time.perf_counter() - started) * 1000 / repeats
+    return cold, warm, result
+
+
+def main(repeats):
+    dataset = generate(doctors=max(SIZES), patients=500, days=3, per_doctor_day=8, past_days=0)
+    fakes = install(dataset, latency=LATENCY)
+    date = dataset.dates()[1]
+    start_time, end_time = '10:00', '10:29'
+    print(f"Availability of N doctors on {date} {start_time}-{end_time} ({LATENCY * 1000:.0f}ms per call)")
+    print(f"{'doctors':>7}  {'one by one cold':>15} {'warm':>9}  {'bulk cold':>10} {'warm':>9}  "
+          f"{'DynamoDB calls':>14}  {'Redis round trips':>17}  agree")
+
+    for size in SIZES:
+        doctor_ids = [doctor['DoctorID'] for doctor in dataset.doctors[:size]]
+        row = []
+        calls = []
+        results = []
+        for fn in (one_by_one, bulk):
+            redis_client = reset_caches()
+            fakes.appointments.calls.clear()
+            fakes.doctors.calls.clear()
+            cold, warm, result = timed(fn, repeats, doctor_ids, date, start_time, end_time)
+            row.extend((cold, warm))
+            results.append(result)
+            calls.append((sum(fakes.appointments.calls.values()) + sum(fakes.doctors.calls.values()),
+                          sum(redis_client.calls.values())))
+        print(f"{size:>7}  {row[0]:>13.1f}ms {row[1]:>7.1f}ms  {row[2]:>8.1f}ms {row[3]:>7.1f}ms  "
+              f"{calls[0][0]:>6} -> {calls[1][0]:<5}  {calls[0][1]:>8} -> {calls[1][1]:<6}  {results[0] == results[1]}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,157 @@
+"""
+Cache stampedes: bursts of simultaneous lookups, one thread per Lambda container
+(each with its own TieredCache, so its own in-process tier) sharing one Redis,
+against a Doctors/Patients table with injected latency. Counts the DynamoDB
+reads each burst causes with single-flight refills and stale serving turned off
+and on, then replays steady traffic up to a key's expiry to show the
+probabilistic early refresh.
+
+    python -m benchmarks.bench_cache_stampede [containers]
+"""
+import random
+import sys
+import threading
+import time
+
+from TieredCache import TieredCache
+from benchmarks.fakes import FakeRedis, InMemoryTable
+from benchmarks.stats import summary
+
+DYNAMODB_LATENCY = 0.010
+REDIS_LATENCY = 0.0005
+DOCTOR_TTL = 1800
+PATIENT_TTL = 86400
+PATIENTS = 40
+
+MODES = {
+    'unprotected': {'stale_ttl': 0, 'single_flight': False, 'early_refresh_beta': 0},
+    'single-flight': {}
+}
+
+
+class Clock:
+    """Redis clock that can be moved forward past TTLs"""
+
+    def __init__(self):
+        self.offset = 0.0
+
+    def __call__(self):
+        return time.monotonic() + self.offset
+
+
+def tables():
+    doctors = InMemoryTable('Doctors', 'DoctorID', latency=DYNAMODB_LATENCY)
+    doctors.put_item(Item={'DoctorID': 'D001', 'FirstName': 'Popular', 'LastName': 'Doctor', 'Specialty': 'GP'})
+    patients = InMemoryTable('Patients', 'PatientID', latency=DYNAMODB_LATENCY)
+    for n in range(PATIENTS):
+        patients.put_item(Item={'PatientID': f'P{n:03d}', 'FirstName': 'Pat', 'LastName': f'Patient{n}'})
+    return doctors, patients
+
+
+def loader(table, key_name, key):
+    return lambda: table.get_item(Key={key_name: key}).get('Item')
+
+
+def burst(caches, lookups):
+    """Every container runs its lookups at the same moment; returns per-container latencies (ms)"""
+    barrier = threading.Barrier(len(caches))
+    samples = [0.0] * len(caches)
+
+    def container(n):
+        barrier.wait()
+        started = time.perf_counter()
+        for key, load in lookups(n):
+            caches[n].get(key, load)
+        samples[n] = (time.perf_counter() - started) * 1000
+
+    threads = [threading.Thread(target=container, args=(n,)) for n in range(len(caches))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples
+
+
+def report(label, samples, table, caches):
+    stale = sum(cache.stats['stale_hits'] for cache in caches)
+    waits = sum(cache.stats['lock_waits'] for cache in caches)
+    print(f"  {label:<14} {summary(samples)}  DynamoDB reads {table.calls.get('get_item', 0):>4}  "
+          f"stale served {stale:>3}  lock waits {waits:>3}")
+
+
+def doctor_bursts(containers):
+    for mode, options in MODES.items():
+        doctors, _ = tables()
+        clock = Clock()
+        redis_client = FakeRedis(clock=clock, latency=REDIS_LATENCY)
+        lookups = lambda n: [('doctor:D001', loader(doctors, 'DoctorID', 'D001'))]
+
+        caches = [TieredCache(redis_client, ttl=DOCTOR_TTL, name='doctor_cache', **options) for _ in range(containers)]
+        samples = burst(caches, lookups)
+        print(f"{containers} containers miss doctor:D001 at once, {mode}:")
+        report('cold key', samples, doctors, caches)
+
+        # The TTL runs out; the containers' in-process tiers have long expired too
+        doctors.calls.clear()
+        clock.offset += DOCTOR_TTL + 1
+        caches = [TieredCache(redis_client, ttl=DOCTOR_TTL, name='doctor_cache', **options) for _ in range(containers)]
+        samples = burst(caches, lookups)
+        report('after TTL', samples, doctors, caches)
+
+
+def patient_bursts(containers):
+    for mode, options in MODES.items():
+        _, patients = tables()
+        clock = Clock()
+        redis_client = FakeRedis(clock=clock, latency=REDIS_LATENCY)
+        cache = TieredCache(redis_client, ttl=PATIENT_TTL, name='patient_cache', **options)
+        for n in range(PATIENTS):
+            cache.get(f'patient:P{n:03d}', loader(patients, 'PatientID', f'P{n:03d}'))
+
+        # Written together (e.g. by WarmCache), so they expire together
+        patients.calls.clear()
+        clock.offset += PATIENT_TTL + 1
+
+        def lookups(n):
+            ids = [f'P{n:03d}' for n in range(PATIENTS)]
+            random.Random(n).shuffle(ids)
+            return [(f'patient:{patient_id}', loader(patients, 'PatientID', patient_id)) for patient_id in ids]
+
+        caches = [TieredCache(redis_client, ttl=PATIENT_TTL, name='patient_cache', **options) for _ in range(containers)]
+        samples = burst(caches, lookups)
+        print(f"{containers} containers each look up the same {PATIENTS} patients right after they expire, {mode}:")
+        report('after TTL', samples, patients, caches)
+
+
+def early_refresh():
+    """One lookup per 5ms of fake time over the last 2s before expiry, then 2s after"""
+    doctors, _ = tables()
+    clock = Clock()
+    redis_client = FakeRedis(clock=clock)
+    # No in-process tier, so every lookup sees the Redis TTL
+    cache = TieredCache(redis_client, ttl=DOCTOR_TTL, local_size=0, name='doctor_cache')
+    load = loader(doctors, 'DoctorID', 'D001')
+    cache.get('doctor:D001', load)
+    refreshed_at = []
+    clock.offset += DOCTOR_TTL - 2.0
+    for step in range(800):
+        before = doctors.calls.get('get_item', 0)
+        cache.get('doctor:D001', load)
+        if doctors.calls.get('get_item', 0) > before:
+            refreshed_at.append(step * 5 - 2000)
+        clock.offset += 0.005
+    when = ', '.join(f'{ms:+d}ms' for ms in refreshed_at)
+    print(f"Steady traffic across the expiry of doctor:D001 (loader ~{cache._load_seconds * 1000:.0f}ms): "
+          f"{cache.stats['early_refreshes']} early refreshes, {cache.stats['stale_hits']} stale lookups, "
+          f"reloads at {when or 'none'} from the original expiry")
+
+
+def main(containers):
+    print(f"DynamoDB {DYNAMODB_LATENCY * 1000:.0f}ms per call, Redis {REDIS_LATENCY * 1000:.1f}ms per call")
+    doctor_bursts(containers)
+    patient_bursts(containers)
+    early_refresh()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,78 @@
+"""
+Conflict check: original linear check_conflicts loop vs DaySchedule bisect lookups.
+
+    python -m benchmarks.bench_conflict_check
+"""
+import contextlib
+import io
+import random
+import sys
+import time
+
+from DoctorSchedule import DaySchedule
+
+CANDIDATES = 50
+ROUNDS = 200
+
+
+def legacy_check_conflicts(start_time, end_time, appointments):
+    # Original CheckDoctorAvailability.check_conflicts, verbatim (string compares, inclusive bounds)
+    for appt in appointments:
+        print(f"Checking against appointment: {appt['AppointmentID']}, Time: {appt['StartTime']}-{appt['EndTime']}")
+        if start_time >= appt['StartTime'] and start_time <= appt['EndTime']:
+            print(f"CONFLICT: New start time {start_time} falls within existing appointment {appt['StartTime']}-{appt['EndTime']}")
+            return True
+        if end_time >= appt['StartTime'] and end_time <= appt['EndTime']:
+            print(f"CONFLICT: New end time {end_time} falls within existing appointment {appt['StartTime']}-{appt['EndTime']}")
+            return True
+        if start_time <= appt['StartTime'] and end_time >= appt['EndTime']:
+            print(f"CONFLICT: New appointment {start_time}-{end_time} encompasses existing appointment {appt['StartTime']}-{appt['EndTime']}")
+            return True
+    print("No conflicts found")
+    return False
+
+
+def hhmm(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def make_day(count):
+    # `count` one-minute appointments spread evenly across the day, no overlaps
+    step = max(1, 1440 // count)
+    return [{'AppointmentID': f'A{n}', 'StartTime': hhmm(n * step), 'EndTime': hhmm(n * step + 1)}
+            for n in range(count)]
+
+
+def per_call_us(fn, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - started) / rounds * 1e6
+
+
+def main(sizes):
+    rng = random.Random(7)
+    for size in sizes:
+        appointments = make_day(size)
+        schedule = DaySchedule.from_appointments(appointments)
+        candidates = [(start, start + 15) for start in (rng.randrange(0, 1425) for _ in range(CANDIDATES))]
+        candidate_strings = [(hhmm(s), hhmm(e)) for s, e in candidates]
+
+        def legacy_batch():
+            with contextlib.redirect_stdout(io.StringIO()):
+                return [c for c in candidate_strings if not legacy_check_conflicts(c[0], c[1], appointments)]
+
+        def build_and_batch():
+            return DaySchedule.from_appointments(appointments).free_slots(candidates)
+
+        def batch_only():
+            return schedule.free_slots(candidates)
+
+        print(f"{size:>5} appointments/day, {CANDIDATES} candidate slots per batch")
+        print(f"  legacy loop (with its logging) {per_call_us(legacy_batch, ROUNDS // 10):10.1f} us/batch")
+        print(f"  DaySchedule build + batch      {per_call_us(build_and_batch, ROUNDS):10.1f} us/batch")
+        print(f"  DaySchedule batch (prebuilt)   {per_call_us(batch_only, ROUNDS):10.1f} us/batch")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10, 100, 1000])
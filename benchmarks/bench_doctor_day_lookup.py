@@ -0,0 +1,72 @@
+"""
+Doctor/day lookup: full-table scan vs DoctorDateIndex query, against table size.
+
+    python -m benchmarks.bench_doctor_day_lookup
+"""
+import random
+import sys
+from datetime import date, timedelta
+
+from boto3.dynamodb.conditions import Attr
+
+from AppointmentStore import query_doctor_day, scan_pages
+from benchmarks.fakes import appointments_table
+from benchmarks.stats import summary, time_calls
+
+DOCTORS = 50
+DAYS = 365
+LOOKUPS = 200
+FIRST_DAY = date(2025, 1, 1)
+
+
+def day(offset):
+    return (FIRST_DAY + timedelta(days=offset)).isoformat()
+
+
+def build_table(size, rng):
+    table = appointments_table()
+    for n in range(size):
+        hour = 8 + n % 10
+        table.put_item(Item={
+            'AppointmentID': f'A{n:08d}',
+            'PatientID': f'P{rng.randrange(10000):05d}',
+            'DoctorID': f'D{rng.randrange(DOCTORS):03d}',
+            'AppointmentDate': day(n % DAYS),
+            'StartTime': f'{hour:02d}:00',
+            'EndTime': f'{hour:02d}:30',
+            'AppointmentStatus': 'Confirmed'
+        })
+    return table
+
+
+def legacy_scan(table, doctor_id, appointment_date):
+    # Original handler: first page only, filtered after reading every row on it
+    return table.scan(
+        FilterExpression=Attr('DoctorID').eq(doctor_id) & Attr('AppointmentDate').eq(appointment_date)
+    ).get('Items', [])
+
+
+def paginated_scan(table, doctor_id, appointment_date):
+    items = []
+    condition = Attr('DoctorID').eq(doctor_id) & Attr('AppointmentDate').eq(appointment_date)
+    for page in scan_pages(table, FilterExpression=condition):
+        items.extend(page)
+    return items
+
+
+def main(sizes):
+    rng = random.Random(42)
+    for size in sizes:
+        table = build_table(size, rng)
+        probes = [(table, f'D{rng.randrange(DOCTORS):03d}', day(rng.randrange(DAYS)))
+                  for _ in range(LOOKUPS)]
+
+        missed = sum(len(paginated_scan(*p)) - len(legacy_scan(*p)) for p in probes[:20])
+        print(f"table size {size:>7}")
+        print(f"  legacy scan (1 page)  {summary(time_calls(legacy_scan, probes[:50]))}  conflicts missed in 20 probes: {missed}")
+        print(f"  paginated scan        {summary(time_calls(paginated_scan, probes[:50]))}")
+        print(f"  DoctorDateIndex query {summary(time_calls(query_doctor_day, probes))}")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000])
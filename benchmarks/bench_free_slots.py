@@ -0,0 +1,99 @@
+"""
+"Next N free windows" for a doctor across a date range: the slot bitmap search
+(FindFreeSlots, one pipelined BITFIELD_RO per batch of days) against walking
+each day's cached schedule (get_doctor_day + DaySchedule) window by window.
+Checks both return the same windows and that a booking made through
+ConfirmBooking disappears from the next search.
+
+    python -m benchmarks.bench_free_slots [searches]
+"""
+import contextlib
+import io
+import random
+import sys
+from datetime import datetime, timedelta
+
+import AwsClients
+import ConfirmBooking
+import FindFreeSlots
+from AppointmentStore import APPOINTMENTS_TABLE
+from AvailabilityCache import get_doctor_day
+from DoctorSchedule import DaySchedule, to_minutes
+from SlotBitmap import DAY_END, DAY_START, SLOT_MINUTES, minutes_to_time
+from benchmarks.datagen import generate, install
+from benchmarks.fakes import FakeRedis
+from benchmarks.stats import summary, time_calls
+
+LATENCY = 0.001
+DAYS = 14
+COUNT = 5
+
+
+def schedule_scan(doctor_id, dates, duration_minutes, count):
+    """Per-day cached schedule, trying every slot-aligned window in turn"""
+    table = AwsClients.table(APPOINTMENTS_TABLE)
+    windows = []
+    for appointment_date in dates:
+        schedule = DaySchedule.from_appointments(get_doctor_day(AwsClients.redis, table, doctor_id, appointment_date))
+        start = -(-to_minutes(DAY_START) // SLOT_MINUTES) * SLOT_MINUTES
+        needed = -(-duration_minutes // SLOT_MINUTES) * SLOT_MINUTES
+        while start + needed <= to_minutes(DAY_END):
+            # Slot by slot, so busy intervals are rounded outwards like the bitmap does
+            if not any(schedule.conflicts(minute, minute + SLOT_MINUTES) for minute in range(start, start + needed, SLOT_MINUTES)):
+                windows.append({'AppointmentDate': appointment_date, 'StartTime': minutes_to_time(start),
+                                'EndTime': minutes_to_time(start + duration_minutes)})
+                if len(windows) >= count:
+                    return windows
+                start += needed
+            else:
+                start += SLOT_MINUTES
+    return windows
+
+
+def main(searches):
+    dataset = generate(doctors=40, patients=500, days=DAYS, per_doctor_day=18, past_days=0)
+    fakes = install(dataset, latency=LATENCY)
+    dates = dataset.dates()
+    now = datetime.strptime(dates[0], '%Y-%m-%d')
+    rng = random.Random(5)
+    requests = [(rng.choice(dataset.doctors)['DoctorID'], rng.choice((15, 30, 60, 90))) for _ in range(searches)]
+    print(f"{searches} searches for the next {COUNT} free windows over {DAYS} days "
+          f"({dataset}, {LATENCY * 1000:.0f}ms per call)")
+
+    def bitmap(doctor_id, duration):
+        return FindFreeSlots.find_free_slots(doctor_id, dates[0], dates[-1], duration, COUNT, now=now)
+
+    def scan(doctor_id, duration):
+        return schedule_scan(doctor_id, dates, duration, COUNT)
+
+    mismatches = sum(bitmap(*request) != scan(*request) for request in requests[:50])
+
+    for label, fn in (('schedule scan', scan), ('bitmap', bitmap)):
+        redis_client = FakeRedis(latency=LATENCY)
+        AwsClients.redis.override(redis_client)
+        fakes.appointments.calls.clear()
+        with contextlib.redirect_stdout(io.StringIO()):
+            cold = time_calls(fn, requests)
+            warm = time_calls(fn, requests)
+        print(f"  {label:<14} cold {summary(cold)}  warm {summary(warm)}  "
+              f"{fakes.appointments.calls.get('query', 0) / (2 * searches):.2f} queries/search  "
+              f"{sum(redis_client.calls.values()) / (2 * searches):.2f} Redis round trips/search")
+    print(f"  results differ for {mismatches} of {min(50, searches)} searches")
+
+    # A booking in the first free window must not be offered again
+    doctor_id = dataset.doctors[0]['DoctorID']
+    first = bitmap(doctor_id, 30)[0]
+    with contextlib.redirect_stdout(io.StringIO()):
+        ConfirmBooking.lambda_handler(dict(first, DoctorID=doctor_id, PatientID='P000001', AppointmentID='FREE0001',
+                                           EndTime=minutes_to_time(to_minutes(first['EndTime']) - 1)), None)
+    print(f"  booked {first['AppointmentDate']} {first['StartTime']}: "
+          f"{'no longer offered' if first not in bitmap(doctor_id, 30) else 'STILL OFFERED'}")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        response = FindFreeSlots.lambda_handler({'queryStringParameters': {
+            'DoctorID': doctor_id, 'FromDate': dates[0], 'ToDate': (now + timedelta(days=DAYS + 40)).strftime('%Y-%m-%d')}}, None)
+    print(f"  range over {FindFreeSlots.MAX_SEARCH_DAYS} days -> {response['statusCode']}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 300)
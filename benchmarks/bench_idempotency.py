@@ -0,0 +1,117 @@
+"""
+Retried and double-clicked booking submissions through BookAppointmentLambda:
+executions started (async) or appointments written and notifications queued
+(fused) per unique submission, the duplicate counters from the EMF records,
+and latency of first submissions against replays.
+
+    python -m benchmarks.bench_idempotency [submissions]
+"""
+import contextlib
+import io
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import AwsClients
+import BookAppointmentLambda
+from benchmarks.datagen import SLOTS, generate, install
+from benchmarks.stats import summary, time_calls
+
+LATENCY = 0.002
+COUNTERS = ('bookings.duplicates', 'bookings.duplicates_in_progress', 'bookings.idempotency_key_reused',
+            'idempotency.unavailable')
+
+
+class UnreachableRedis:
+    """Every command fails, as with an ElastiCache outage"""
+
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise ConnectionError('Redis unavailable')
+        return fail
+
+
+def counters(output):
+    """Sum the duplicate counters over the EMF lines a run printed"""
+    totals = dict.fromkeys(COUNTERS, 0)
+    for line in output.splitlines():
+        if line.startswith('{"_aws"'):
+            record = json.loads(line)
+            for name in COUNTERS:
+                totals[name] += record.get(name, 0)
+    return {name: value for name, value in totals.items() if value}
+
+
+def submissions(rng, dataset, count, keyed):
+    requests = []
+    for n in range(count):
+        start_time, end_time = rng.choice(SLOTS)
+        body = {'PatientID': rng.choice(dataset.patients)['PatientID'], 'DoctorID': rng.choice(dataset.doctors)['DoctorID'],
+                'AppointmentDate': dataset.dates()[1], 'StartTime': start_time, 'EndTime': end_time}
+        event = {'body': json.dumps(body)}
+        if keyed:
+            event['headers'] = {'Idempotency-Key': f'client-{n:06d}'}
+        requests.append(event)
+    return requests
+
+
+def run(label, mode, count, keyed=True, redis_down=False):
+    rng = random.Random(3)
+    dataset = generate(doctors=30, patients=300, days=3, per_doctor_day=0, past_days=0)
+    fakes = install(dataset, latency=LATENCY)
+    if redis_down:
+        AwsClients.redis.override(UnreachableRedis())
+    requests = [dict(event, stageVariables={'bookingMode': mode}) for event in submissions(rng, dataset, count, keyed)]
+
+    # Every submission is sent twice at once (double-click), then retried once.
+    # Metrics are process-wide, so counters are only read from the sequential retries
+    lock = threading.Lock()
+    first, statuses = [], {}
+
+    def send(event):
+        started = time.perf_counter()
+        status = BookAppointmentLambda.lambda_handler(event, None)['statusCode']
+        with lock:
+            first.append((time.perf_counter() - started) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    output = io.StringIO()
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=16) as executor:
+        list(executor.map(send, [event for event in requests for _ in range(2)]))
+    with contextlib.redirect_stdout(output):
+        replays = time_calls(BookAppointmentLambda.lambda_handler, [(event, None) for event in requests])
+
+    if mode == 'fused':
+        outcome = (f"{len(fakes.appointments._items)} appointments, "
+                   f"{len(fakes.sqs.messages)} notifications queued")
+    else:
+        outcome = f"{len(fakes.stepfunctions.executions)} executions started"
+    print(f"{label:<28} {count} submissions x3 -> {outcome}")
+    print(f"{'':<28} pairs {summary(first)} statuses {dict(sorted(statuses.items()))}")
+    print(f"{'':<28} retry {summary(replays)} {counters(output.getvalue())}")
+
+
+def key_reuse():
+    dataset = generate(doctors=5, patients=20, days=2, per_doctor_day=0, past_days=0)
+    install(dataset)
+    event = submissions(random.Random(1), dataset, 1, keyed=True)[0]
+    other = dict(event, body=json.dumps(dict(json.loads(event['body']), StartTime='17:00', EndTime='17:29')))
+    with contextlib.redirect_stdout(io.StringIO()):
+        statuses = [BookAppointmentLambda.lambda_handler(e, None)['statusCode'] for e in (event, event, other)]
+    print(f"{'key reused for another slot':<28} statuses {statuses}")
+
+
+def main(count):
+    print(f"Duplicate booking submissions ({LATENCY * 1000:.0f}ms per call)")
+    run('async, Idempotency-Key', 'async', count)
+    run('async, no key (fingerprint)', 'async', count, keyed=False)
+    run('async, key, Redis down', 'async', count, redis_down=True)
+    run('fused, Idempotency-Key', 'fused', count)
+    key_reuse()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
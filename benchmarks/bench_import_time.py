@@ -0,0 +1,49 @@
+"""
+Cold-start cost of each handler module: time to import it in a fresh
+interpreter, once with no Redis configured and once with REDIS_ENDPOINT set to
+an unroutable address (clients are created lazily, so neither should touch
+the network at import).
+
+    python -m benchmarks.bench_import_time [repeats]
+"""
+import os
+import subprocess
+import sys
+
+from benchmarks.stats import summary
+
+HANDLERS = (
+    'VerifyPatient', 'CheckDoctorAvailability', 'ConfirmBooking', 'NotifyPatientAndDoctor',
+    'BookAppointmentLambda', 'AmazonSQSNotification', 'AppointmentReminder', 'ArchiveAppointments'
+)
+
+PROBE = (
+    "import time; started = time.perf_counter(); import {module}; "
+    "print(time.perf_counter() - started)"
+)
+
+
+def import_ms(module, env):
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE.format(module=module)],
+        env=env, capture_output=True, text=True, timeout=60, check=True
+    )
+    return float(result.stdout.strip().splitlines()[-1]) * 1000
+
+
+def main(repeats):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    base = dict(os.environ, PYTHONPATH=root, PYTHONDONTWRITEBYTECODE='1')
+    base.pop('REDIS_ENDPOINT', None)
+    # 10.255.255.1 drops packets: an eager connect or ping would block until its timeout
+    unreachable = dict(base, REDIS_ENDPOINT='10.255.255.1')
+
+    for label, env in (('no redis', base), ('unreachable redis', unreachable)):
+        print(label)
+        for module in HANDLERS:
+            samples = [import_ms(module, env) for _ in range(repeats)]
+            print(f"  {module:<26} {summary(samples)}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,66 @@
+"""
+Per-booking enqueue cost in NotifyPatientAndDoctor: two send_message calls
+(previous code) vs one SendMessageBatch with retry of failed entries.
+
+    python -m benchmarks.bench_notify_enqueue
+"""
+import contextlib
+import io
+import json
+import sys
+import time
+
+import AwsClients
+import NotifyPatientAndDoctor
+from benchmarks.fakes import FakeSQS
+
+SQS_LATENCY = 0.005
+
+
+def booking_event(n):
+    return {
+        'PatientID': f'P{n}', 'DoctorID': f'D{n % 50}', 'AppointmentDate': '2025-06-01', 'StartTime': '09:00',
+        'verifyResult': {'patientDetails': {'FirstName': 'Pat', 'LastName': f'Patient{n}'}},
+        'availabilityResult': {'doctorDetails': {'FirstName': 'Doc', 'LastName': f'Doctor{n % 50}'}}
+    }
+
+
+def two_sends(sqs, event):
+    # Previous handler: two full dicts, two json.dumps, two round trips
+    common = {
+        "PatientID": event['PatientID'],
+        "PatientName": "Pat Patient",
+        "DoctorID": event['DoctorID'],
+        "DoctorName": "Doc Doctor",
+        "AppointmentDate": event['AppointmentDate'],
+        "StartTime": event['StartTime'],
+        "MessageType": "Notification"
+    }
+    sqs.send_message(QueueUrl='q', MessageBody=json.dumps(dict(common, RecipientType='patient')))
+    sqs.send_message(QueueUrl='q', MessageBody=json.dumps(dict(common, RecipientType='doctor')))
+
+
+def main(bookings):
+    events = [booking_event(n) for n in range(bookings)]
+
+    sqs = FakeSQS(latency=SQS_LATENCY)
+    started = time.perf_counter()
+    for event in events:
+        two_sends(sqs, event)
+    legacy = (time.perf_counter() - started) / bookings
+
+    for failure_rate in (0.0, 0.1):
+        sqs = FakeSQS(latency=SQS_LATENCY, entry_failure_rate=failure_rate)
+        AwsClients.override('sqs', sqs)
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = [NotifyPatientAndDoctor.lambda_handler(event, None) for event in events]
+        batched = (time.perf_counter() - started) / bookings
+        ok = sum(1 for result in results if result['statusCode'] == 200)
+        print(f"entry failure rate {failure_rate:.0%}: batched {batched * 1000:.2f} ms/booking "
+              f"({sqs.calls.get('send_message_batch', 0) / bookings:.2f} requests/booking, {ok}/{bookings} ok, "
+              f"{len(sqs.messages)} messages) vs two send_message {legacy * 1000:.2f} ms/booking")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 300)
@@ -0,0 +1,50 @@
+"""
+VerifyPatient lookups through the two-tier cache: per-tier hit ratios and the
+Redis/DynamoDB round trips left over, for a mix of repeat patients and bad IDs.
+
+    python -m benchmarks.bench_patient_cache
+"""
+import contextlib
+import io
+import random
+import sys
+
+import AwsClients
+import VerifyPatient
+from TieredCache import TieredCache
+from benchmarks.fakes import FakeDynamoDB, FakeRedis, InMemoryTable
+
+PATIENTS = 500
+BAD_ID_SHARE = 0.2
+
+
+def main(lookups):
+    rng = random.Random(5)
+    patients = InMemoryTable('Patients', 'PatientID')
+    for n in range(PATIENTS):
+        patients.put_item(Item={'PatientID': f'P{n:04d}', 'FirstName': 'Pat', 'LastName': f'Patient{n}'})
+    redis_client = FakeRedis()
+
+    AwsClients.override('dynamodb', FakeDynamoDB(patients), kind='resource')
+    AwsClients.redis.override(redis_client)
+    VerifyPatient.patient_cache = TieredCache(AwsClients.redis, ttl=86400, local_ttl=300, local_size=256, negative_ttl=60)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(lookups):
+            if rng.random() < BAD_ID_SHARE:
+                patient_id = f'BOT{rng.randrange(20)}'
+            else:
+                # Skewed toward a small set of active patients
+                patient_id = f'P{int(rng.paretovariate(1.2)) % PATIENTS:04d}'
+            VerifyPatient.lambda_handler({'PatientID': patient_id}, None)
+
+    cache = VerifyPatient.patient_cache
+    print(f"{lookups} VerifyPatient lookups ({BAD_ID_SHARE:.0%} unknown IDs)")
+    print(f"  hit ratios {cache.hit_ratios()}  negative hits {cache.stats['negative_hits']}")
+    round_trips = sum(redis_client.calls.get(command, 0) for command in ('get', 'pipeline', 'set'))
+    print(f"  Redis round trips {round_trips}  DynamoDB get_item {patients.calls.get('get_item', 0)}"
+          f"  (single-tier: {lookups} Redis GETs)")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
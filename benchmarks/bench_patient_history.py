@@ -0,0 +1,148 @@
+"""
+Patient appointment history: listing a patient's appointments with a filtered
+scan of Appointments (the only way before the PatientDateIndex) against paging
+through PatientHistory, plus CheckDoctorAvailability with the patient overlap
+check on. Reports items read and latency per patient as history grows, checks
+that the pages return every appointment once in date order, and that the
+overlap check finds every double booking with one index query per check.
+
+    python -m benchmarks.bench_patient_history [past_days ...]
+"""
+import contextlib
+import io
+import json
+import random
+import sys
+import time
+
+from boto3.dynamodb.conditions import Attr
+
+import CheckDoctorAvailability
+import PatientHistory
+from AppointmentStore import PATIENT_DATE_INDEX, scan_pages
+from DoctorSchedule import DaySchedule, to_minutes
+from benchmarks.datagen import SLOTS, generate, install
+from benchmarks.stats import summary
+
+LATENCY = 0.001
+PATIENTS = 20
+PAGE_SIZE = 10
+
+
+class ReadCounter:
+    """Items evaluated by a table's scans and queries, and queries per index"""
+
+    def __init__(self, table):
+        self.items = 0
+        self.index_queries = 0
+        self._scan, self._query = table.scan, table.query
+        table.scan, table.query = self.scan, self.query
+
+    def scan(self, **kwargs):
+        response = self._scan(**kwargs)
+        self.items += response['ScannedCount']
+        return response
+
+    def query(self, **kwargs):
+        response = self._query(**kwargs)
+        self.items += response['ScannedCount']
+        self.index_queries += kwargs.get('IndexName') == PATIENT_DATE_INDEX
+        return response
+
+
+def scan_history(table, patient_id):
+    return [item for page in scan_pages(table, FilterExpression=Attr('PatientID').eq(patient_id)) for item in page]
+
+
+def page_history(patient_id):
+    """Every page of PatientHistory, newest first; returns (appointments, per-page ms)"""
+    appointments, samples, cursor = [], [], None
+    while True:
+        started = time.perf_counter()
+        body = json.loads(PatientHistory.lambda_handler(
+            {'PatientID': patient_id, 'Limit': PAGE_SIZE, **({'Cursor': cursor} if cursor else {})}, None)['body'])
+        samples.append((time.perf_counter() - started) * 1000)
+        appointments.extend(body['Appointments'])
+        cursor = body['NextCursor']
+        if not cursor:
+            return appointments, samples
+
+
+def overlap_events(rng, dataset, count):
+    """Half of them at a time the patient already has booked, with another doctor"""
+    events = []
+    for n in range(count):
+        appointment = rng.choice(dataset.appointments)
+        doctor = rng.choice([d for d in dataset.doctors if d['DoctorID'] != appointment['DoctorID']])
+        start_time, end_time = ((appointment['StartTime'], appointment['EndTime']) if n % 2 == 0 else rng.choice(SLOTS))
+        events.append({'PatientID': appointment['PatientID'], 'DoctorID': doctor['DoctorID'],
+                       'AppointmentDate': appointment['AppointmentDate'], 'StartTime': start_time, 'EndTime': end_time})
+    return events
+
+
+def expected_outcome(dataset, event):
+    def day(field, value):
+        return DaySchedule.from_appointments([appt for appt in dataset.appointments if appt[field] == value
+                                              and appt['AppointmentDate'] == event['AppointmentDate']])
+    start, end = to_minutes(event['StartTime']), to_minutes(event['EndTime'])
+    if day('DoctorID', event['DoctorID']).conflicts(start, end):
+        return 'doctor'
+    return 'patient' if day('PatientID', event['PatientID']).conflicts(start, end) else 'free'
+
+
+def run(past_days):
+    dataset = generate(doctors=50, patients=2000, days=past_days + 14, per_doctor_day=8, past_days=past_days)
+    fakes = install(dataset, latency=LATENCY)
+    reads = ReadCounter(fakes.appointments)
+    rng = random.Random(4)
+    patients = rng.sample(dataset.patients, PATIENTS)
+
+    scan_items, scan_samples, page_items, page_samples, mismatches = 0, [], 0, [], 0
+    for patient in patients:
+        reads.items = 0
+        started = time.perf_counter()
+        expected = scan_history(fakes.appointments, patient['PatientID'])
+        scan_samples.append((time.perf_counter() - started) * 1000)
+        scan_items += reads.items
+
+        reads.items = 0
+        with contextlib.redirect_stdout(io.StringIO()):
+            appointments, samples = page_history(patient['PatientID'])
+        page_samples.extend(samples)
+        page_items += reads.items
+        dates = [appt['AppointmentDate'] for appt in appointments]
+        ids = [appt['AppointmentID'] for appt in appointments]
+        if sorted(ids) != sorted(appt['AppointmentID'] for appt in expected) or dates != sorted(dates, reverse=True):
+            mismatches += 1
+
+    print(f"{past_days:>4} days of history, {len(fakes.appointments):>6} appointment rows; {PATIENTS} patients")
+    print(f"     filtered scan:  {scan_items / PATIENTS:>8.0f} items read per patient, {summary(scan_samples)} per listing")
+    print(f"     PatientHistory: {page_items / PATIENTS:>8.0f} items read per patient, {summary(page_samples)} per page "
+          f"of {PAGE_SIZE}; {mismatches} listings incomplete or out of order")
+
+    CheckDoctorAvailability.PATIENT_OVERLAP_CHECK = True
+    events = overlap_events(rng, dataset, 100)
+    reads.index_queries = 0
+    outcomes = {'doctor': 0, 'patient': 0, 'free': 0}
+    wrong = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for event in events:
+            result = CheckDoctorAvailability.lambda_handler(event, None)
+            body = json.loads(result['body'])
+            outcome = 'free' if result['statusCode'] == 200 else 'patient' if 'Patient' in body else 'doctor'
+            outcomes[outcome] += 1
+            wrong += outcome != expected_outcome(dataset, event)
+    checks = len(events) - outcomes['doctor']
+    print(f"     overlap check: {outcomes['patient']} patient double bookings refused, {outcomes['doctor']} doctor conflicts, "
+          f"{outcomes['free']} available; {wrong} wrong; {reads.index_queries / checks:.1f} index queries per patient check")
+    CheckDoctorAvailability.PATIENT_OVERLAP_CHECK = False
+
+
+def main(history):
+    print(f"{LATENCY * 1000:.0f}ms per call")
+    for past_days in history:
+        run(past_days)
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [30, 120])
@@ -0,0 +1,109 @@
+"""
+Reminder scheduling: the daily scan-based AppointmentReminder run against the
+due queue (REMINDER_QUEUE_MODE) run hourly for a simulated day on a fake clock.
+Bookings made during the day go through ConfirmBooking, which files their
+reminders; a fifth of the doctors are on digest mode. Reports items read per run
+as history grows, and checks that every patient reminder due in the day went out
+exactly once.
+
+    python -m benchmarks.bench_reminder_queue [past_days ...]
+"""
+import contextlib
+import io
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import AppointmentReminder
+import ConfirmBooking
+import ReminderQueue
+from benchmarks.datagen import SLOTS, generate, install
+
+LATENCY = 0.001
+LEAD_HOURS = (24, 2)
+
+
+class ReadCounter:
+    """Counts items evaluated by a table's scans and queries"""
+
+    def __init__(self, table):
+        self.items = 0
+        for operation in ('scan', 'query'):
+            setattr(table, operation, self._counted(getattr(table, operation)))
+
+    def _counted(self, operation):
+        def call(**kwargs):
+            response = operation(**kwargs)
+            self.items += response['ScannedCount']
+            return response
+        return call
+
+
+def book_during_day(rng, dataset, start, count):
+    """New bookings for tomorrow and the day after, confirmed at the start of the simulated day"""
+    bookings = []
+    for n in range(count):
+        start_time, end_time = rng.choice(SLOTS)
+        event = {'AppointmentID': f'NEW{n:05d}', 'PatientID': rng.choice(dataset.patients)['PatientID'],
+                 'DoctorID': rng.choice(dataset.doctors)['DoctorID'],
+                 'AppointmentDate': (start + timedelta(days=1 + n % 2)).strftime('%Y-%m-%d'),
+                 'StartTime': start_time, 'EndTime': end_time}
+        ConfirmBooking.lambda_handler(event, None)
+        bookings.append(event)
+    return bookings
+
+
+def run(past_days):
+    ReminderQueue.LEAD_HOURS = LEAD_HOURS
+    dataset = generate(doctors=50, patients=2000, days=past_days + 3, per_doctor_day=8, past_days=past_days)
+    fakes = install(dataset, latency=LATENCY)
+    # Next full hour: everything due from then on was filed before the simulated day
+    start = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    appointment_reads, due_reads = ReadCounter(fakes.appointments), ReadCounter(fakes.reminder_due)
+    # A fifth of the doctors take the evening digest instead of per-appointment reminders
+    for doctor in list(fakes.doctors._items.values())[::5]:
+        doctor['ReminderMode'] = 'digest'
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        bookings = book_during_day(random.Random(3), dataset, start, 50)
+
+        AppointmentReminder.QUEUE_MODE = False
+        started = time.perf_counter()
+        AppointmentReminder.lambda_handler({'Now': start.isoformat()}, None)
+        scan_seconds = time.perf_counter() - started
+        scan_items, appointment_reads.items = appointment_reads.items, 0
+
+        AppointmentReminder.QUEUE_MODE = True
+        published = len(fakes.sns.published)
+        started = time.perf_counter()
+        for hour in range(24):
+            AppointmentReminder.lambda_handler({'Now': (start + timedelta(hours=hour)).isoformat()}, None)
+        queue_seconds = time.perf_counter() - started
+    queue_messages = fakes.sns.published[published:]
+    patient_reminders = sum(1 for message in queue_messages
+                            if message['MessageAttributes']['recipient_type']['StringValue'] == 'patient')
+
+    # Patient reminders due during the simulated day: each run sends what is due by
+    # then, so each goes out at the first hourly run at or after its due time
+    end = start + timedelta(hours=23)
+    expected = sum(1 for appointment in dataset.appointments + bookings for lead_hours in LEAD_HOURS
+                   if start <= ReminderQueue.appointment_start(appointment) - timedelta(hours=lead_hours) <= end)
+    left_behind = sum(1 for entry in fakes.reminder_due._items.values() if entry['DueAt'] <= end.strftime('%Y-%m-%dT%H:%M'))
+
+    print(f"{past_days:>4} days of history, {len(fakes.appointments):>6} appointment rows")
+    print(f"     daily scan run:  {scan_items:>7} items read, {scan_seconds * 1000:8.1f}ms")
+    print(f"     24 hourly runs:  {appointment_reads.items + due_reads.items:>7} items read "
+          f"({due_reads.items} due entries + {appointment_reads.items} for digests), {queue_seconds * 1000:8.1f}ms, "
+          f"{len(queue_messages)} publishes")
+    print(f"     patient reminders due in the day: {expected}, sent {patient_reminders}, due entries left unsent {left_behind}")
+
+
+def main(history):
+    print(f"lead times {LEAD_HOURS} hours, {LATENCY * 1000:.0f}ms per call")
+    for past_days in history:
+        run(past_days)
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [7, 60])
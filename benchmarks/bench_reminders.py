@@ -0,0 +1,78 @@
+"""
+AppointmentReminder wall time against the number of appointments due tomorrow,
+with simulated network latency on BatchGetItem and SNS publish. Each size runs
+with individual doctor reminders, with a quarter of the doctors opted in to the
+daily digest (ReminderMode) and with DOCTOR_REMINDER_MODE=digest.
+
+    python -m benchmarks.bench_reminders
+"""
+import contextlib
+import io
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import AwsClients
+import AppointmentReminder
+from benchmarks.fakes import FakeDynamoDB, FakeSNS, InMemoryTable, appointments_table
+
+CALL_LATENCY = 0.010  # seconds per simulated AWS call
+PATIENTS = 2000
+DOCTORS = 100
+
+
+def build(count, digest_every=0):
+    rng = random.Random(count)
+    tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+    patients = InMemoryTable('Patients', 'PatientID')
+    doctors = InMemoryTable('Doctors', 'DoctorID')
+    appointments = appointments_table()
+    for n in range(PATIENTS):
+        patients.put_item(Item={'PatientID': f'P{n:05d}', 'FirstName': 'Pat', 'LastName': f'P{n}', 'Email': f'p{n}@example.com'})
+    for n in range(DOCTORS):
+        doctor = {'DoctorID': f'D{n:03d}', 'FirstName': 'Doc', 'LastName': f'D{n}', 'Email': f'd{n}@example.com'}
+        if digest_every and n % digest_every == 0:
+            doctor['ReminderMode'] = 'digest'
+        doctors.put_item(Item=doctor)
+    for n in range(count):
+        appointments.put_item(Item={
+            'AppointmentID': f'A{n:06d}', 'PatientID': f'P{rng.randrange(PATIENTS):05d}',
+            'DoctorID': f'D{rng.randrange(DOCTORS):03d}', 'AppointmentDate': tomorrow,
+            'StartTime': f'{8 + n % 10:02d}:00', 'EndTime': f'{8 + n % 10:02d}:30'
+        })
+    return FakeDynamoDB(appointments, patients, doctors, batch_latency=CALL_LATENCY, unprocessed_rate=0.05)
+
+
+def run(count, label, default_mode, digest_every=0):
+    dynamodb = build(count, digest_every)
+    sns = FakeSNS(latency=CALL_LATENCY)
+    AwsClients.override('sns', sns)
+    AwsClients.override('dynamodb', dynamodb, kind='resource')
+    AppointmentReminder.DOCTOR_REMINDER_MODE = default_mode
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = json.loads(AppointmentReminder.lambda_handler({}, None)['body'])
+    elapsed = time.perf_counter() - started
+
+    # The original handler made 2 get_item + 2 publish calls per appointment, serially
+    serial_estimate = count * 4 * CALL_LATENCY
+    doctor_messages = [message for message in sns.published
+                       if message['MessageAttributes']['recipient_type']['StringValue'] == 'doctor']
+    per_doctor = len(doctor_messages) / max(1, len({m['MessageAttributes']['email']['StringValue'] for m in doctor_messages}))
+    print(f"{count:>6} appointments, {label:<16} {elapsed:7.2f}s wall, {len(sns.published):>5} publishes "
+          f"({per_doctor:4.1f} per doctor), {dynamodb.calls.get('batch_get_item', 0)} BatchGetItem calls "
+          f"(serial per-item path at {CALL_LATENCY * 1000:.0f}ms/call: ~{serial_estimate:.0f}s)")
+    print(f"{'':>20}{result}")
+
+
+def main(counts):
+    for count in counts:
+        run(count, 'individual', 'individual')
+        run(count, '1/4 opted in', 'individual', digest_every=4)
+        run(count, 'digest', 'digest')
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [100, 1000, 5000])
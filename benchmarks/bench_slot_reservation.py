@@ -0,0 +1,86 @@
+"""
+Concurrent bookings for one doctor's day: check-then-put (CheckDoctorAvailability
+followed by ConfirmBooking) against reservation mode, where ConfirmBooking
+claims per-slot locks and writes the row in one TransactWriteItems call.
+Reports double bookings, latency and DynamoDB requests per attempt.
+
+    python -m benchmarks.bench_slot_reservation [attempts] [workers]
+"""
+import contextlib
+import io
+import random
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import CheckDoctorAvailability
+import ConfirmBooking
+from DoctorSchedule import to_minutes
+from benchmarks.datagen import SLOTS, generate, install
+from benchmarks.stats import summary, time_calls
+
+LATENCY = 0.003
+
+
+def overlapping(appointments):
+    """Appointments that overlap an earlier one of the same doctor and day"""
+    days = {}
+    for appointment in appointments:
+        days.setdefault((appointment['DoctorID'], appointment['AppointmentDate']), []).append(
+            (to_minutes(appointment['StartTime']), to_minutes(appointment['EndTime'])))
+    clashes = 0
+    for intervals in days.values():
+        intervals.sort()
+        latest_end = -1
+        for start, end in intervals:
+            if start < latest_end:
+                clashes += 1
+            latest_end = max(latest_end, end)
+    return clashes
+
+
+def run(label, reservation, attempts, workers):
+    dataset = generate(doctors=2, patients=200, days=1, per_doctor_day=0, past_days=0)
+    fakes = install(dataset, latency=LATENCY)
+    CheckDoctorAvailability.RESERVATION_MODE = ConfirmBooking.RESERVATION_MODE = reservation
+    # Start from a cold cache so every check reads the current schedule
+    CheckDoctorAvailability.doctor_cache._local.clear()
+
+    rng = random.Random(9)
+    date = dataset.dates()[0]
+    requests = []
+    for n in range(attempts):
+        start_time, end_time = rng.choice(SLOTS)
+        requests.append({'PatientID': rng.choice(dataset.patients)['PatientID'], 'DoctorID': 'D0000',
+                         'AppointmentDate': date, 'StartTime': start_time, 'EndTime': end_time,
+                         'AppointmentID': f'R{n:06d}'})
+
+    outcomes = {}
+
+    def attempt(request):
+        result = CheckDoctorAvailability.lambda_handler(request, None)
+        if result['statusCode'] == 200:
+            result = ConfirmBooking.lambda_handler(request, None)
+        outcomes[result['statusCode']] = outcomes.get(result['statusCode'], 0) + 1
+
+    chunks = [requests[i::workers] for i in range(workers)]
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=workers) as executor:
+        samples = [ms for chunk_samples in executor.map(
+            lambda chunk: time_calls(attempt, [(request,) for request in chunk]), chunks) for ms in chunk_samples]
+
+    booked = [item for item in fakes.appointments._items.values()]
+    requests_made = (sum(fakes.appointments.calls.values()) + sum(fakes.doctors.calls.values())
+                     + sum(fakes.slot_locks.calls.values()) + sum(fakes.dynamodb_client.calls.values()))
+    print(f"{label:<16} {summary(samples)}  outcomes {dict(sorted(outcomes.items()))}  "
+          f"booked {len(booked)} / {len(SLOTS)} slots, double-booked {overlapping(booked)}, "
+          f"{requests_made / attempts:.2f} DynamoDB requests/attempt")
+
+
+def main(attempts, workers):
+    print(f"{attempts} attempts from {workers} concurrent workers on one doctor-day "
+          f"({len(SLOTS)} slots, {LATENCY * 1000:.0f}ms per call)")
+    run('check-then-put', False, attempts, workers)
+    run('reservation', True, attempts, workers)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200, int(sys.argv[2]) if len(sys.argv) > 2 else 16)
@@ -0,0 +1,53 @@
+"""
+AmazonSQSNotification throughput (records/s) against SQS batch size, with a
+fake SNS client that adds per-publish latency and rejects some poison messages.
+
+    python -m benchmarks.bench_sqs_notification
+"""
+import contextlib
+import io
+import json
+import sys
+import time
+
+import AwsClients
+import AmazonSQSNotification
+from benchmarks.fakes import FakeSNS
+
+PUBLISH_LATENCY = 0.010
+POISON_EVERY = 50  # one malformed body per POISON_EVERY records
+
+
+def make_records(count):
+    records = []
+    for n in range(count):
+        body = json.dumps({
+            'PatientName': f'Patient {n}', 'DoctorName': 'Dr. Who', 'AppointmentDate': '2025-06-01',
+            'StartTime': '09:00', 'MessageType': 'Notification' if n % 2 else 'Reminder',
+            'RecipientType': 'patient' if n % 3 else 'doctor'
+        })
+        if n % POISON_EVERY == POISON_EVERY - 1:
+            body = '{not json'
+        records.append({'messageId': f'm-{n}', 'body': body})
+    return records
+
+
+def main(sizes):
+    for size in sizes:
+        sns = FakeSNS(latency=PUBLISH_LATENCY)
+        AwsClients.override('sns', sns)
+        records = make_records(size)
+
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = AmazonSQSNotification.lambda_handler({'Records': records}, None)
+        elapsed = time.perf_counter() - started
+
+        failures = len(result['batchItemFailures'])
+        print(f"batch {size:>6}: {size / elapsed:9.0f} records/s  {len(sns.published):>6} published  "
+              f"{failures:>4} reported failures (serial at {PUBLISH_LATENCY * 1000:.0f}ms/publish: "
+              f"{1 / PUBLISH_LATENCY:.0f} records/s)")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [1, 10, 100, 1000, 10000])
@@ -0,0 +1,58 @@
+"""
+Notification render throughput: inline f-strings + json.dumps (previous handler
+code) vs the precompiled NotificationTemplates registry.
+
+    python -m benchmarks.bench_templates
+"""
+import json
+import sys
+import time
+
+from NotificationTemplates import get_template, template_context
+
+
+def inline_structure(patient_name, doctor_name, tomorrow, appointment_time):
+    # Previous AppointmentReminder code path for the patient message
+    patient_message = {
+        "default": f"Reminder: Your appointment with {doctor_name} is tomorrow at {appointment_time}.",
+        "email": f"""
+            Appointment Reminder
+            Dear {patient_name},
+            This is a friendly reminder about your appointment with {doctor_name} tomorrow ({tomorrow}) at {appointment_time}.
+            Please remember to:
+                Bring your insurance card
+                Arrive 15 minutes early
+                Bring a list of current medications
+            If you need to reschedule, please call us at least 4 hours in advance.
+            """
+    }
+    return f"Reminder: Your appointment tomorrow at {appointment_time}", json.dumps(patient_message)
+
+
+def registry_structure(patient_name, doctor_name, tomorrow, appointment_time):
+    template = get_template('ScheduledReminder', 'patient')
+    return template.render_structure(template_context(patient_name, doctor_name, tomorrow, appointment_time))
+
+
+def registry_plain(patient_name, doctor_name, tomorrow, appointment_time):
+    template = get_template('Notification', 'patient')
+    return template.render(template_context(patient_name, doctor_name, tomorrow, appointment_time))
+
+
+def renders_per_second(fn, count):
+    args = [(f'Patient {n}', f'Dr. Doctor{n % 50}', '2025-06-01', f'{8 + n % 10:02d}:00') for n in range(1000)]
+    started = time.perf_counter()
+    for n in range(count):
+        fn(*args[n % 1000])
+    return count / (time.perf_counter() - started)
+
+
+def main(count):
+    print(f"{count} renders each")
+    print(f"  inline f-strings + json.dumps   {renders_per_second(inline_structure, count):10.0f} renders/s")
+    print(f"  registry MessageStructure JSON  {renders_per_second(registry_structure, count):10.0f} renders/s")
+    print(f"  registry plain subject + body   {renders_per_second(registry_plain, count):10.0f} renders/s")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -0,0 +1,79 @@
+"""
+Morning traffic against a cold cache and after WarmCache ran the evening before:
+patient verifications, availability checks and free-slot searches for tomorrow's
+patients and doctors. Reports DynamoDB reads during the burst, latency, and the
+warm-up job's own key count, duration and TTL spread.
+
+    python -m benchmarks.bench_warm_cache [requests]
+"""
+import contextlib
+import io
+import json
+import random
+import sys
+
+import CheckDoctorAvailability
+import FindFreeSlots
+import VerifyPatient
+import WarmCache
+from benchmarks.datagen import SLOTS, generate, install
+from benchmarks.stats import summary, time_calls
+
+LATENCY = 0.002
+
+
+def morning_requests(rng, dataset, tomorrow, count):
+    booked = [appt for appt in dataset.appointments if appt['AppointmentDate'] == tomorrow]
+    requests = []
+    for _ in range(count):
+        appointment = rng.choice(booked)
+        start_time, end_time = rng.choice(SLOTS)
+        kind = rng.random()
+        if kind < 0.4:
+            requests.append((VerifyPatient.lambda_handler, {'PatientID': appointment['PatientID']}))
+        elif kind < 0.8:
+            requests.append((CheckDoctorAvailability.lambda_handler, {
+                'DoctorID': appointment['DoctorID'], 'AppointmentDate': tomorrow,
+                'StartTime': start_time, 'EndTime': end_time}))
+        else:
+            requests.append((FindFreeSlots.lambda_handler, {
+                'DoctorID': appointment['DoctorID'], 'FromDate': tomorrow, 'ToDate': tomorrow,
+                'DurationMinutes': 30, 'Count': 3}))
+    return requests
+
+
+def run(label, warm, count):
+    dataset = generate(doctors=100, patients=3000, days=3, per_doctor_day=12, past_days=1)
+    fakes = install(dataset, latency=LATENCY)
+    tomorrow = dataset.dates()[2]
+    # New containers in the morning: empty in-process tiers
+    VerifyPatient.patient_cache._local.clear()
+    CheckDoctorAvailability.doctor_cache._local.clear()
+
+    warm_report = ''
+    if warm:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = json.loads(WarmCache.lambda_handler({'Date': tomorrow}, None)['body'])
+        ttls = [fakes.redis.expires[key] - fakes.redis.clock() for key in fakes.redis.expires if key.startswith('patient:')]
+        warm_report = (f"  warm-up: {result['keys']} keys in {result['duration_ms']}ms, "
+                       f"{result['round_trips']} pipelines, patient TTLs {min(ttls) / 3600:.1f}h-{max(ttls) / 3600:.1f}h")
+
+    for table in (fakes.appointments, fakes.patients, fakes.doctors):
+        table.calls.clear()
+    requests = morning_requests(random.Random(4), dataset, tomorrow, count)
+    with contextlib.redirect_stdout(io.StringIO()):
+        samples = time_calls(lambda handler, event: handler(event, None), requests)
+    reads = sum(sum(table.calls.values()) for table in (fakes.appointments, fakes.patients, fakes.doctors))
+    print(f"{label:<6} {summary(samples)}  DynamoDB reads during the burst: {reads}")
+    if warm_report:
+        print(warm_report)
+
+
+def main(count):
+    print(f"{count} morning requests for tomorrow's patients and doctors ({LATENCY * 1000:.0f}ms per call)")
+    run('cold', False, count)
+    run('warmed', True, count)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,87 @@
+"""
+End-to-end booking through the in-process workflow interpreter (fused mode):
+latency per booking and outcome mix, plus a Retry/Catch run with a flaky task.
+
+    python -m benchmarks.bench_workflow
+"""
+import contextlib
+import io
+import json
+import random
+import sys
+
+import AwsClients
+import BookAppointmentLambda
+import ConfirmBooking
+import WorkflowRunner
+from benchmarks.fakes import FakeDynamoDB, FakeRedis, FakeSQS, InMemoryTable, appointments_table
+from benchmarks.stats import summary, time_calls
+
+PATIENTS = 200
+DOCTORS = 20
+
+
+def install_fakes():
+    patients = InMemoryTable('Patients', 'PatientID')
+    doctors = InMemoryTable('Doctors', 'DoctorID')
+    for n in range(PATIENTS):
+        patients.put_item(Item={'PatientID': f'P{n:04d}', 'FirstName': 'Pat', 'LastName': f'Patient{n}'})
+    for n in range(DOCTORS):
+        doctors.put_item(Item={'DoctorID': f'D{n:03d}', 'FirstName': 'Doc', 'LastName': f'Doctor{n}'})
+    dynamodb = FakeDynamoDB(patients, doctors, appointments_table())
+    redis_client = FakeRedis()
+
+    AwsClients.override('dynamodb', dynamodb, kind='resource')
+    AwsClients.override('sqs', FakeSQS())
+    AwsClients.redis.override(redis_client)
+    return dynamodb
+
+
+def booking_request(rng):
+    hour = rng.randrange(8, 18)
+    patient = f'P{rng.randrange(PATIENTS + 10):04d}'  # a few unknown patients
+    return {
+        'stageVariables': {'bookingMode': 'fused'},
+        'body': json.dumps({
+            'PatientID': patient, 'DoctorID': f'D{rng.randrange(DOCTORS):03d}',
+            'AppointmentDate': '2025-06-02', 'StartTime': f'{hour:02d}:00', 'EndTime': f'{hour:02d}:30'
+        })
+    }
+
+
+def main(bookings):
+    install_fakes()
+    rng = random.Random(3)
+    requests = [booking_request(rng) for _ in range(bookings)]
+    outcomes = {}
+
+    def book(request):
+        result = BookAppointmentLambda.lambda_handler(request, None)
+        outcomes[result['statusCode']] = outcomes.get(result['statusCode'], 0) + 1
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        samples = time_calls(book, [(request,) for request in requests])
+    print(f"{bookings} fused bookings: {summary(samples)}  outcomes by status: {dict(sorted(outcomes.items()))}")
+
+    # Retry with backoff then Catch: ConfirmBooking fails twice, then succeeds
+    failures = {'left': 2}
+    delays = []
+
+    def flaky_confirm(event, context):
+        if failures['left']:
+            failures['left'] -= 1
+            raise TimeoutError('simulated throttle')
+        return ConfirmBooking.lambda_handler(event, context)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        execution = WorkflowRunner.execute(
+            {'AppointmentID': 'AFLAKY', 'PatientID': 'P0001', 'DoctorID': 'D001', 'AppointmentDate': '2025-06-03',
+             'StartTime': '07:00', 'EndTime': '07:30'},
+            handlers={'ConfirmBooking': flaky_confirm},
+            sleep=delays.append
+        )
+    print(f"flaky ConfirmBooking: {execution['status']} via {' -> '.join(execution['path'])}, retry delays {delays}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
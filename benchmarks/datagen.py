@@ -0,0 +1,142 @@
+"""
+Synthetic dataset for the handler benchmarks: N doctors, M patients and D days
+of appointments, loaded into the in-memory fakes and installed in AwsClients.
+
+    dataset = generate(doctors=50, patients=2000, days=7)
+    fakes = install(dataset, latency=0.002)
+"""
+import random
+import types
+from datetime import datetime, timedelta
+
+import AwsClients
+from AppointmentStore import APPOINTMENTS_TABLE
+from ReminderQueue import REMINDER_DUE_TABLE, backfill_reminders
+from SlotReservation import SLOT_LOCKS_TABLE, backfill_locks
+from benchmarks.fakes import (FakeDynamoDB, FakeDynamoDBClient, FakeRedis, FakeS3, FakeSNS, FakeSQS,
+                              FakeStepFunctions, InMemoryTable, appointments_table)
+
+FIRST_NAMES = ('Ada', 'Brian', 'Ciara', 'Declan', 'Eimear', 'Fionn', 'Grace', 'Hugh', 'Isla', 'Jack')
+LAST_NAMES = ('Byrne', 'Murphy', 'Kelly', 'Walsh', 'Ryan', 'Doyle', "O'Brien", 'Lynch', 'Nolan', 'Quinn')
+
+# Bookable 30 minute slots, 08:00-18:00
+SLOTS = [(f'{minutes // 60:02d}:{minutes % 60:02d}', f'{(minutes + 29) // 60:02d}:{(minutes + 29) % 60:02d}')
+         for minutes in range(8 * 60, 18 * 60, 30)]
+
+
+class Dataset:
+    """Generated records plus the date range they cover"""
+
+    def __init__(self, doctors, patients, appointments, start_date, days):
+        self.doctors = doctors
+        self.patients = patients
+        self.appointments = appointments
+        self.start_date = start_date
+        self.days = days
+
+    def dates(self):
+        return [(self.start_date + timedelta(days=n)).strftime('%Y-%m-%d') for n in range(self.days)]
+
+    def __repr__(self):
+        return (f"{len(self.doctors)} doctors, {len(self.patients)} patients, "
+                f"{len(self.appointments)} appointments over {self.days} days")
+
+
+def _person(rng):
+    return rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+
+
+def generate(doctors=50, patients=2000, days=7, per_doctor_day=10, past_days=2, seed=1):
+    """
+    Build the dataset. Days start `past_days` before today, so the archive job
+    has old rows to move and the reminder job finds appointments tomorrow.
+    per_doctor_day is capped at the number of bookable slots.
+    """
+    rng = random.Random(seed)
+    start_date = datetime.now() - timedelta(days=past_days)
+
+    doctor_items = []
+    for n in range(doctors):
+        first, last = _person(rng)
+        doctor_items.append({
+            'DoctorID': f'D{n:04d}', 'FirstName': first, 'LastName': last,
+            'Email': f'doctor{n}@example.com', 'Specialty': rng.choice(('GP', 'Cardiology', 'Dermatology'))
+        })
+
+    patient_items = []
+    for n in range(patients):
+        first, last = _person(rng)
+        patient_items.append({
+            'PatientID': f'P{n:06d}', 'FirstName': first, 'LastName': last, 'Email': f'patient{n}@example.com'
+        })
+
+    appointment_items = []
+    for day in range(days):
+        appointment_date = (start_date + timedelta(days=day)).strftime('%Y-%m-%d')
+        for doctor in doctor_items:
+            for start_time, end_time in rng.sample(SLOTS, min(per_doctor_day, len(SLOTS))):
+                appointment_items.append({
+                    'AppointmentID': f'A{len(appointment_items):08d}',
+                    'PatientID': rng.choice(patient_items)['PatientID'],
+                    'DoctorID': doctor['DoctorID'],
+                    'AppointmentDate': appointment_date,
+                    'StartTime': start_time,
+                    'EndTime': end_time,
+                    'AppointmentStatus': 'Confirmed',
+                    'CreatedAt': start_date.isoformat()
+                })
+
+    return Dataset(doctor_items, patient_items, appointment_items, start_date, days)
+
+
+def install(dataset, latency=0.0, page_size=1000):
+    """
+    Load the dataset into fresh fakes (each with `latency` seconds per round
+    trip) and install them in AwsClients. Returns the fakes.
+    """
+    doctors = InMemoryTable('Doctors', 'DoctorID')
+    patients = InMemoryTable('Patients', 'PatientID')
+    appointments = appointments_table(page_size=page_size)
+    appointments.name = appointments.table_name = APPOINTMENTS_TABLE
+    slot_locks = InMemoryTable(SLOT_LOCKS_TABLE, 'DoctorID', 'SlotID')
+
+    # Load without latency, then switch it on for the benchmark itself
+    for table, items in ((doctors, dataset.doctors), (patients, dataset.patients), (appointments, dataset.appointments)):
+        for item in items:
+            table.put_item(Item=item)
+        table.calls.clear()
+        table.latency = latency
+    # Locks for the existing bookings, as reservation mode requires
+    backfill_locks(slot_locks, dataset.appointments)
+    slot_locks.calls.clear()
+    slot_locks.latency = latency
+    # Due reminders for the existing bookings, as reminder queue mode requires
+    reminder_due = InMemoryTable(REMINDER_DUE_TABLE, 'DueHour', 'ReminderID')
+    backfill_reminders(appointments, reminder_due)
+    appointments.calls.clear()
+    reminder_due.calls.clear()
+    reminder_due.latency = latency
+
+    dynamodb = FakeDynamoDB(doctors, patients, appointments, slot_locks, reminder_due, batch_latency=latency)
+    fakes = types.SimpleNamespace(
+        dynamodb=dynamodb,
+        dynamodb_client=FakeDynamoDBClient(dynamodb, latency=latency),
+        sns=FakeSNS(latency=latency),
+        sqs=FakeSQS(latency=latency),
+        s3=FakeS3(latency=latency),
+        stepfunctions=FakeStepFunctions(latency=latency),
+        redis=FakeRedis(latency=latency),
+        doctors=doctors,
+        patients=patients,
+        appointments=appointments,
+        slot_locks=slot_locks,
+        reminder_due=reminder_due
+    )
+
+    AwsClients.reset()
+    AwsClients.override('dynamodb', fakes.dynamodb, kind='resource')
+    AwsClients.override('dynamodb', fakes.dynamodb_client)
+    for service in ('sns', 'sqs', 's3', 'stepfunctions'):
+        AwsClients.override(service, getattr(fakes, service))
+    AwsClients.redis.override(fakes.redis)
+    return fakes
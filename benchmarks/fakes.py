@@ -0,0 +1,1007 @@
+"""
+In-memory stand-ins for the AWS resources the handlers use (local benchmarking only).
+
+Every fake accepts `latency` (seconds slept per request round trip) so handler
+benchmarks can model network cost; batched and pipelined calls pay it once.
+"""
+import copy
+import os
+import random
+import re
+import threading
+import time
+from contextlib import ExitStack
+from bisect import bisect_left, bisect_right, insort
+
+from boto3.dynamodb.types import TypeSerializer
+
+
+def _attr_name(value):
+    return getattr(value, 'name', None)
+
+
+def evaluate_condition(condition, item):
+    """Evaluate a boto3.dynamodb.conditions expression against a plain dict item"""
+    expression = condition.get_expression()
+    operator = expression['operator']
+    values = expression['values']
+
+    if operator == 'AND':
+        return all(evaluate_condition(c, item) for c in values)
+    if operator == 'OR':
+        return any(evaluate_condition(c, item) for c in values)
+    if operator == 'NOT':
+        return not evaluate_condition(values[0], item)
+
+    name = _attr_name(values[0])
+    if operator == 'attribute_exists':
+        return name in item
+    if operator == 'attribute_not_exists':
+        return name not in item
+    if name not in item:
+        return operator == '<>'
+
+    actual = item[name]
+    if operator == '=':
+        return actual == values[1]
+    if operator == '<>':
+        return actual != values[1]
+    if operator == '<':
+        return actual < values[1]
+    if operator == '<=':
+        return actual <= values[1]
+    if operator == '>':
+        return actual > values[1]
+    if operator == '>=':
+        return actual >= values[1]
+    if operator == 'BETWEEN':
+        return values[1] <= actual <= values[2]
+    if operator == 'IN':
+        return actual in values[1]
+    if operator == 'begins_with':
+        return isinstance(actual, str) and actual.startswith(values[1])
+    if operator == 'contains':
+        return values[1] in actual
+    raise NotImplementedError(f"Unsupported condition operator: {operator}")
+
+
+def _key_conditions(condition):
+    """Split a KeyConditionExpression into {attribute: (operator, values)}"""
+    expression = condition.get_expression()
+    if expression['operator'] == 'AND':
+        conditions = {}
+        for part in expression['values']:
+            conditions.update(_key_conditions(part))
+        return conditions
+    values = expression['values']
+    return {_attr_name(values[0]): (expression['operator'], values[1:])}
+
+
+def _range_bounds(entries, operator, values):
+    """Slice bounds in a sorted [(range_value, primary_key)] list for a sort key condition"""
+    low, high = 0, len(entries)
+    if operator == '=':
+        low = bisect_left(entries, (values[0],))
+        high = bisect_left(entries, (values[0], (chr(0x10FFFF),)))
+    elif operator == '<':
+        high = bisect_left(entries, (values[0],))
+    elif operator == '<=':
+        high = bisect_left(entries, (values[0], (chr(0x10FFFF),)))
+    elif operator == '>':
+        low = bisect_left(entries, (values[0], (chr(0x10FFFF),)))
+    elif operator == '>=':
+        low = bisect_left(entries, (values[0],))
+    elif operator == 'BETWEEN':
+        low = bisect_left(entries, (values[0],))
+        high = bisect_left(entries, (values[1], (chr(0x10FFFF),)))
+    elif operator == 'begins_with':
+        low = bisect_left(entries, (values[0],))
+        high = bisect_left(entries, (values[0] + chr(0x10FFFF),))
+    else:
+        raise NotImplementedError(f"Unsupported key condition operator: {operator}")
+    return low, high
+
+
+class ConditionalCheckFailedException(Exception):
+    pass
+
+
+class _TableExceptions:
+    ConditionalCheckFailedException = ConditionalCheckFailedException
+
+
+class _TableMeta:
+    def __init__(self, client):
+        self.client = client
+
+
+class _BatchWriter:
+    """Buffers writes and flushes them 25 at a time, one round trip per flush (like boto3)"""
+
+    def __init__(self, table):
+        self.table = table
+        self.pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+        return False
+
+    def put_item(self, Item):
+        self.pending.append(('put', Item))
+        if len(self.pending) >= 25:
+            self.flush()
+
+    def delete_item(self, Key):
+        self.pending.append(('delete', Key))
+        if len(self.pending) >= 25:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.table._batch_write(self.pending)
+            self.pending = []
+
+
+_serializer = TypeSerializer()
+
+
+def _serialize_item(item):
+    return {name: _serializer.serialize(value) for name, value in item.items()}
+
+
+class InMemoryTable:
+    """
+    Dict-backed stand-in for a boto3 DynamoDB Table resource.
+
+    Items are kept in primary-key order so scans paginate like DynamoDB does
+    (page_size items evaluated per call, FilterExpression applied afterwards).
+    Secondary indexes are sorted per partition, so a query costs
+    O(log n + matches) instead of O(table size).
+    """
+
+    def __init__(self, name, hash_key, range_key=None, indexes=None, page_size=1000, latency=0.0):
+        self.name = name
+        self.table_name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.page_size = page_size
+        self.latency = latency
+        self.indexes = dict(indexes or {})
+        self.exceptions = _TableExceptions()
+        self.meta = _TableMeta(self)
+        self.calls = {}
+        self.lock = threading.RLock()
+
+        self._items = {}
+        self._order = []
+        self._index_data = {index_name: {} for index_name in self.indexes}
+        # Stream records (NEW_AND_OLD_IMAGES) of every write, once record_stream() is called
+        self.stream = None
+
+    # -- helpers ------------------------------------------------------------
+
+    def _count(self, operation):
+        with self.lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _primary_key(self, item):
+        if self.range_key:
+            return (item[self.hash_key], item[self.range_key])
+        return (item[self.hash_key],)
+
+    def _key_dict(self, primary_key):
+        key = {self.hash_key: primary_key[0]}
+        if self.range_key:
+            key[self.range_key] = primary_key[1]
+        return key
+
+    def _index_add(self, primary_key, item):
+        for index_name, (hash_key, range_key) in self.indexes.items():
+            if hash_key not in item or (range_key and range_key not in item):
+                continue
+            partition = self._index_data[index_name].setdefault(item[hash_key], [])
+            insort(partition, (item.get(range_key, ''), primary_key))
+
+    def _index_remove(self, primary_key, item):
+        for index_name, (hash_key, range_key) in self.indexes.items():
+            partition = self._index_data[index_name].get(item.get(hash_key))
+            if not partition:
+                continue
+            entry = (item.get(range_key, ''), primary_key)
+            position = bisect_left(partition, entry)
+            if position < len(partition) and partition[position] == entry:
+                del partition[position]
+
+    def __len__(self):
+        return len(self._items)
+
+    def record_stream(self):
+        """Start keeping DynamoDB Streams records of writes; returns the list they are appended to"""
+        self.stream = []
+        return self.stream
+
+    def _stream_write(self, event_name, primary_key, old, new):
+        if self.stream is None:
+            return
+        change = {'Keys': _serialize_item(self._key_dict(primary_key)),
+                  'SequenceNumber': f'{len(self.stream) + 1:021d}',
+                  'StreamViewType': 'NEW_AND_OLD_IMAGES'}
+        if old is not None:
+            change['OldImage'] = _serialize_item(old)
+        if new is not None:
+            change['NewImage'] = _serialize_item(new)
+        self.stream.append({'eventID': change['SequenceNumber'], 'eventName': event_name,
+                            'eventSource': 'aws:dynamodb', 'dynamodb': change})
+
+    # -- item operations ----------------------------------------------------
+
+    def put_item(self, Item, ConditionExpression=None, **kwargs):
+        self._count('put_item')
+        with self.lock:
+            return self._put(Item, ConditionExpression)
+
+    def _put(self, Item, ConditionExpression=None):
+        primary_key = self._primary_key(Item)
+        existing = self._items.get(primary_key)
+        if ConditionExpression is not None and not evaluate_condition(ConditionExpression, existing or {}):
+            raise ConditionalCheckFailedException('The conditional request failed')
+
+        if existing is not None:
+            self._index_remove(primary_key, existing)
+        else:
+            insort(self._order, primary_key)
+        self._items[primary_key] = copy.deepcopy(Item)
+        self._index_add(primary_key, self._items[primary_key])
+        self._stream_write('INSERT' if existing is None else 'MODIFY', primary_key, existing, Item)
+        return {}
+
+    def get_item(self, Key, **kwargs):
+        self._count('get_item')
+        with self.lock:
+            item = self._items.get(self._primary_key(Key))
+        if item is None:
+            return {}
+        return {'Item': copy.deepcopy(item)}
+
+    def delete_item(self, Key, ConditionExpression=None, **kwargs):
+        self._count('delete_item')
+        with self.lock:
+            return self._delete(Key, ConditionExpression)
+
+    def _delete(self, Key, ConditionExpression=None):
+        primary_key = self._primary_key(Key)
+        existing = self._items.get(primary_key)
+        if ConditionExpression is not None and not evaluate_condition(ConditionExpression, existing or {}):
+            raise ConditionalCheckFailedException('The conditional request failed')
+        if existing is None:
+            return {}
+
+        del self._items[primary_key]
+        del self._order[bisect_left(self._order, primary_key)]
+        self._index_remove(primary_key, existing)
+        self._stream_write('REMOVE', primary_key, existing, None)
+        return {}
+
+    def batch_writer(self, **kwargs):
+        return _BatchWriter(self)
+
+    def _batch_write(self, requests):
+        self._count('batch_write_item')
+        with self.lock:
+            for action, value in requests:
+                if action == 'put':
+                    self._put(value)
+                else:
+                    self._delete(value)
+
+    # -- reads --------------------------------------------------------------
+
+    def scan(self, FilterExpression=None, ExclusiveStartKey=None, Limit=None, **kwargs):
+        self._count('scan')
+        with self.lock:
+            return self._scan(FilterExpression, ExclusiveStartKey, Limit)
+
+    def _scan(self, FilterExpression, ExclusiveStartKey, Limit):
+        start = 0
+        if ExclusiveStartKey:
+            start = bisect_right(self._order, self._primary_key(ExclusiveStartKey))
+
+        page_keys = self._order[start:start + (Limit or self.page_size)]
+        items = [self._items[key] for key in page_keys]
+        matched = [copy.deepcopy(item) for item in items
+                   if FilterExpression is None or evaluate_condition(FilterExpression, item)]
+
+        response = {'Items': matched, 'Count': len(matched), 'ScannedCount': len(items)}
+        if start + len(page_keys) < len(self._order):
+            response['LastEvaluatedKey'] = self._key_dict(page_keys[-1])
+        return response
+
+    def query(self, KeyConditionExpression, IndexName=None, FilterExpression=None,
+              ExclusiveStartKey=None, Limit=None, ScanIndexForward=True, **kwargs):
+        self._count('query')
+        with self.lock:
+            return self._query(KeyConditionExpression, IndexName, FilterExpression,
+                               ExclusiveStartKey, Limit, ScanIndexForward)
+
+    def _query(self, KeyConditionExpression, IndexName, FilterExpression,
+               ExclusiveStartKey, Limit, ScanIndexForward):
+        if IndexName:
+            hash_key, range_key = self.indexes[IndexName]
+            partitions = self._index_data[IndexName]
+        else:
+            hash_key, range_key = self.hash_key, self.range_key
+            partitions = None
+
+        conditions = _key_conditions(KeyConditionExpression)
+        hash_value = conditions.pop(hash_key)[1][0]
+
+        if partitions is None:
+            entries = sorted((key[1] if range_key else '', key) for key in self._order if key[0] == hash_value)
+        else:
+            entries = partitions.get(hash_value, [])
+
+        low, high = 0, len(entries)
+        if range_key in conditions:
+            operator, values = conditions[range_key]
+            low, high = _range_bounds(entries, operator, values)
+
+        selected = entries[low:high]
+        if not ScanIndexForward:
+            selected = selected[::-1]
+
+        if ExclusiveStartKey:
+            marker = (ExclusiveStartKey.get(range_key, ''), self._primary_key(ExclusiveStartKey))
+            if ScanIndexForward:
+                selected = selected[bisect_right(selected, marker):]
+            else:
+                selected = [entry for entry in selected if entry < marker]
+
+        page = selected[:Limit or self.page_size]
+        items = [self._items[primary_key] for _, primary_key in page]
+        matched = [copy.deepcopy(item) for item in items
+                   if FilterExpression is None or evaluate_condition(FilterExpression, item)]
+
+        response = {'Items': matched, 'Count': len(matched), 'ScannedCount': len(items)}
+        if len(page) < len(selected):
+            last_key = self._key_dict(page[-1][1])
+            if range_key:
+                last_key[range_key] = page[-1][0]
+            if IndexName:
+                last_key[hash_key] = hash_value
+            response['LastEvaluatedKey'] = last_key
+        return response
+
+
+class FakeDynamoDB:
+    """Stand-in for boto3.resource('dynamodb') holding InMemoryTable instances"""
+
+    def __init__(self, *tables, batch_latency=0.0, unprocessed_rate=0.0, seed=0):
+        self.tables = {table.name: table for table in tables}
+        self.batch_latency = batch_latency
+        self.unprocessed_rate = unprocessed_rate
+        self.rng = random.Random(seed)
+        self.calls = {}
+
+    def add_table(self, table):
+        self.tables[table.name] = table
+        return table
+
+    def Table(self, name):
+        return self.tables[name]
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        self.calls['batch_get_item'] = self.calls.get('batch_get_item', 0) + 1
+        if sum(len(request['Keys']) for request in RequestItems.values()) > 100:
+            raise ValueError('Too many items requested for the BatchGetItem call')
+        if self.batch_latency:
+            time.sleep(self.batch_latency)
+
+        responses, unprocessed = {}, {}
+        for table_name, request in RequestItems.items():
+            table = self.tables[table_name]
+            for key in request['Keys']:
+                # Simulate throttling: some keys come back as UnprocessedKeys
+                if self.rng.random() < self.unprocessed_rate:
+                    unprocessed.setdefault(table_name, dict(request, Keys=[]))['Keys'].append(key)
+                    continue
+                item = table._items.get(table._primary_key(key))
+                if item is not None:
+                    responses.setdefault(table_name, []).append(copy.deepcopy(item))
+        return {'Responses': responses, 'UnprocessedKeys': unprocessed}
+
+
+class TransactionCanceledException(Exception):
+    def __init__(self, reasons):
+        super().__init__('Transaction cancelled, please refer cancellation reasons for specific reasons')
+        self.response = {'Error': {'Code': 'TransactionCanceledException'}, 'CancellationReasons': reasons}
+
+
+class IdempotentParameterMismatchException(Exception):
+    pass
+
+
+class _ClientExceptions:
+    ConditionalCheckFailedException = ConditionalCheckFailedException
+    IdempotentParameterMismatchException = IdempotentParameterMismatchException
+    TransactionCanceledException = TransactionCanceledException
+
+
+_EXISTS_CONDITION = re.compile(r'^\s*attribute_(not_)?exists\((#?\w+)\)\s*$')
+
+
+def _string_condition_holds(expression, names, existing):
+    """String ConditionExpressions; only attribute_exists/attribute_not_exists are supported"""
+    if expression is None:
+        return True
+    match = _EXISTS_CONDITION.match(expression)
+    if match is None:
+        raise NotImplementedError(f"Unsupported condition expression: {expression}")
+    name = names.get(match.group(2), match.group(2))
+    present = existing is not None and name in existing
+    return not present if match.group(1) else present
+
+
+class FakeDynamoDBClient:
+    """
+    Stand-in for boto3.client('dynamodb') over a FakeDynamoDB's tables, for
+    TransactWriteItems (Put/Delete/ConditionCheck) and GetItem. All conditions
+    are checked before anything is written, under every involved table's lock.
+    A reused ClientRequestToken with a different request is rejected, and an
+    identical one is a no-op if the first call succeeded.
+    """
+
+    exceptions = _ClientExceptions
+
+    def __init__(self, dynamodb, latency=0.0):
+        self.dynamodb = dynamodb
+        self.latency = latency
+        self.calls = {}
+        self.tokens = {}
+        self.lock = threading.Lock()
+
+    def transact_write_items(self, TransactItems, ClientRequestToken=None, **kwargs):
+        from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+        deserializer, serializer = TypeDeserializer(), TypeSerializer()
+        with self.lock:
+            self.calls['transact_write_items'] = self.calls.get('transact_write_items', 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+        if len(TransactItems) > 100:
+            raise ValueError('Member must have length less than or equal to 100')
+
+        actions = []
+        for action in TransactItems:
+            (kind, params), = action.items()
+            table = self.dynamodb.tables[params['TableName']]
+            item = {name: deserializer.deserialize(value) for name, value in (params.get('Item') or params['Key']).items()}
+            actions.append((kind, params, table, item))
+
+        tables = sorted({id(table): table for _, _, table, _ in actions}.values(), key=lambda table: table.name)
+        with ExitStack() as stack:
+            stack.enter_context(self.lock)
+            for table in tables:
+                stack.enter_context(table.lock)
+            if ClientRequestToken is not None and ClientRequestToken in self.tokens:
+                previous, succeeded = self.tokens[ClientRequestToken]
+                if previous != TransactItems:
+                    raise IdempotentParameterMismatchException(
+                        'The request uses the same client token as a previous, but non-identical request.')
+                if succeeded:
+                    return {}
+            if ClientRequestToken is not None:
+                # Cancelled transactions claim the token too
+                self.tokens[ClientRequestToken] = (copy.deepcopy(TransactItems), False)
+
+            reasons = []
+            for kind, params, table, item in actions:
+                existing = table._items.get(table._primary_key(item))
+                if _string_condition_holds(params.get('ConditionExpression'), params.get('ExpressionAttributeNames', {}), existing):
+                    reasons.append({'Code': 'None'})
+                    continue
+                reason = {'Code': 'ConditionalCheckFailed', 'Message': 'The conditional request failed'}
+                if existing is not None and params.get('ReturnValuesOnConditionCheckFailure') == 'ALL_OLD':
+                    reason['Item'] = {name: serializer.serialize(value) for name, value in existing.items()}
+                reasons.append(reason)
+            if any(reason['Code'] != 'None' for reason in reasons):
+                raise TransactionCanceledException(reasons)
+
+            for kind, params, table, item in actions:
+                if kind == 'Put':
+                    table._put(item)
+                elif kind == 'Delete':
+                    table._delete(item)
+                elif kind != 'ConditionCheck':
+                    raise NotImplementedError(f"Unsupported transaction action: {kind}")
+            if ClientRequestToken is not None:
+                self.tokens[ClientRequestToken] = (self.tokens[ClientRequestToken][0], True)
+        return {}
+
+    def get_item(self, TableName, Key, ConsistentRead=False, **kwargs):
+        from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+        deserializer, serializer = TypeDeserializer(), TypeSerializer()
+        with self.lock:
+            self.calls['get_item'] = self.calls.get('get_item', 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+        table = self.dynamodb.tables[TableName]
+        with table.lock:
+            item = table._items.get(table._primary_key({name: deserializer.deserialize(value) for name, value in Key.items()}))
+            if item is None:
+                return {}
+            return {'Item': {name: serializer.serialize(value) for name, value in item.items()}}
+
+
+class FakeSNS:
+    """Stand-in for boto3.client('sns'); records publishes, optional per-call latency"""
+
+    def __init__(self, latency=0.0, fail_when=None):
+        self.latency = latency
+        self.fail_when = fail_when
+        self.published = []
+        self.lock = threading.Lock()
+
+    def publish(self, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.fail_when is not None and self.fail_when(kwargs):
+            raise RuntimeError('Simulated SNS publish failure')
+        with self.lock:
+            self.published.append(kwargs)
+            return {'MessageId': f'm-{len(self.published)}'}
+
+
+class FakeSQS:
+    """Stand-in for boto3.client('sqs'); optional per-call latency and per-entry failure rate"""
+
+    def __init__(self, latency=0.0, entry_failure_rate=0.0, seed=0):
+        self.latency = latency
+        self.entry_failure_rate = entry_failure_rate
+        self.rng = random.Random(seed)
+        self.messages = []
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def _call(self, operation):
+        with self.lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        self._call('send_message')
+        with self.lock:
+            self.messages.append(MessageBody)
+            return {'MessageId': f'm-{len(self.messages)}'}
+
+    def send_message_batch(self, QueueUrl, Entries, **kwargs):
+        self._call('send_message_batch')
+        if len(Entries) > 10:
+            raise ValueError('Maximum number of entries per request are 10')
+        successful, failed = [], []
+        with self.lock:
+            for entry in Entries:
+                if self.rng.random() < self.entry_failure_rate:
+                    failed.append({'Id': entry['Id'], 'SenderFault': False, 'Code': 'InternalError', 'Message': 'Simulated failure'})
+                    continue
+                self.messages.append(entry['MessageBody'])
+                successful.append({'Id': entry['Id'], 'MessageId': f'm-{len(self.messages)}'})
+        return {'Successful': successful, 'Failed': failed}
+
+
+class _S3Exceptions:
+    class NoSuchKey(Exception):
+        pass
+
+    class NoSuchUpload(Exception):
+        pass
+
+
+class _Body:
+    """Streaming body: read() everything or read(amt) in chunks, like botocore's StreamingBody"""
+
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+
+    def read(self, amt=None):
+        end = len(self.data) if amt is None or amt < 0 else self.position + amt
+        chunk = self.data[self.position:end]
+        self.position += len(chunk)
+        return chunk
+
+
+class DirectoryObjects:
+    """
+    FakeS3 object store backed by a local directory (<root>/<bucket>/<key>), so
+    archives written by a benchmark can be inspected or read by another process.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        # Key index, so listing does not walk the directory on every request
+        self.keys = set()
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                relative = os.path.relpath(os.path.join(directory, name), self.root).split(os.sep)
+                self.keys.add((relative[0], '/'.join(relative[1:])))
+
+    def _path(self, bucket_key):
+        bucket, key = bucket_key
+        return os.path.join(self.root, bucket, *key.split('/'))
+
+    def __setitem__(self, bucket_key, data):
+        path = self._path(bucket_key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        self.keys.add(bucket_key)
+
+    def __getitem__(self, bucket_key):
+        try:
+            with open(self._path(bucket_key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            raise KeyError(bucket_key) from None
+
+    def __contains__(self, bucket_key):
+        return bucket_key in self.keys
+
+    def pop(self, bucket_key, default=None):
+        try:
+            data = self[bucket_key]
+        except KeyError:
+            return default
+        os.remove(self._path(bucket_key))
+        self.keys.discard(bucket_key)
+        return data
+
+    def __iter__(self):
+        return iter(list(self.keys))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def items(self):
+        return [(bucket_key, self[bucket_key]) for bucket_key in self]
+
+
+class FakeS3:
+    """
+    Stand-in for boto3.client('s3'): objects and multipart uploads kept in a dict,
+    or in a local directory with objects=DirectoryObjects(path)
+    """
+
+    exceptions = _S3Exceptions
+
+    def __init__(self, latency=0.0, objects=None):
+        self.latency = latency
+        self.objects = {} if objects is None else objects
+        self.uploads = {}
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def _count(self, operation):
+        with self.lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self._count('put_object')
+        self.objects[(Bucket, Key)] = Body.encode('utf-8') if isinstance(Body, str) else bytes(Body)
+        return {'ETag': f'"{self.calls["put_object"]}"'}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self._count('get_object')
+        if (Bucket, Key) not in self.objects:
+            raise self.exceptions.NoSuchKey(Key)
+        return {'Body': _Body(self.objects[(Bucket, Key)])}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self._count('delete_object')
+        self.objects.pop((Bucket, Key), None)
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix='', ContinuationToken=None, **kwargs):
+        self._count('list_objects_v2')
+        keys = sorted(key for bucket, key in self.objects if bucket == Bucket and key.startswith(Prefix))
+        return {'Contents': [{'Key': key, 'Size': len(self.objects[(Bucket, key)])} for key in keys], 'IsTruncated': False}
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self._count('create_multipart_upload')
+        upload_id = f'upload-{len(self.uploads) + 1}'
+        self.uploads[upload_id] = {'Bucket': Bucket, 'Key': Key, 'Parts': {}}
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        self._count('upload_part')
+        if UploadId not in self.uploads:
+            raise self.exceptions.NoSuchUpload(UploadId)
+        self.uploads[UploadId]['Parts'][PartNumber] = bytes(Body)
+        return {'ETag': f'"{UploadId}-{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        self._count('complete_multipart_upload')
+        upload = self.uploads.pop(UploadId, None)
+        if upload is None:
+            raise self.exceptions.NoSuchUpload(UploadId)
+        parts = upload['Parts']
+        self.objects[(Bucket, Key)] = b''.join(parts[part['PartNumber']] for part in MultipartUpload['Parts'])
+        return {'Bucket': Bucket, 'Key': Key}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        self._count('abort_multipart_upload')
+        self.uploads.pop(UploadId, None)
+        return {}
+
+
+class FakeContext:
+    """Lambda context whose remaining time drops by `cost_ms` on every call"""
+
+    def __init__(self, remaining_ms=900000, cost_ms=0):
+        self.remaining_ms = remaining_ms
+        self.cost_ms = cost_ms
+
+    def get_remaining_time_in_millis(self):
+        self.remaining_ms -= self.cost_ms
+        return self.remaining_ms
+
+
+class ExecutionAlreadyExists(Exception):
+    def __init__(self, name):
+        super().__init__(f"Execution already exists: {name}")
+        self.response = {'Error': {'Code': 'ExecutionAlreadyExists'}}
+
+
+class ExecutionDoesNotExist(Exception):
+    def __init__(self, arn):
+        super().__init__(f"Execution Does Not Exist: '{arn}'")
+        self.response = {'Error': {'Code': 'ExecutionDoesNotExist'}}
+
+
+class _StepFunctionsExceptions:
+    ExecutionAlreadyExists = ExecutionAlreadyExists
+    ExecutionDoesNotExist = ExecutionDoesNotExist
+
+
+class FakeStepFunctions:
+    """
+    Stand-in for boto3.client('stepfunctions'); records started executions.
+    Like a standard workflow, a named execution started again with the same
+    input returns the existing one while it is running; once it has closed
+    (after execution_seconds), or with different input, the start is rejected.
+    """
+
+    exceptions = _StepFunctionsExceptions
+
+    def __init__(self, latency=0.0, execution_seconds=60.0):
+        self.latency = latency
+        self.execution_seconds = execution_seconds
+        self.executions = []
+        self.by_name = {}
+        self.by_arn = {}
+        self.lock = threading.Lock()
+
+    def _status(self, execution):
+        return 'RUNNING' if time.time() < execution['startDate'] + self.execution_seconds else 'SUCCEEDED'
+
+    def start_execution(self, stateMachineArn, input, name=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            if name is not None and name in self.by_name:
+                existing = self.by_name[name]
+                if existing['input'] != input or self._status(existing) != 'RUNNING':
+                    raise ExecutionAlreadyExists(name)
+                return {'executionArn': existing['executionArn'], 'startDate': existing['startDate']}
+            execution_arn = f"{stateMachineArn.replace(':stateMachine:', ':execution:')}:{name or len(self.executions) + 1}"
+            execution = {'stateMachineArn': stateMachineArn, 'input': input, 'name': name,
+                         'executionArn': execution_arn, 'startDate': time.time()}
+            self.executions.append(execution)
+            self.by_arn[execution_arn] = execution
+            if name is not None:
+                self.by_name[name] = execution
+            return {'executionArn': execution['executionArn'], 'startDate': execution['startDate']}
+
+    def describe_execution(self, executionArn, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            execution = self.by_arn.get(executionArn)
+            if execution is None:
+                raise ExecutionDoesNotExist(executionArn)
+            return dict(execution, status=self._status(execution))
+
+
+def appointments_table(page_size=1000, latency=0.0):
+    """Appointments table with the same key schema and indexes as production"""
+    return InMemoryTable(
+        'Appointments', 'AppointmentID', 'DoctorID',
+        indexes={'DoctorDateIndex': ('DoctorID', 'AppointmentDate'), 'PatientDateIndex': ('PatientID', 'AppointmentDate')},
+        page_size=page_size,
+        latency=latency
+    )
+
+
+class _FakePipeline:
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self.commands = []
+
+    def __getattr__(self, name):
+        method = getattr(self.redis, name)
+
+        def queue(*args, **kwargs):
+            self.commands.append((method, args, kwargs))
+            return self
+        return queue
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self):
+        self.redis._count('pipeline')
+        self.redis._round_trip()
+        with self.redis.lock:
+            results = [method(*args, _pipelined=True, **kwargs) for method, args, kwargs in self.commands]
+        self.commands = []
+        return results
+
+
+class FakeRedis:
+    """
+    Thread-safe in-memory stand-in for redis.Redis. Like the production client
+    (decode_responses=False) GET/MGET return bytes unless decode_responses=True.
+    """
+
+    def __init__(self, clock=None, latency=0.0, decode_responses=False):
+        self.clock = clock or time.monotonic
+        self.latency = latency
+        self.decode_responses = decode_responses
+        self.lock = threading.RLock()
+        self.data = {}
+        self.expires = {}
+        self.calls = {}
+
+    def _count(self, command, pipelined=False):
+        # Pipelined commands share one round trip, counted by execute()
+        if not pipelined:
+            with self.lock:
+                self.calls[command] = self.calls.get(command, 0) + 1
+            if command != 'pipeline':
+                self._round_trip()
+
+    def _round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _live(self, key):
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= self.clock():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def ping(self, _pipelined=False):
+        self._count('ping', _pipelined)
+        return True
+
+    def _reply(self, value):
+        if value is None or self.decode_responses:
+            return value
+        return value.encode('utf-8') if isinstance(value, str) else value
+
+    def get(self, name, _pipelined=False):
+        self._count('get', _pipelined)
+        with self.lock:
+            return self._reply(self.data[name] if self._live(name) else None)
+
+    def mget(self, keys, *args, _pipelined=False):
+        self._count('mget', _pipelined)
+        keys = list(keys) + list(args) if not isinstance(keys, str) else [keys] + list(args)
+        with self.lock:
+            return [self._reply(self.data[key] if self._live(key) else None) for key in keys]
+
+    def set(self, name, value, ex=None, px=None, nx=False, xx=False, _pipelined=False):
+        self._count('set', _pipelined)
+        with self.lock:
+            exists = self._live(name)
+            if (nx and exists) or (xx and not exists):
+                return None
+            self.data[name] = value if isinstance(value, (bytes, str)) else str(value)
+            self.expires.pop(name, None)
+            if ex is not None:
+                self.expires[name] = self.clock() + ex
+            elif px is not None:
+                self.expires[name] = self.clock() + px / 1000.0
+            return True
+
+    def setex(self, name, time, value, _pipelined=False):
+        self._count('setex', _pipelined)
+        with self.lock:
+            self.data[name] = value if isinstance(value, (bytes, str)) else str(value)
+            self.expires[name] = self.clock() + time
+            return True
+
+    def incr(self, name, amount=1, _pipelined=False):
+        self._count('incr', _pipelined)
+        with self.lock:
+            value = int(self.data[name]) + amount if self._live(name) else amount
+            self.data[name] = str(value)
+            return value
+
+    def expire(self, name, time, _pipelined=False):
+        self._count('expire', _pipelined)
+        with self.lock:
+            if not self._live(name):
+                return False
+            self.expires[name] = self.clock() + time
+            return True
+
+    def pttl(self, name, _pipelined=False):
+        """Milliseconds left: -2 if the key does not exist, -1 if it has no expiry"""
+        self._count('pttl', _pipelined)
+        with self.lock:
+            if not self._live(name):
+                return -2
+            deadline = self.expires.get(name)
+            return -1 if deadline is None else int((deadline - self.clock()) * 1000)
+
+    def exists(self, *names, _pipelined=False):
+        self._count('exists', _pipelined)
+        with self.lock:
+            return sum(1 for name in names if self._live(name))
+
+    def delete(self, *names, _pipelined=False):
+        self._count('delete', _pipelined)
+        with self.lock:
+            removed = 0
+            for name in names:
+                if self._live(name):
+                    del self.data[name]
+                    self.expires.pop(name, None)
+                    removed += 1
+            return removed
+
+    def setbit(self, name, offset, value, _pipelined=False):
+        """Bits are numbered from the most significant bit of the first byte, as in Redis"""
+        self._count('setbit', _pipelined)
+        with self.lock:
+            bits = bytearray(self.data[name] if self._live(name) else b'')
+            byte, bit = divmod(offset, 8)
+            if len(bits) <= byte:
+                bits.extend(b'\0' * (byte + 1 - len(bits)))
+            previous = bits[byte] >> (7 - bit) & 1
+            if value:
+                bits[byte] |= 1 << (7 - bit)
+            else:
+                bits[byte] &= ~(1 << (7 - bit)) & 0xff
+            self.data[name] = bytes(bits)
+            return previous
+
+    def bitfield_ro(self, key, encoding, offset, items=None, _pipelined=False):
+        """Unsigned GETs only (u1 .. u63)"""
+        self._count('bitfield_ro', _pipelined)
+        with self.lock:
+            bits = self.data[key] if self._live(key) else b''
+        value = int.from_bytes(bits, 'big') if bits else 0
+        total = len(bits) * 8
+        results = []
+        for field_encoding, field_offset in [(encoding, offset)] + list(items or []):
+            width = int(field_encoding[1:])
+            # Bits beyond the end of the string read as zero
+            shift = total - field_offset - width
+            field = value >> shift if shift >= 0 else value << -shift
+            results.append(field & ((1 << width) - 1))
+        return results
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
@@ -0,0 +1,89 @@
+"""
+Replay recorded DynamoDB Streams records of the Appointments table through
+ArchiveStreamProcessor, in batches the way the Lambda event source mapping
+delivers them: a batch that reports a failed record is retried from that
+record. Input is JSON lines (one stream record per line) or a JSON file holding
+an event ({"Records": [...]}) or a list of records. The ledger is an in-memory
+table unless --aws is given.
+
+    python -m benchmarks.replay_stream events.jsonl [--batch-size 100] [--aws]
+"""
+import argparse
+import json
+
+import AwsClients
+import ArchiveStreamProcessor
+from ArchiveLedger import ARCHIVE_LEDGER_TABLE, PENDING_DATES
+from benchmarks.fakes import FakeDynamoDB, InMemoryTable
+
+
+def load_records(path):
+    with open(path) as source:
+        text = source.read()
+    if text.lstrip().startswith(('{"Records"', '[')):
+        loaded = json.loads(text)
+        return loaded['Records'] if isinstance(loaded, dict) else loaded
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def save_records(path, records):
+    with open(path, 'w') as target:
+        for record in records:
+            target.write(json.dumps(record) + '\n')
+
+
+def replay(records, batch_size=100, max_attempts=3, handler=ArchiveStreamProcessor.lambda_handler):
+    """
+    Feed records to the handler in order. A record still failing after
+    max_attempts is skipped (as with MaximumRetryAttempts). Returns counts.
+    """
+    stats = {'records': len(records), 'batches': 0, 'retries': 0, 'skipped': 0}
+    position, attempts = 0, 0
+    while position < len(records):
+        batch = records[position:position + batch_size]
+        stats['batches'] += 1
+        failures = handler({'Records': batch}, None)['batchItemFailures']
+        if not failures:
+            position += len(batch)
+            attempts = 0
+            continue
+        sequence_numbers = [record['dynamodb']['SequenceNumber'] for record in batch]
+        failed = position + min(sequence_numbers.index(failure['itemIdentifier']) for failure in failures)
+        attempts = attempts + 1 if failed == position else 1
+        if attempts >= max_attempts:
+            stats['skipped'] += 1
+            failed += 1
+            attempts = 0
+        else:
+            stats['retries'] += 1
+        position = failed
+    return stats
+
+
+def ledger_table():
+    """In-memory ledger with the production key schema, installed in AwsClients"""
+    table = InMemoryTable(ARCHIVE_LEDGER_TABLE, 'LedgerDate', 'EntryID')
+    AwsClients.override('dynamodb', FakeDynamoDB(table), kind='resource')
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('path')
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--max-attempts', type=int, default=3)
+    parser.add_argument('--aws', action='store_true', help='write to the ArchiveLedger table in AWS')
+    args = parser.parse_args()
+
+    records = load_records(args.path)
+    table = None if args.aws else ledger_table()
+    stats = replay(records, args.batch_size, args.max_attempts)
+    print(f"{stats['records']} records in {stats['batches']} batches: "
+          f"{stats['retries']} retried, {stats['skipped']} skipped")
+    if table is not None:
+        dates = sum(1 for key in table._items if key[0] == PENDING_DATES)
+        print(f"ledger: {len(table) - dates} entries over {dates} pending dates")
+
+
+if __name__ == '__main__':
+    main()
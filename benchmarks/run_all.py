@@ -0,0 +1,245 @@
+"""
+Per-handler latency and throughput report against a synthetic dataset and
+in-memory fakes with injected per-call latency. Save a run with --json and
+pass it back as --baseline to flag regressions (exit status 1).
+
+    python -m benchmarks.run_all --doctors 50 --patients 2000 --days 7 --latency-ms 2
+    python -m benchmarks.run_all --json baseline.json
+    python -m benchmarks.run_all --baseline baseline.json --tolerance 0.25
+"""
+import argparse
+import contextlib
+import io
+import json
+import random
+import sys
+import time
+
+import AmazonSQSNotification
+import AppointmentReminder
+import ArchiveAppointments
+import ArchiveQuery
+import BookAppointmentLambda
+import BulkAvailability
+import CheckDoctorAvailability
+import ConfirmBooking
+import FindFreeSlots
+import NotifyPatientAndDoctor
+import PatientHistory
+import VerifyPatient
+import WarmCache
+from benchmarks.datagen import SLOTS, generate, install
+from benchmarks.fakes import FakeContext
+from benchmarks.stats import percentile, time_calls
+
+
+def _pick(rng, dataset, unknown_share=0.05):
+    patient = rng.choice(dataset.patients)
+    patient_id = f'UNKNOWN{rng.randrange(50)}' if rng.random() < unknown_share else patient['PatientID']
+    doctor = rng.choice(dataset.doctors)
+    start_time, end_time = rng.choice(SLOTS)
+    return patient, patient_id, doctor, rng.choice(dataset.dates()), start_time, end_time
+
+
+def verify_patient_events(rng, dataset, count):
+    return [{'PatientID': _pick(rng, dataset)[1]} for _ in range(count)]
+
+
+def availability_events(rng, dataset, count):
+    events = []
+    for _ in range(count):
+        _, patient_id, doctor, date, start_time, end_time = _pick(rng, dataset)
+        events.append({'PatientID': patient_id, 'DoctorID': doctor['DoctorID'], 'AppointmentDate': date,
+                       'StartTime': start_time, 'EndTime': end_time})
+    return events
+
+
+def confirm_events(rng, dataset, count):
+    return [dict(event, AppointmentID=f'BENCH{n:07d}')
+            for n, event in enumerate(availability_events(rng, dataset, count))]
+
+
+def notify_events(rng, dataset, count):
+    events = []
+    for event in availability_events(rng, dataset, count):
+        patient = rng.choice(dataset.patients)
+        doctor = next(d for d in dataset.doctors if d['DoctorID'] == event['DoctorID'])
+        events.append(dict(event, verifyResult={'patientDetails': patient},
+                           availabilityResult={'doctorDetails': doctor}))
+    return events
+
+
+def bulk_availability_events(rng, dataset, count):
+    """count front-desk searches over 20 doctors"""
+    events = []
+    for _ in range(count):
+        start_time, end_time = rng.choice(SLOTS)
+        events.append({'DoctorIDs': [doctor['DoctorID'] for doctor in rng.sample(dataset.doctors, min(20, len(dataset.doctors)))],
+                       'Dates': [rng.choice(dataset.dates())], 'StartTime': start_time, 'EndTime': end_time})
+    return events
+
+
+def free_slot_events(rng, dataset, count):
+    dates = dataset.dates()
+    return [{'DoctorID': rng.choice(dataset.doctors)['DoctorID'], 'FromDate': dates[0], 'ToDate': dates[-1],
+             'DurationMinutes': rng.choice((15, 30, 60)), 'Count': 5} for _ in range(count)]
+
+
+def patient_history_events(rng, dataset, count):
+    return [{'PatientID': rng.choice(dataset.patients)['PatientID'], 'Limit': 20} for _ in range(count)]
+
+
+def archive_query_events(rng, dataset, count):
+    """Lookups by patient or doctor and month of the appointments ArchiveAppointments moved"""
+    archived = [appt for appt in dataset.appointments if appt['AppointmentDate'] < dataset.dates()[1]]
+    events = []
+    for _ in range(count):
+        appointment = rng.choice(archived)
+        if rng.random() < 0.5:
+            events.append({'PatientID': appointment['PatientID']})
+        else:
+            events.append({'DoctorID': appointment['DoctorID'], 'FromDate': appointment['AppointmentDate'][:8] + '01',
+                           'ToDate': appointment['AppointmentDate']})
+    return events
+
+
+def booking_events(mode):
+    def build(rng, dataset, count):
+        return [{'stageVariables': {'bookingMode': mode}, 'body': json.dumps(event)}
+                for event in availability_events(rng, dataset, count)]
+    return build
+
+
+def sqs_batches(rng, dataset, count):
+    """count SQS batches of 10 queued notifications"""
+    batches = []
+    for n in range(count):
+        records = []
+        for m, event in enumerate(availability_events(rng, dataset, 10)):
+            body = dict(event, PatientName='Pat Kelly', DoctorName='Dr. Byrne',
+                        MessageType=rng.choice(('Notification', 'Reminder')),
+                        RecipientType=rng.choice(('patient', 'doctor')))
+            records.append({'messageId': f'{n}-{m}', 'body': json.dumps(body)})
+        batches.append({'Records': records})
+    return batches
+
+
+# (name, handler, event builder, items processed per call)
+REQUEST_HANDLERS = (
+    ('VerifyPatient', VerifyPatient.lambda_handler, verify_patient_events, 1),
+    ('CheckDoctorAvailability', CheckDoctorAvailability.lambda_handler, availability_events, 1),
+    ('ConfirmBooking', ConfirmBooking.lambda_handler, confirm_events, 1),
+    ('NotifyPatientAndDoctor', NotifyPatientAndDoctor.lambda_handler, notify_events, 1),
+    ('BulkAvailability (x20)', BulkAvailability.lambda_handler, bulk_availability_events, 20),
+    ('FindFreeSlots', FindFreeSlots.lambda_handler, free_slot_events, 1),
+    ('PatientHistory', PatientHistory.lambda_handler, patient_history_events, 1),
+    ('BookAppointmentLambda (async)', BookAppointmentLambda.lambda_handler, booking_events('async'), 1),
+    ('BookAppointmentLambda (fused)', BookAppointmentLambda.lambda_handler, booking_events('fused'), 1),
+    ('AmazonSQSNotification (x10)', AmazonSQSNotification.lambda_handler, sqs_batches, 10),
+)
+
+
+def run_request_handler(handler, build_events, per_call, rng, dataset, requests):
+    events = build_events(rng, dataset, requests)
+    with contextlib.redirect_stdout(io.StringIO()):
+        samples = time_calls(lambda event: handler(event, None), [(event,) for event in events])
+    return {
+        'calls': len(samples),
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+        'throughput': round(len(samples) * per_call / (sum(samples) / 1000), 1)
+    }
+
+
+def run_batch_job(invoke, count_items):
+    """One invocation of a scheduled job; throughput is items processed per second"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        invoke()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+    items = count_items()
+    return {'calls': 1, 'p50_ms': round(elapsed_ms, 3), 'p99_ms': round(elapsed_ms, 3),
+            'throughput': round(items / (elapsed_ms / 1000), 1), 'items': items}
+
+
+def run(args):
+    dataset = generate(args.doctors, args.patients, args.days, args.per_doctor_day, seed=args.seed)
+    print(f"dataset: {dataset}; injected latency {args.latency_ms}ms per call")
+    fakes = install(dataset, latency=args.latency_ms / 1000.0)
+    rng = random.Random(args.seed)
+
+    results = {}
+    for name, handler, build_events, per_call in REQUEST_HANDLERS:
+        results[name] = run_request_handler(handler, build_events, per_call, rng, dataset, args.requests)
+
+    warmed = {}
+    results['WarmCache'] = run_batch_job(
+        lambda: warmed.update(json.loads(WarmCache.lambda_handler({}, None)['body'])),
+        lambda: warmed.get('keys', 0)
+    )
+    published = len(fakes.sns.published)
+    results['AppointmentReminder'] = run_batch_job(
+        lambda: AppointmentReminder.lambda_handler({}, None),
+        lambda: len(fakes.sns.published) - published
+    )
+    # Runs last: it deletes the archived rows
+    remaining = len(fakes.appointments)
+    results['ArchiveAppointments'] = run_batch_job(
+        lambda: ArchiveAppointments.lambda_handler({}, FakeContext()),
+        lambda: remaining - len(fakes.appointments)
+    )
+    results['ArchiveQuery'] = run_request_handler(
+        ArchiveQuery.lambda_handler, archive_query_events, 1, rng, dataset, args.requests)
+    return results
+
+
+def report(results, baseline=None, tolerance=0.2):
+    """Print the table; returns the names of handlers that regressed against the baseline"""
+    regressions = []
+    print(f"{'handler':<32}{'calls':>7}{'p50 ms':>11}{'p99 ms':>11}{'items/s':>12}")
+    for name, result in results.items():
+        flag = ''
+        previous = (baseline or {}).get(name)
+        if previous:
+            slower = result['p50_ms'] > previous['p50_ms'] * (1 + tolerance)
+            fewer = result['throughput'] < previous['throughput'] * (1 - tolerance)
+            if slower or fewer:
+                regressions.append(name)
+                flag = f"  REGRESSION (baseline p50 {previous['p50_ms']}ms, {previous['throughput']}/s)"
+        print(f"{name:<32}{result['calls']:>7}{result['p50_ms']:>11.3f}{result['p99_ms']:>11.3f}"
+              f"{result['throughput']:>12.1f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--doctors', type=int, default=50)
+    parser.add_argument('--patients', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--per-doctor-day', type=int, default=10)
+    parser.add_argument('--requests', type=int, default=300, help='calls per request/response handler')
+    parser.add_argument('--latency-ms', type=float, default=1.0, help='injected latency per AWS/Redis call')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='results file from an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown before flagging')
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = report(results, baseline, args.tolerance)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if regressions:
+        print(f"{len(regressions)} handler(s) regressed: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,24 @@
+"""Small timing helpers shared by the benchmark scripts"""
+import time
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def time_calls(fn, args_list):
+    """Call fn(*args) for each args tuple, returning per-call latencies in milliseconds"""
+    samples = []
+    for args in args_list:
+        started = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def summary(samples):
+    return f"p50={percentile(samples, 50):8.3f}ms  p99={percentile(samples, 99):8.3f}ms"
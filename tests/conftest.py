@@ -0,0 +1,9 @@
+"""
+Shared setup for the tests: the handlers run against the in-memory fakes from
+benchmarks/, so boto3 only needs a region to build its (unused) clients.
+
+    python -m pytest tests
+"""
+import os
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
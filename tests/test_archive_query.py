@@ -0,0 +1,85 @@
+"""ArchiveQuery over partitioned archives returns what a read of every archive object returns"""
+import json
+import random
+
+import pytest
+
+import AwsClients
+import ArchiveAppointments
+import ArchiveQuery
+from benchmarks.bench_archive_query import build, filters_of, lookups, read_everything
+from benchmarks.fakes import FakeS3
+
+
+@pytest.fixture(scope='module')
+def archive():
+    """A year archived month by month in both layouts; returns (old_s3, new_s3, records)"""
+    old_s3, new_s3 = FakeS3(), FakeS3()
+    flush_size = ArchiveAppointments.FLUSH_SIZE
+    try:
+        records = build(old_s3, new_s3, 3000)
+    finally:
+        # build() raises the flush size for the benchmark; later tests get the default
+        ArchiveAppointments.FLUSH_SIZE = flush_size
+    # An archive written by the original job: a plain JSON array, not gzip NDJSON
+    original = [dict(record, AppointmentID=f'J{n:07d}') for n, record in enumerate(records[:20])]
+    for s3 in (old_s3, new_s3):
+        s3.put_object(Bucket=ArchiveAppointments.ARCHIVE_BUCKET, Key='archives/appointments-2022-06-30-00-00-00.json',
+                      Body=json.dumps(original))
+    return old_s3, new_s3, records + original
+
+
+@pytest.fixture(autouse=True)
+def archive_s3(archive, monkeypatch):
+    AwsClients.override('s3', archive[1])
+    monkeypatch.setattr(ArchiveQuery, '_manifests', {})
+    monkeypatch.setattr(ArchiveQuery, 'MAX_LIMIT', 10 ** 6)
+
+
+def query(event):
+    result = ArchiveQuery.lambda_handler(dict(event, Limit=10 ** 6), None)
+    assert result['statusCode'] == 200
+    return json.loads(result['body'])
+
+
+def test_lookups_match_a_full_read(archive):
+    old_s3, _, records = archive
+    for event in lookups(random.Random(5), records, 60):
+        expected = read_everything(old_s3, filters_of(event))
+        body = query(event)
+        assert expected
+        assert sorted(r['AppointmentID'] for r in body['Appointments']) == sorted(r['AppointmentID'] for r in expected)
+        assert body['Truncated'] is False
+
+
+def test_old_format_file_is_still_searched(archive):
+    legacy = next(record for record in archive[2] if record['AppointmentID'].startswith('L'))
+    assert [r['AppointmentID'] for r in query({'AppointmentID': legacy['AppointmentID']})['Appointments']] == [
+        legacy['AppointmentID']]
+
+
+def test_original_json_archive_is_still_searched(archive):
+    record = next(record for record in archive[2] if record['AppointmentID'].startswith('J'))
+    assert [r['AppointmentID'] for r in query({'AppointmentID': record['AppointmentID']})['Appointments']] == [
+        record['AppointmentID']]
+    assert record['AppointmentID'] in {r['AppointmentID'] for r in query({'DoctorID': record['DoctorID']})['Appointments']}
+
+
+def test_lookups_skip_files_without_matches(archive):
+    record = archive[2][0]
+    body = query({'DoctorID': record['DoctorID'], 'FromDate': record['AppointmentDate'], 'ToDate': record['AppointmentDate']})
+    assert body['FilesSelected'] < body['FilesTotal']
+
+
+def test_limit_truncates():
+    record_count = len(query({'DoctorID': 'D000'})['Appointments'])
+    result = ArchiveQuery.lambda_handler({'DoctorID': 'D000', 'Limit': 2}, None)
+    body = json.loads(result['body'])
+    assert record_count > 2
+    assert len(body['Appointments']) == 2 and body['Truncated'] is True
+
+
+@pytest.mark.parametrize('event', [{}, {'FromDate': '2023-01-01'}, {'DoctorID': 'D000', 'FromDate': '01/01/2023'},
+                                   {'DoctorID': 'D000', 'Limit': 0}])
+def test_invalid_requests(event):
+    assert ArchiveQuery.lambda_handler(event, None)['statusCode'] == 400
@@ -0,0 +1,52 @@
+"""DaySchedule overlap checks: half-open intervals compared as minutes"""
+import pytest
+
+from DoctorSchedule import DaySchedule, to_minutes
+
+
+def appointment(start_time, end_time):
+    return {'StartTime': start_time, 'EndTime': end_time}
+
+
+def test_to_minutes_ignores_seconds():
+    assert to_minutes('09:05') == to_minutes('09:05:59') == 545
+
+
+@pytest.mark.parametrize('start_time, end_time, conflict', [
+    ('09:30', '10:00', False),   # ends as the booking starts
+    ('10:30', '11:00', False),   # starts as the booking ends
+    ('09:45', '10:15', True),
+    ('10:10', '10:20', True),    # inside
+    ('09:00', '11:00', True),    # around
+])
+def test_back_to_back_slots_do_not_conflict(start_time, end_time, conflict):
+    schedule = DaySchedule.from_appointments([appointment('10:00', '10:30')])
+    assert schedule.conflicts(to_minutes(start_time), to_minutes(end_time)) is conflict
+
+
+def test_times_are_compared_as_minutes_not_strings():
+    # As strings '9:30' > '10:00'; as minutes it is earlier
+    schedule = DaySchedule.from_appointments([appointment('9:00', '9:30')])
+    assert not schedule.conflicts(to_minutes('10:00'), to_minutes('10:30'))
+    assert schedule.conflicts(to_minutes('09:15'), to_minutes('09:45'))
+
+
+def test_a_long_interval_covers_later_short_ones():
+    # 09:00-12:00 overlaps the intervals stored after it, so the latest end
+    # before a start is not the end of the interval just before it
+    schedule = DaySchedule.from_appointments([
+        appointment('09:00', '12:00'), appointment('09:30', '09:45'), appointment('10:00', '10:15')])
+    assert schedule.max_ends == [to_minutes('12:00')] * 3
+    assert schedule.conflicts(to_minutes('11:00'), to_minutes('11:30'))
+    assert not schedule.conflicts(to_minutes('12:00'), to_minutes('12:30'))
+
+
+def test_free_slots_keeps_input_order():
+    schedule = DaySchedule.from_appointments([appointment('10:00', '10:30')])
+    candidates = [(600, 630), (570, 600), (630, 660), (615, 645)]
+    assert schedule.free_slots(candidates) == [(570, 600), (630, 660)]
+
+
+def test_empty_schedule_has_no_conflicts():
+    assert len(DaySchedule()) == 0
+    assert not DaySchedule().conflicts(0, 24 * 60)
@@ -0,0 +1,51 @@
+"""Keyed submissions are replayed for IDEMPOTENCY_TTL; keyless ones only within the double-click window"""
+import json
+
+import pytest
+
+import BookAppointmentLambda
+import Idempotency
+from benchmarks.datagen import generate, install
+
+
+@pytest.fixture
+def fakes():
+    dataset = generate(doctors=2, patients=4, days=2, per_doctor_day=0, past_days=0)
+    fakes = install(dataset)
+    fakes.dataset, fakes.now = dataset, 0.0
+    fakes.redis.clock = lambda: fakes.now
+    return fakes
+
+
+def booking(fakes, key=None):
+    dataset = fakes.dataset
+    body = {'PatientID': dataset.patients[0]['PatientID'], 'DoctorID': dataset.doctors[0]['DoctorID'],
+            'AppointmentDate': dataset.dates()[1], 'StartTime': '09:00', 'EndTime': '09:30'}
+    event = {'body': json.dumps(body), 'stageVariables': {'bookingMode': 'async'}}
+    if key is not None:
+        event['headers'] = {'Idempotency-Key': key}
+    return event
+
+
+def submit(fakes, event, after):
+    fakes.now += after
+    BookAppointmentLambda.lambda_handler(event, None)
+    return len(fakes.stepfunctions.executions)
+
+
+def test_keyless_double_click_is_deduplicated(fakes):
+    event = booking(fakes)
+    assert submit(fakes, event, 0) == 1
+    assert submit(fakes, event, 1) == 1
+
+
+def test_keyless_resubmission_after_the_window_runs_again(fakes):
+    event = booking(fakes)
+    assert submit(fakes, event, 0) == 1
+    assert submit(fakes, event, Idempotency.FINGERPRINT_TTL + 1) == 2
+
+
+def test_keyed_retry_is_replayed_for_the_full_ttl(fakes):
+    event = booking(fakes, key='client-1')
+    assert submit(fakes, event, 0) == 1
+    assert submit(fakes, event, Idempotency.IDEMPOTENCY_TTL - 1) == 1
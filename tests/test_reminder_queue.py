@@ -0,0 +1,100 @@
+"""Queue mode: every due reminder is published exactly once, across failures and catch-up runs"""
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+import AppointmentReminder
+import ReminderQueue
+from benchmarks.datagen import generate, install
+
+HOURS = 72
+
+
+@pytest.fixture
+def fakes(monkeypatch):
+    monkeypatch.setattr(ReminderQueue, 'LEAD_HOURS', (24, 2))
+    monkeypatch.setattr(AppointmentReminder, 'QUEUE_MODE', True)
+    fakes = install(generate(doctors=6, patients=60, days=3, per_doctor_day=5, past_days=0))
+    # A third of the doctors take the evening digest
+    for doctor in list(fakes.doctors._items.values())[::3]:
+        doctor['ReminderMode'] = 'digest'
+    fakes.filed = {entry['ReminderID']: entry for entry in fakes.reminder_due._items.values()}
+    return fakes
+
+
+def run_hourly(hours=HOURS):
+    start = datetime.now().replace(minute=0, second=0, microsecond=0)
+    for hour in range(hours + 1):
+        AppointmentReminder.lambda_handler({'Now': (start + timedelta(hours=hour)).isoformat()}, None)
+
+
+def publishes(fakes, recipient_type):
+    return Counter((message['MessageAttributes']['email']['StringValue'], message['Subject'], message['Message'])
+                   for message in fakes.sns.published
+                   if message['MessageAttributes']['recipient_type']['StringValue'] == recipient_type)
+
+
+def patient_entries(fakes):
+    return [entry for entry in fakes.filed.values() if entry['Kind'] == ReminderQueue.APPOINTMENT_ENTRY]
+
+
+def test_each_reminder_is_sent_once(fakes):
+    run_hourly()
+
+    patient = publishes(fakes, 'patient')
+    assert max(patient.values()) == 1
+    assert sum(patient.values()) == len(patient_entries(fakes))
+    assert max(publishes(fakes, 'doctor').values()) == 1
+    assert len(fakes.reminder_due) == 0
+
+
+def fail_first_attempt(fakes, count, recipient_types=('patient', 'doctor')):
+    """Make the first attempt of `count` publishes fail; returns the set they are recorded in"""
+    failed = set()
+
+    def fail(message):
+        key = (message['MessageAttributes']['email']['StringValue'], message['Message'])
+        if (len(failed) < count and key not in failed
+                and message['MessageAttributes']['recipient_type']['StringValue'] in recipient_types):
+            failed.add(key)
+            return True
+        return False
+    fakes.sns.fail_when = fail
+    return failed
+
+
+def delivered(fakes, keys):
+    sent = {(message['MessageAttributes']['email']['StringValue'], message['Message']) for message in fakes.sns.published}
+    return keys & sent
+
+
+def test_failed_publishes_are_retried_once(fakes):
+    failed = fail_first_attempt(fakes, 10)
+    run_hourly()
+
+    assert len(failed) == 10 and delivered(fakes, failed) == failed
+    patient = publishes(fakes, 'patient')
+    assert max(patient.values()) == 1
+    assert sum(patient.values()) == len(patient_entries(fakes))
+    assert len(fakes.reminder_due) == 0
+
+
+def test_partly_failed_entry_only_resends_the_failed_recipient(fakes):
+    failed = fail_first_attempt(fakes, 10, recipient_types=('doctor',))
+    run_hourly()
+
+    assert len(failed) == 10 and delivered(fakes, failed) == failed
+    assert max(publishes(fakes, 'doctor').values()) == 1
+    assert max(publishes(fakes, 'patient').values()) == 1
+    assert sum(publishes(fakes, 'patient').values()) == len(patient_entries(fakes))
+
+
+def test_incomplete_record_skips_only_its_reminders(fakes):
+    entry = patient_entries(fakes)[0]
+    del fakes.patients._items[(entry['PatientID'],)]['Email']
+    run_hourly()
+
+    skipped = [e for e in patient_entries(fakes) if e['PatientID'] == entry['PatientID']]
+    assert sum(publishes(fakes, 'patient').values()) == len(patient_entries(fakes)) - len(skipped)
+    assert len(fakes.reminder_due) == 0
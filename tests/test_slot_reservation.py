@@ -0,0 +1,101 @@
+"""Reservation mode: no double bookings under concurrency, retries are not new bookings"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import AwsClients
+import CheckDoctorAvailability
+import ConfirmBooking
+from AppointmentStore import APPOINTMENTS_TABLE
+from SlotReservation import SlotConflict, reserve_appointment
+from benchmarks.bench_slot_reservation import overlapping
+from benchmarks.datagen import SLOTS, generate, install
+
+
+@pytest.fixture
+def fakes(monkeypatch):
+    monkeypatch.setattr(ConfirmBooking, 'RESERVATION_MODE', True)
+    monkeypatch.setattr(CheckDoctorAvailability, 'RESERVATION_MODE', True)
+    dataset = generate(doctors=2, patients=50, days=1, per_doctor_day=0, past_days=0)
+    fakes = install(dataset)
+    fakes.date = dataset.dates()[0]
+    return fakes
+
+
+def booking(fakes, n, start_time, end_time, doctor_id='D0000'):
+    return {'AppointmentID': f'R{n:04d}', 'PatientID': f'P{n % 50:06d}', 'DoctorID': doctor_id,
+            'AppointmentDate': fakes.date, 'StartTime': start_time, 'EndTime': end_time}
+
+
+def test_concurrent_bookings_never_overlap(fakes):
+    # Every slot requested by eight clients at once
+    requests = [booking(fakes, n, *SLOTS[n % len(SLOTS)]) for n in range(8 * len(SLOTS))]
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        statuses = list(executor.map(lambda request: ConfirmBooking.lambda_handler(request, None)['statusCode'], requests))
+
+    rows = list(fakes.appointments._items.values())
+    assert overlapping(rows) == 0
+    assert statuses.count(201) == len(rows) == len(SLOTS)
+    assert statuses.count(409) == len(requests) - len(SLOTS)
+
+
+def test_overlapping_time_is_refused(fakes):
+    assert ConfirmBooking.lambda_handler(booking(fakes, 1, '09:00', '09:29'), None)['statusCode'] == 201
+    # Shares the 09:15 slot
+    assert ConfirmBooking.lambda_handler(booking(fakes, 2, '09:15', '09:44'), None)['statusCode'] == 409
+    # Another doctor at the same time is fine
+    assert ConfirmBooking.lambda_handler(booking(fakes, 3, '09:00', '09:29', 'D0001'), None)['statusCode'] == 201
+    assert len(fakes.appointments) == 2
+
+
+def test_retried_confirmation_is_not_a_new_booking(fakes):
+    request = booking(fakes, 1, '10:00', '10:29')
+    # The retry builds the item again with a new CreatedAt under the same token
+    first = ConfirmBooking.lambda_handler(request, None)
+    retry = ConfirmBooking.lambda_handler(request, None)
+
+    assert first['statusCode'] == retry['statusCode'] == 201
+    assert json.loads(retry['body']) == 'Appointment confirmed successfully'
+    assert len(fakes.appointments) == 1
+    assert {lock['AppointmentID'] for lock in fakes.slot_locks._items.values()} == {'R0001'}
+
+
+def test_reserve_reports_retries_and_conflicts(fakes):
+    client = AwsClients.client('dynamodb')
+    appointment = dict(booking(fakes, 1, '11:00', '11:29'), AppointmentStatus='Confirmed', CreatedAt='2025-01-01T08:00:00')
+
+    assert reserve_appointment(client, APPOINTMENTS_TABLE, appointment) is True
+    assert reserve_appointment(client, APPOINTMENTS_TABLE, dict(appointment, CreatedAt='2025-01-01T08:00:05')) is False
+    # After the token has expired the retry fails the row condition instead
+    client.tokens.clear()
+    assert reserve_appointment(client, APPOINTMENTS_TABLE, dict(appointment, CreatedAt='2025-01-01T08:20:00')) is False
+    with pytest.raises(SlotConflict):
+        reserve_appointment(client, APPOINTMENTS_TABLE, dict(appointment, AppointmentID='R0002', PatientID='P000002'))
+
+
+def test_retry_after_a_cancelled_attempt_is_checked_again(fakes):
+    client = AwsClients.client('dynamodb')
+    holder = dict(booking(fakes, 1, '12:00', '12:29'), AppointmentStatus='Confirmed', CreatedAt='2025-01-01T08:00:00')
+    appointment = dict(booking(fakes, 2, '12:00', '12:29'), AppointmentStatus='Confirmed', CreatedAt='2025-01-01T08:00:00')
+    assert reserve_appointment(client, APPOINTMENTS_TABLE, holder) is True
+
+    # The first attempt is cancelled; the retry reuses its token with a new CreatedAt
+    with pytest.raises(SlotConflict):
+        reserve_appointment(client, APPOINTMENTS_TABLE, appointment)
+    with pytest.raises(SlotConflict):
+        reserve_appointment(client, APPOINTMENTS_TABLE, dict(appointment, CreatedAt='2025-01-01T08:00:05'))
+    assert len(fakes.appointments) == 1
+
+    # Once the slots are free again, a retry books them
+    for lock in list(fakes.slot_locks._items):
+        fakes.slot_locks._items.pop(lock)
+    assert reserve_appointment(client, APPOINTMENTS_TABLE, dict(appointment, CreatedAt='2025-01-01T08:00:10')) is True
+    assert {row['AppointmentID'] for row in fakes.appointments._items.values()} == {'R0001', 'R0002'}
+
+
+def test_conflicting_retry_is_not_confirmed(fakes):
+    assert ConfirmBooking.lambda_handler(booking(fakes, 1, '13:00', '13:29'), None)['statusCode'] == 201
+    request = booking(fakes, 2, '13:00', '13:29')
+    assert [ConfirmBooking.lambda_handler(request, None)['statusCode'] for _ in range(2)] == [409, 409]
+    assert len(fakes.appointments) == 1
@@ -0,0 +1,72 @@
+"""TieredCache stampedes: one DynamoDB read per key however many containers miss it at once"""
+import pytest
+
+from TieredCache import TieredCache
+from benchmarks.bench_cache_stampede import DOCTOR_TTL, PATIENT_TTL, PATIENTS, Clock, burst, loader, tables
+from benchmarks.fakes import FakeRedis
+
+CONTAINERS = 20
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def redis_client(clock):
+    return FakeRedis(clock=clock, latency=0.0005)
+
+
+def containers(redis_client, ttl, name, **options):
+    """One TieredCache per container: each has its own in-process tier, all share Redis"""
+    return [TieredCache(redis_client, ttl=ttl, name=name, **options) for _ in range(CONTAINERS)]
+
+
+def test_cold_key_is_read_once(redis_client):
+    doctors, _ = tables()
+    caches = containers(redis_client, DOCTOR_TTL, 'doctor_cache')
+    burst(caches, lambda n: [('doctor:D001', loader(doctors, 'DoctorID', 'D001'))])
+
+    assert doctors.calls['get_item'] == 1
+    assert all(cache.get('doctor:D001', None)['LastName'] == 'Doctor' for cache in caches)
+
+
+def test_expired_key_is_read_once_and_stale_value_served(redis_client, clock):
+    doctors, _ = tables()
+    load = loader(doctors, 'DoctorID', 'D001')
+    TieredCache(redis_client, ttl=DOCTOR_TTL, name='doctor_cache').get('doctor:D001', load)
+    doctors.calls.clear()
+
+    clock.offset += DOCTOR_TTL + 1
+    caches = containers(redis_client, DOCTOR_TTL, 'doctor_cache')
+    burst(caches, lambda n: [('doctor:D001', load)])
+
+    assert doctors.calls['get_item'] == 1
+    assert sum(cache.stats['stale_hits'] for cache in caches) > 0
+    assert sum(cache.stats['lock_waits'] for cache in caches) == 0
+
+
+def test_keys_expiring_together_are_each_read_once(redis_client, clock):
+    _, patients = tables()
+    ids = [f'P{n:03d}' for n in range(PATIENTS)]
+    warm = TieredCache(redis_client, ttl=PATIENT_TTL, name='patient_cache')
+    for patient_id in ids:
+        warm.get(f'patient:{patient_id}', loader(patients, 'PatientID', patient_id))
+    patients.calls.clear()
+
+    clock.offset += PATIENT_TTL + 1
+    caches = containers(redis_client, PATIENT_TTL, 'patient_cache')
+    burst(caches, lambda n: [(f'patient:{patient_id}', loader(patients, 'PatientID', patient_id))
+                             for patient_id in ids[n % PATIENTS:] + ids[:n % PATIENTS]])
+
+    assert patients.calls['get_item'] == PATIENTS
+
+
+def test_unknown_key_is_read_once(redis_client):
+    doctors, _ = tables()
+    caches = containers(redis_client, DOCTOR_TTL, 'doctor_cache')
+    burst(caches, lambda n: [('doctor:D999', loader(doctors, 'DoctorID', 'D999'))])
+
+    assert doctors.calls['get_item'] == 1
+    assert all(cache.get('doctor:D999', None) is None for cache in caches)
@@ -0,0 +1,147 @@
+"""WorkflowRunner semantics (Retry, Catch, Choice) and the fused booking's HTTP mapping"""
+import json
+
+import pytest
+
+import BookAppointmentLambda
+import CheckDoctorAvailability
+from WorkflowRunner import WorkflowError, execute
+from benchmarks.datagen import generate, install
+
+
+def task(name, **fields):
+    return dict({'Type': 'Task', 'Resource': f'arn:aws:lambda:us-east-1:000000000000:function:{name}'}, **fields)
+
+
+def failing(times, error='TaskError'):
+    """A handler that raises `times` times, then returns {'statusCode': 200}"""
+    calls = []
+
+    def handler(event, context):
+        calls.append(event)
+        if len(calls) <= times:
+            raise WorkflowError(error, f'attempt {len(calls)}')
+        return {'statusCode': 200}
+    handler.calls = calls
+    return handler
+
+
+RETRY = [{'ErrorEquals': ['States.TaskFailed'], 'IntervalSeconds': 3, 'MaxAttempts': 2, 'BackoffRate': 1.5}]
+
+
+def test_retry_backs_off_then_succeeds():
+    handler, sleeps = failing(2), []
+    definition = {'StartAt': 'Step', 'States': {'Step': task('Step', Retry=RETRY, ResultPath='$.result', End=True)}}
+    execution = execute({'In': 1}, definition, {'Step': handler}, sleeps.append)
+    assert execution['status'] == 'SUCCEEDED'
+    assert execution['output'] == {'In': 1, 'result': {'statusCode': 200}}
+    assert sleeps == [3, 4.5]
+    assert len(handler.calls) == 3
+
+
+def test_retry_gives_up_after_max_attempts():
+    handler, sleeps = failing(3), []
+    definition = {'StartAt': 'Step', 'States': {'Step': task('Step', Retry=RETRY, End=True)}}
+    execution = execute({}, definition, {'Step': handler}, sleeps.append)
+    assert (execution['status'], execution['error'], execution['cause']) == ('FAILED', 'TaskError', 'attempt 3')
+    assert sleeps == [3, 4.5]
+
+
+def test_timeout_is_not_retried_as_task_failed():
+    handler, sleeps = failing(1, error='States.Timeout'), []
+    definition = {'StartAt': 'Step', 'States': {'Step': task('Step', Retry=RETRY, End=True)}}
+    execution = execute({}, definition, {'Step': handler}, sleeps.append)
+    assert (execution['status'], execution['error']) == ('FAILED', 'States.Timeout')
+    assert sleeps == []
+
+
+def test_catch_writes_the_error_at_its_result_path():
+    catch = [{'ErrorEquals': ['States.ALL'], 'ResultPath': '$.error', 'Next': 'Handled'}]
+    definition = {'StartAt': 'Step', 'States': {
+        'Step': task('Step', Catch=catch, Next='Done'),
+        'Handled': {'Type': 'Succeed'},
+        'Done': {'Type': 'Succeed'},
+    }}
+    execution = execute({'In': 1}, definition, {'Step': failing(1)}, lambda seconds: None)
+    assert execution['status'] == 'SUCCEEDED'
+    assert execution['path'] == ['Step', 'Handled']
+    assert execution['output'] == {'In': 1, 'error': {'Error': 'TaskError', 'Cause': 'attempt 1'}}
+
+
+CHOICE = {'Type': 'Choice', 'Choices': [{'Variable': '$.result.statusCode', 'NumericEquals': 200, 'Next': 'Ok'}]}
+
+
+def choice_definition(**choice):
+    return {'StartAt': 'Check', 'States': {
+        'Check': dict(CHOICE, **choice),
+        'Ok': {'Type': 'Succeed'},
+        'Other': {'Type': 'Fail', 'Error': 'OtherError', 'Cause': 'default'},
+    }}
+
+
+@pytest.mark.parametrize('data, state, error', [
+    ({'result': {'statusCode': 200}}, 'Ok', None),
+    ({'result': {'statusCode': 500}}, 'Other', 'OtherError'),
+    ({'result': {'statusCode': '200'}}, 'Other', 'OtherError'),
+])
+def test_choice_takes_the_matching_rule_or_default(data, state, error):
+    execution = execute(data, choice_definition(Default='Other'))
+    assert execution['path'] == ['Check', state]
+    assert execution['error'] == error
+
+
+def test_choice_without_match_or_default_fails():
+    execution = execute({'result': {'statusCode': 500}}, choice_definition())
+    assert (execution['status'], execution['error']) == ('FAILED', 'States.NoChoiceMatched')
+
+
+def test_choice_on_a_missing_path_is_a_runtime_error():
+    execution = execute({'result': {}}, choice_definition(Default='Other'))
+    assert (execution['status'], execution['error'], execution['path']) == ('FAILED', 'States.Runtime', ['Check'])
+
+
+@pytest.fixture
+def dataset():
+    dataset = generate(doctors=3, patients=6, days=2, per_doctor_day=2, past_days=0)
+    install(dataset)
+    return dataset
+
+
+def book(dataset, **fields):
+    booked = dataset.appointments[0]
+    other_patient = next(p['PatientID'] for p in dataset.patients if p['PatientID'] != booked['PatientID'])
+    other_doctor = next(d['DoctorID'] for d in dataset.doctors if d['DoctorID'] != booked['DoctorID'])
+    booking = {'AppointmentID': 'A-test', 'PatientID': other_patient, 'DoctorID': booked['DoctorID'],
+               'AppointmentDate': dataset.dates()[1], 'StartTime': '07:00', 'EndTime': '07:30'}
+    booking.update({name: value(booked, other_patient, other_doctor) for name, value in fields.items()})
+    response = BookAppointmentLambda.run_fused_booking(booking)
+    return response['statusCode'], json.loads(response['body'])
+
+
+def test_fused_booking_succeeds(dataset):
+    status, body = book(dataset)
+    assert status == 201
+    assert body['appointmentDetails']['AppointmentID'] == 'A-test'
+
+
+def test_fused_booking_unknown_patient_is_404(dataset):
+    assert book(dataset, PatientID=lambda *_: 'P-missing') == (404, {
+        'error': 'Patient does not exist in the system', 'errorType': 'PatientNotFoundError'})
+
+
+def test_fused_booking_unknown_doctor_is_404(dataset):
+    assert book(dataset, DoctorID=lambda *_: 'D-missing')[1]['errorType'] == 'DoctorNotFoundError'
+
+
+@pytest.mark.parametrize('fields, error', [
+    # Another patient, the booked doctor's slot
+    ({}, 'DoctorNotAvailableError'),
+    # The booked patient, another doctor at the same time
+    ({'PatientID': lambda booked, *_: booked['PatientID'], 'DoctorID': lambda booked, patient, doctor: doctor},
+     'PatientNotAvailableError'),
+])
+def test_fused_booking_conflicts_are_409(dataset, monkeypatch, fields, error):
+    monkeypatch.setattr(CheckDoctorAvailability, 'PATIENT_OVERLAP_CHECK', True)
+    slot = {name: (lambda booked, *_, name=name: booked[name]) for name in ('AppointmentDate', 'StartTime', 'EndTime')}
+    status, body = book(dataset, **dict(slot, **fields))
+    assert (status, body['errorType']) == (409, error)